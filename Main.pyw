@@ -30,6 +30,8 @@ __stdout__ = sys.stdout
 __stderr__ = sys.stderr
 
 DEBUG = False
+# bytes of a saved CST macro shown in its window
+PREVIEW = 1<<16
 
 
    
@@ -428,6 +430,8 @@ class Ui_MainWindow(object):
             sys.stdout = stdProxy(self.create_subwin_stdout())
         if self.subwin_parameters:
             self.context = self.subwin_parameters.getParam()            
+        # the cells of the previous run would collide with the ones of this run
+        gdsii.clear()
         result = RunScript(string, self.context).run()
         sys.stdout = __stdout__
         self.statusbar.showMessage("Done.")
@@ -436,12 +440,6 @@ class Ui_MainWindow(object):
             stderr(result.traceback)
             return
 
-        series = []
-        for k, v in result.globals.iteritems():
-            if isinstance(v, Primitives) and k[0]<>'_':
-                series.append((k, v))
-
-
         self.filename = QtGui.QFileDialog.getSaveFileName(None,
             'Save a data file', '.', 'python files (*.gds);;All Files (*.*)')
         if self.filename:
@@ -450,10 +448,9 @@ class Ui_MainWindow(object):
             self.statusbar.showMessage("Failed to save to a file...")
             return
 
-        for name, layer in series:
-            cell = gdsii.Cell(str(name))
-            cell.append( layer, layer=1 )
-        gdsii.export(str(self.filename))
+        # every Primitives of the script in one cell, on the layer mapped to its name
+        # by gdsii.layermap() in the script, or on gdsii.Cell.layer
+        gdsii.extract(str(self.filename), result.globals)
          
     def new_cst(self):
         widget = QtGui.QWidget()
@@ -545,14 +542,29 @@ class Ui_MainWindow(object):
             sys.stdout = stdProxy(self.create_subwin_stdout())
         if hasattr(self, 'subwin_parameters') and self.subwin_parameters:
             self.context = self.subwin_parameters.getParam()            
-        obj = RunScript(string, self.context).run()
-        obj.globals['Parameter'].list = list()
-        sys.stdout = __stdout__
+        # a registry of names of its own: each run names its solids and ports from 1
+        with Names():
+            obj = RunScript(string, self.context).run()
+            obj.globals['Parameter'].list = list()
+            sys.stdout = __stdout__
+
+            for k, v in obj.globals.iteritems():
+                if isinstance(v, CST) and k[0]<>'_':
+                    break
+            else:
+                self.statusbar.showMessage("No CST macro in the script...")
+                return
+
+            self.filename = QtGui.QFileDialog.getSaveFileName(None,
+                'Save a macro file', '.', 'macro files (*.bas);;All Files (*.*)')
+            if self.filename:
+                self.statusbar.showMessage("Saved " + self.filename)
+            else:
+                self.statusbar.showMessage("Failed to save to a file...")
+                return
+            # the macro is written line by line to the file, not built as one string
+            v.export(str(self.filename))
 
-        series = []
-        for k, v in obj.globals.iteritems():
-            if isinstance(v, CST) and k[0]<>'_':
-                break
         widget = QtGui.QWidget()
         self.subwin_abq = Ui_Form3()
         self.subwin_abq.setupUi(widget)
@@ -564,9 +576,16 @@ class Ui_MainWindow(object):
         widget.show()
         self.subwindow.show()
         self.subwindow.widget().show()
-        self.subwin_abq.plainTextEdit.append(str(v))
-
-        self.subwin_abq.plainTextEdit.selectAll()
+        # only the beginning of a long macro is shown, the file is not read back
+        with open(str(self.filename)) as fileobj:
+            preview = fileobj.read(PREVIEW)
+            truncated = bool(fileobj.read(1))
+        if truncated:
+            preview += '\n...\n(the whole macro is in %s)'%self.filename
+        self.subwin_abq.plainTextEdit.setPlainText(preview)
+
+        if not truncated:
+            self.subwin_abq.plainTextEdit.selectAll()
 
 
         self.statusbar.showMessage("Done.")
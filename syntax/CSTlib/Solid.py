@@ -1,21 +1,24 @@
-__all__ = ['Solid', 'Solids', 'Subtract', 'Insert', 'Intersect']
+__all__ = ['Solid', 'Solids', 'Subtract', 'Insert', 'Intersect', 'ExtrudeHoles']
 try:
-    from CSTlib import Brick, Extrude, Copy
+    from CSTlib import Brick, Extrude, Copy, Names, _Macro, _join
 except:
-    pass
+    # imported by the syntax package
+    from syntax.CSTlib import Brick, Extrude, Copy, Names, _Macro, _join
+try:
+    import boolean
+except:
+    # imported by the syntax package
+    from syntax import boolean
 from exceptions import *
 from formal import *
 
-class Solid(list):
-    _names = {'Solid':1}
+class Solid(_Macro, list):
+    # extrusions of the same component, material and height are united in 2D
+    # before being written, see _preunion; off by default, the macro then has
+    # one extrusion per primitive as before
+    PreUnion = False
     def __init__(self, *args, **kwargs):
-        name = kwargs.get('name', 'Solid')
-        if name in Solid._names:
-            self.name = "{name}{i}".format(name=name, i=Solid._names[name])
-            Solid._names[name] += 1
-        else:
-            self.name = "{name}".format(name=name)
-            Solid._names[name] = 1
+        self.name = Names.current().name('Solid', kwargs.get('name', 'Solid'))
         self.component = kwargs.get('component', None)
         self.material = kwargs.get('material', None)
         if args:
@@ -28,7 +31,9 @@ class Solid(list):
                 raise Exception('the first argument is not a Brick or a Solid')
         list.__init__(self, args)
                 
-    def __str__(self):
+    def write_to(self, fileobj):
+        if len(self)==0:
+            return
         ref = self[0]
         for elt in self:
             if isinstance(elt, (Brick, Solid, Extrude)):
@@ -36,31 +41,26 @@ class Solid(list):
                     print "Warning: %s.component is different than %s.component in Solid %s"%(elt.name, ref.name, self.name)
                 if elt.material <> ref.material:
                     print "Warning: %s.material is different than %s.material in Solid %s"%(elt.name, ref.name, self.name)
-        if len(self)==0:
-            return ''
-        elif len(self)==1:
-            return '\n'.join(flatten([[ str(elt) for elt in self ],
-                                      [ str(Rename(self[0], self.name)) ]
-                                     ]))
-        else:
-            Volumes = []
-            for v1 in self:
-                if isinstance(v1, (Brick, Solid, Extrude)):
-                    Volumes.append(v1)
-                    for v2 in self:
-                        if isinstance(v2, Subtract):
-                            if v1 in v2[1:]:
-                                Volumes.pop()
-                                break
-            if len(Volumes)<2:
-                return '\n'.join(flatten([[ str( elt ) for elt in self ],
-                                          [ str( Rename(self[0], self.name) ) ]
-                                         ]))
-                
-            return '\n'.join(flatten([[ str( elt ) for elt in self ],
-                                      [ str( Add(*Volumes) ) ],
-                                      [ str( Rename(self[0], self.name) ) ]
-                                     ]))
+        objs = list(self)
+        first = self[0]
+        if len(self)>1:
+            # the solids cut away or used by the booleans of the solid, found in one pass
+            subtracted, used = set(), set()
+            for obj in self:
+                if isinstance(obj, (Add, Subtract, Insert, Intersect)):
+                    used.update(id(v) for v in obj)
+                    if isinstance(obj, Subtract):
+                        subtracted.update(id(v) for v in obj[1:])
+                elif hasattr(obj, 'solid'):
+                    used.add(id(obj.solid))
+            if Solid.PreUnion:
+                objs, replaced = _preunion(objs, used)
+                first = replaced.get(id(first), first)
+            Volumes = [v for v in objs if isinstance(v, (Brick, Solid, Extrude)) and not id(v) in subtracted]
+            if len(Volumes)>=2:
+                objs.append( Add(*Volumes) )
+        objs.append( Rename(first, self.name) )
+        _join(fileobj, objs)
 
     @staticmethod
     def Add(*args):
@@ -92,9 +92,46 @@ class Solid(list):
         return solid
 
 
-class Solids(list):
-    def __str__(self):
-        return '\n'.join( str(solid) for solid in self)
+def _preunion(objs, used):
+    """ unite in 2D the extrusions of objs sharing component, material and z range that
+        no boolean of the solid refers to (ids in used), so that fewer solids are added
+        in CST. A group is kept as it is when the union leaves holes or does not reduce
+        its number of extrusions. Returns the new list of objects and a dict from the id
+        of each replaced extrusion to the extrusion that carries its name. """
+    groups = {}
+    for obj in objs:
+        if isinstance(obj, Extrude) and len(obj)>2 and not id(obj) in used:
+            key = obj.component, obj.material, tuple(obj.zrange)
+            groups.setdefault(key, []).append(obj)
+    merged, replaced = {}, {}
+    for group in groups.values():
+        if len(group)<2:
+            continue
+        polygons = boolean.bulkunion([extrude._points() for extrude in group])
+        # the holes come out clockwise
+        if len(polygons)>=len(group) or any(boolean.area(polygon)<0 for polygon in polygons):
+            continue
+        # the united extrusions take the names of the first extrusions of the group
+        for extrude, outer in zip(group, polygons):
+            union = Extrude.__new__(Extrude)
+            union.__dict__.update(extrude.__dict__)
+            union.extend(outer)
+            replaced[id(extrude)] = union
+        for extrude in group:
+            merged[id(extrude)] = replaced.get(id(extrude))
+    result = []
+    for obj in objs:
+        if id(obj) in merged:
+            if merged[id(obj)] is not None:
+                result.append(merged[id(obj)])
+        else:
+            result.append(obj)
+    return result, replaced
+
+
+class Solids(_Macro, list):
+    def write_to(self, fileobj):
+        _join(fileobj, self)
             
         
 
@@ -109,7 +146,7 @@ def flatten(sequence):
             yield el
 
         
-class Add(list):
+class Add(_Macro, list):
     def __init__(self, *solids):
         for solid in solids:
             if not isinstance(solid, (Brick, Solid, Extrude)):
@@ -117,15 +154,16 @@ class Add(list):
         if len(solids)<2:
             raise Exception('number of solids is less than two')
         list.__init__(self, solids)
-    def __str__(self):
-        return '\n'.join(flatten([( 'Solid.Add "{solid1.component}:{solid1.name}", "{solid2.component}:{solid2.name}"'.format(solid1=self[0],
-                                                                                                                              solid2=solid),
-                                    '',
-                                   ) for solid in self[1:]
-                                 ]))
+    def write_to(self, fileobj):
+        replicas = getattr(fileobj, 'replicas', None)
+        if replicas is not None:
+            replicas.forget(*self)
+        for i, solid in enumerate(self[1:]):
+            fileobj.write( ('\n' if i else '') + 'Solid.Add "{solid1.component}:{solid1.name}", "{solid2.component}:{solid2.name}"\n'.format(solid1=self[0],
+                                                                                                                                           solid2=solid) )
 
 
-class Subtract(list):
+class Subtract(_Macro, list):
     def __init__(self, *solids):
         for solid in solids:
             if not isinstance(solid, (Brick, Solid, Extrude)):
@@ -133,19 +171,24 @@ class Subtract(list):
         if len(solids)<2:
             raise Exception('number of solids is less than two')
         list.__init__(self, solids)
-    def __str__(self):
-        return '\n'.join(flatten([( 'With Solid',
-                                    '  .Version 9',
-                                    '  .Subtract "{solid1.component}:{solid1.name}", "{solid2.component}:{solid2.name}"'.format(solid1=self[0],
-                                                                                                                              solid2=solid),
-                                    '  .Version 1',
-                                    'End With',
-                                    '',
-                                   ) for solid in self[1:]
-                                 ]))
+    def write_to(self, fileobj):
+        replicas = getattr(fileobj, 'replicas', None)
+        if replicas is not None:
+            replicas.forget(*self)
+        for i, solid in enumerate(self[1:]):
+            if i:
+                fileobj.write('\n')
+            fileobj.write( '\n'.join([ 'With Solid',
+                                       '  .Version 9',
+                                       '  .Subtract "{solid1.component}:{solid1.name}", "{solid2.component}:{solid2.name}"'.format(solid1=self[0],
+                                                                                                                           solid2=solid),
+                                       '  .Version 1',
+                                       'End With',
+                                       '',
+                                     ]) )
 
 
-class Insert(list):
+class Insert(_Macro, list):
     def __init__(self, *solids):
         #for solid in solids:
         #    if not isinstance(solid, (Brick, Solid, Extrude)):
@@ -153,18 +196,23 @@ class Insert(list):
         if len(solids)<2:
             raise Exception('number of solids is less than two')
         list.__init__(self, solids)
-    def __str__(self):
-        return '\n'.join(flatten([( 'With Solid',
-                                    '  .Version 9',
-                                    '  .Insert "{solid1.component}:{solid1.name}", "{solid2.component}:{solid2.name}"'.format(solid1=self[0],
-                                                                                                                              solid2=solid),
-                                    '  .Version 1',
-                                    'End With',
-                                    '',
-                                   ) for solid in self[1:]
-                                 ]))
+    def write_to(self, fileobj):
+        replicas = getattr(fileobj, 'replicas', None)
+        if replicas is not None:
+            replicas.forget(*self)
+        for i, solid in enumerate(self[1:]):
+            if i:
+                fileobj.write('\n')
+            fileobj.write( '\n'.join([ 'With Solid',
+                                       '  .Version 9',
+                                       '  .Insert "{solid1.component}:{solid1.name}", "{solid2.component}:{solid2.name}"'.format(solid1=self[0],
+                                                                                                                           solid2=solid),
+                                       '  .Version 1',
+                                       'End With',
+                                       '',
+                                     ]) )
 
-class Intersect(list):
+class Intersect(_Macro, list):
     def __init__(self, *solids):
         for solid in solids:
             if not isinstance(solid, (Brick, Solid, Extrude)):
@@ -172,24 +220,56 @@ class Intersect(list):
         if len(solids)<2:
             raise Exception('number of solids is less than two')
         list.__init__(self, solids)
-    def __str__(self):
-        return '\n'.join(flatten([( 'With Solid',
-                                    '  .Version 9',
-                                    '  .Intersect "{solid1.component}:{solid1.name}", "{solid2.component}:{solid2.name}"'.format(solid1=self[0],
-                                                                                                                              solid2=solid),
-                                    '  .Version 1',
-                                    'End With',
-                                    '',
-                                   ) for solid in self[1:]
-                                 ]))
+    def write_to(self, fileobj):
+        replicas = getattr(fileobj, 'replicas', None)
+        if replicas is not None:
+            replicas.forget(*self)
+        for i, solid in enumerate(self[1:]):
+            if i:
+                fileobj.write('\n')
+            fileobj.write( '\n'.join([ 'With Solid',
+                                       '  .Version 9',
+                                       '  .Intersect "{solid1.component}:{solid1.name}", "{solid2.component}:{solid2.name}"'.format(solid1=self[0],
+                                                                                                                           solid2=solid),
+                                       '  .Version 1',
+                                       'End With',
+                                       '',
+                                     ]) )
+
+
+def ExtrudeHoles(shape, **kwargs):
+    """ Extrude of an outer contour; the holes (shape.holes) from the tree booleans
+        are extruded and subtracted from it in a Solid """
+    outer = Extrude(**kwargs)
+    outer.extend(shape)
+    holes = getattr(shape, 'holes', None)
+    if not holes:
+        return outer
+    # the solid takes the name given to the extrusion, the outer contour and each hole
+    # get names of their own from the registry
+    solid = Solid(outer, name=outer.name)
+    outer.name = Names.current().name('Extrude', solid.name+'_outer')
+    cuts = []
+    for i, hole in enumerate(holes):
+        cut = Extrude(**dict(kwargs, name='%s_hole%d'%(solid.name, i+1)))
+        cut.extend(hole)
+        cuts.append(cut)
+    solid.extend(cuts)
+    solid.append( Subtract(outer, *cuts) )
+    return solid
 
 
-class Rename(object):
+class Rename(_Macro):
     def __init__(self, solid, name):
         if not isinstance(solid, (Brick, Solid, Extrude)):
             raise Exception('solid is not a Brick or a Solid')
         self.solid = solid
         self.name = name
+    def write_to(self, fileobj):
+        replicas = getattr(fileobj, 'replicas', None)
+        if replicas is not None:
+            replicas.rename(self.solid, self.name)
+        fileobj.write(str(self))
     def __str__(self):
         return '\n'.join(flatten([( 'Solid.Rename "{self.solid.component}:{self.solid.name}", "{self.name}"'.format(self=self),
                                     '',
@@ -1,9 +1,10 @@
 from exceptions import *
 from math import pi, sin, cos
 try:
-    from CSTlib import Brick, Extrude, Point
+    from CSTlib import Brick, Extrude, _Macro
 except:
-    pass
+    # imported by the syntax package
+    from syntax.CSTlib import Brick, Extrude, _Macro
 try:
     from Solid import Solid
 except:
@@ -13,14 +14,20 @@ try:
 except:
     pass
 
-class Rotate(object):
-    def __init__(self, solid, center=(0, 0, 0), angle=(0, 0, 0)):
+class Rotate(_Macro):
+    def __init__(self, solid, center=(0, 0, 0), angle=(0, 0, 0), copy=False):
         if isinstance(solid, (Brick, Solid, Extrude)):
             self.solid = solid
             self.center = center
             self.angle = angle
+            self.copy = copy
         else:
             raise Exception('solid is not a Brick or a Solid')
+    def write_to(self, fileobj):
+        replicas = getattr(fileobj, 'replicas', None)
+        if replicas is not None:
+            replicas.forget(self.solid)
+        fileobj.write(str(self))
     def __str__(self):
         return "\n".join([ 'With Transform',
                            '  .Reset',
@@ -28,8 +35,8 @@ class Rotate(object):
                            '  .Origin "Free"',
                            '  .Center "{self.center[0]}", "{self.center[1]}", "{self.center[2]}"'.format(self=self),
                            '  .Angle "{self.angle[0]}", "{self.angle[1]}", "{self.angle[2]}"'.format(self=self),
-                           '  .MultipleObjects "False"',
-                           '  .MultipleObjects "False"',
+                           '  .MultipleObjects "{copy}"'.format(copy=self.copy),
+                           '  .MultipleObjects "{copy}"'.format(copy=self.copy),
                            '  .GroupObjects "False"',
                            '  .Repetitions "1"',
                            '  .MultipleSelection "False"',
@@ -66,17 +73,23 @@ class Rotate(object):
         return newPoint
     
     def __copy__(self):
-        return Rotate( solid=self.solid, center=self.center, angle=self.angle)
+        return Rotate( solid=self.solid, center=self.center, angle=self.angle, copy=self.copy)
 
 
-class Mirror(object):
-    def __init__(self, solid, center=(0, 0, 0), planenormal=(0, 0, 0)):
+class Mirror(_Macro):
+    def __init__(self, solid, center=(0, 0, 0), planenormal=(0, 0, 0), copy=False):
         if isinstance(solid, (Brick, Solid, Extrude)):
             self.solid = solid
             self.center = center
             self.planenormal = planenormal
+            self.copy = copy
         else:
             raise Exception('solid is not a Brick or a Solid')
+    def write_to(self, fileobj):
+        replicas = getattr(fileobj, 'replicas', None)
+        if replicas is not None:
+            replicas.forget(self.solid)
+        fileobj.write(str(self))
     def __str__(self):
         return "\n".join([  'With Transform',
                           '  .Reset',
@@ -84,7 +97,7 @@ class Mirror(object):
                           '  .Origin "Free"',
                           '  .Center "{self.center[0]}", "{self.center[1]}", "{self.center[2]}"'.format(self=self),
                           '  .PlaneNormal "{self.planenormal[0]}", "{self.planenormal[1]}", "{self.planenormal[2]}"'.format(self=self),
-                          '  .MultipleObjects "False"',
+                          '  .MultipleObjects "{copy}"'.format(copy=self.copy),
                           '  .GroupObjects "False"',
                           '  .Repetitions "1"',
                           '  .MultipleSelection "False"',
@@ -95,13 +108,19 @@ class Mirror(object):
                           ''
                        ])
 
-class Translate(object):
-    def __init__(self, solid, vector=(0, 0, 0)):
+class Translate(_Macro):
+    def __init__(self, solid, vector=(0, 0, 0), copy=False):
         if isinstance(solid, (Brick, Solid, Extrude)):
             self.solid = solid
             self.vector = vector
+            self.copy = copy
         else:
             raise Exception('solid is not a Brick or a Solid')
+    def write_to(self, fileobj):
+        replicas = getattr(fileobj, 'replicas', None)
+        if replicas is not None:
+            replicas.forget(self.solid)
+        fileobj.write(str(self))
     def __str__(self):
         return "\n".join([ 'With Transform',
                            '  .Reset',
@@ -109,7 +128,7 @@ class Translate(object):
                            '  .Vector "{self.vector[0]}", "{self.vector[1]}", "{self.vector[2]}"'.format(self=self),
                            '  .UsePickedPoints "False" ',
                            '  .InvertPickedPoints "False" ',
-                           '  .MultipleObjects "False"',
+                           '  .MultipleObjects "{copy}"'.format(copy=self.copy),
                            '  .GroupObjects "False"',
                            '  .Repetitions "1"',
                            '  .MultipleSelection "False" ',
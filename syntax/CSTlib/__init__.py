@@ -2,10 +2,13 @@ __all__ = ['Brick', 'Copy', 'Component', 'CST', 'Layers','Layer',
            'DiscretePort', 'Boundary',
            'Unit', 'Material', 'Mesh', 'Solver', 'Extrude',
            'Solid', 'Solids', 'Group', 'MeshSettings',
-           'Transform', 'Subtract', 'Intersect', 'LumpedElement', 'Blend', 'walk2intersect'
+           'Transform', 'Subtract', 'Intersect', 'ExtrudeHoles', 'LumpedElement', 'Blend', 'walk2intersect',
+           'Names'
            ]
 
-from math import pi, log10
+from math import pi, log10, atan2, cos, sin
+from cStringIO import StringIO
+import numpy
 from formal import *
 from exceptions import *
 
@@ -43,59 +46,131 @@ from libarray import *
 from linalg import solve
 from function import linspace
 from newton import NewtonRaphson as fmin
+try:
+    from curves import corners
+except:
+    # imported by the syntax package
+    from syntax.curves import corners
 from math import atan2
 Angle = lambda pt: atan2(pt.y, pt.x)/pi*180.
 
                
                
 def Blend(curve, n=100, radius=1.0):
+    """ curve (3 points) with its corner rounded by n points at radius, as few as
+        chorderror() allows when n is None """
     assert isinstance(curve, list), 'TypeError: curve it not a Primitive'
     assert len(curve)==3, 'TypeError: number of point is different of 3'
-    Angle = lambda pt: atan2(pt.y, pt.x)/pi*180.
-    n = int(n)
     point1, point2, point3 = curve
-    arr = lambda x: round(x*1e6)/1e6
-    point1 = Point(arr(point1.x), arr(point1.y), arr(point1.z))
-    point2 = Point(arr(point2.x), arr(point2.y), arr(point2.z))
-    point3 = Point(arr(point3.x), arr(point3.y), arr(point3.z))
-    
-    isreversed = False
-    if not(point1.x<=point2.x<=point3.x):
-        point1, point3 = point3, point1
-        isreversed = True
-    line1 = Line(point1, point2)
-    line2 = Line(point2, point3)
-    if isinf(line1.slope): line1 = Line(point1, point2+Point(1e-6, 0, 0))
-    if isinf(line2.slope): line2 = Line(point2, point3+Point(1e-6, 0, 0))
-    def f(x):
-        if point1.x<=point2.x<=point3.x:
-            point4 = point2.Translate2(line=line1, radius=-x)
-            point5 = point2.Translate2(line=line2, radius=x)
-        line4 = line1.Rotate(center=point4, angle=(0,0,90))
-        line5 = line2.Rotate(center=point5, angle=(0,0,90))
-        point6 = line4.Intercept(line5)
-        return (point4.x-point6.x)**2+(point4.y-point6.y)**2 - radius**2
-    x = fmin(f=f, x0=radius, verbose=False).run()
-    if point1.x<=point2.x<=point3.x:
-        point4 = point2.Translate2(line=line1, radius=-x)
-        point5 = point2.Translate2(line=line2, radius=x)
-    line4 = line1.Rotate(center=point4, angle=(0,0,90))
-    line5 = line2.Rotate(center=point5, angle=(0,0,90))
-    point6 = line4.Intercept(line5)
-    ang1 = Angle(point4-point6)
-    ang2 = Angle(point5-point6)
-    curve3 = Primitive()
+    arc = corners([(point1.x, point1.y), (point2.x, point2.y), (point3.x, point3.y)],
+                  radius, n and int(n), closed=False)
+    # the arc is in the plane z of the corner for 3D points
+    z = getattr(point2, 'z', None)
+    curve3 = curve[:0]
     curve3.append( point1 )
-    for theta in linspace(ang1, ang2, n):
-        curve3.append( Point(radius*cos(theta*pi/180), radius*sin(theta*pi/180), 0)+point6 )
+    for x, y in arc[1:-1].tolist():
+        curve3.append( point2.__class__(x, y) if z is None else point2.__class__(x, y, z) )
     curve3.append( point3 )
-    if isreversed:
-        return reversed(curve3)
     return curve3
 
 
 
 
+class _Macro(object):
+    """ object of the macro: write_to(fileobj) writes its lines to fileobj,
+        str() returns them """
+    def write_to(self, fileobj):
+        fileobj.write(str(self))
+    def __str__(self):
+        fileobj = StringIO()
+        self.write_to(fileobj)
+        return fileobj.getvalue()
+
+def _write(obj, fileobj):
+    write_to = getattr(obj, 'write_to', None)
+    if write_to is None:
+        fileobj.write(str(obj))
+    else:
+        write_to(fileobj)
+
+def _join(fileobj, objs):
+    # the objects written as "\n".join(str(obj) for obj in objs)
+    for i, obj in enumerate(objs):
+        if i:
+            fileobj.write('\n')
+        _write(obj, fileobj)
+
+
+def _lengths(points):
+    # length of the edges of the closed polygon
+    d = numpy.roll(points, -1, axis=0) - points
+    return numpy.hypot(d[:,0], d[:,1])
+
+def _congruent(points1, points2, tolerance=1e-5):
+    """ (mirror, angle, vector) such that points2 is points1 mirrored about the x axis
+        when mirror is True, rotated by angle (degrees) around the origin and translated
+        by vector, the polygons may start at any vertex and run in either direction """
+    n = len(points1)
+    shifts = (numpy.arange(n)[:,None] + numpy.arange(n)) % n
+    for mirror in (False, True):
+        p = points1*(1, -1) if mirror else points1
+        lengths = _lengths(p)
+        for q in (points2, numpy.roll(points2[::-1], 1, axis=0)):
+            candidates = numpy.abs(_lengths(q)[shifts]-lengths).max(axis=1) < tolerance
+            for k in numpy.flatnonzero(candidates):
+                r = numpy.roll(q, -k, axis=0)
+                i = numpy.argmax(lengths)
+                u, v = p[(i+1)%n]-p[i], r[(i+1)%n]-r[i]
+                theta = atan2(v[1], v[0]) - atan2(u[1], u[0])
+                c, s = cos(theta), sin(theta)
+                vector = r[0] - (c*p[0,0]-s*p[0,1], s*p[0,0]+c*p[0,1])
+                error = numpy.dot(p, [[c, s], [-s, c]]) + vector - r
+                if numpy.abs(error).max() < tolerance:
+                    return mirror, theta*180./pi, vector
+    return None
+
+
+class _Replicas(object):
+    """ file of a macro remembering the extrusions written to it: an extrusion congruent
+        to one already written is made as a transformed copy of it. The extrusions
+        follow their renames and are forgotten once a boolean or a transform uses them. """
+    def __init__(self, fileobj):
+        self.write = fileobj.write
+        self.replicas = self
+        self.extrusions = {}
+        self.sources = {}
+
+    def find(self, extrude, points):
+        """ (name, mirror, angle, vector) of a written extrusion that extrude is a copy
+            of, None after remembering extrude otherwise """
+        points = numpy.array(points, dtype=float)
+        if len(points) < 3:
+            return None
+        x, y = points[:,0], points[:,1]
+        area = 0.5*abs(numpy.dot(x, numpy.roll(y, -1)) - numpy.dot(y, numpy.roll(x, -1)))
+        key = (extrude.component, extrude.material, tuple(extrude.zrange), len(points),
+               round(_lengths(points).sum(), 4), round(area, 4))
+        for source in self.extrusions.get(key, ()):
+            match = _congruent(source[1], points)
+            if match:
+                return (source[0],) + match
+        source = [extrude.name, points]
+        self.extrusions.setdefault(key, []).append(source)
+        # the extrusion is kept alive so that its id is not reused
+        self.sources[id(extrude)] = extrude, key, source
+        return None
+
+    def rename(self, solid, name):
+        if id(solid) in self.sources:
+            self.sources[id(solid)][2][0] = name
+
+    def forget(self, *solids):
+        for solid in solids:
+            if id(solid) in self.sources:
+                extrude, key, source = self.sources.pop(id(solid))
+                self.extrusions[key].remove(source)
+
+
 def norm(M):
     err = 0.
     for i in M:
@@ -104,16 +179,48 @@ def norm(M):
     return math.sqrt(err)
 
 
-class Brick(object):
-    _names = {'Brick':1}
+class Names(object):
+    """ names given to the bricks, solids, extrusions, ports and lumped elements.
+        The objects take their names from the innermost registry in use, a run opens
+        its own registry so that the same script gives the same names each time:
+            with Names():
+                execfile(script)
+        Outside of any run the names are counted over the whole session. """
+    _stack = []
+    def __init__(self):
+        self.counters = {}
+    def __enter__(self):
+        Names._stack.append(self)
+        return self
+    def __exit__(self, *args):
+        Names._stack.pop()
+    @staticmethod
+    def current():
+        return Names._stack[-1]
+    def name(self, kind, name):
+        # the default name of a kind is numbered from 1, another name is first given
+        # as it is and then numbered from 1
+        counters = self.counters.setdefault(kind, {kind:1})
+        if name in counters:
+            i = counters[name]
+            counters[name] += 1
+            return "{name}{i}".format(name=name, i=i)
+        counters[name] = 1
+        return "{name}".format(name=name)
+    def index(self, kind):
+        """ next number of kind, from 1 """
+        counters = self.counters.setdefault(kind, {kind:1})
+        i = counters[kind]
+        counters[kind] += 1
+        return i
+
+# registry of the session
+Names._stack.append(Names())
+
+
+class Brick(_Macro):
     def __init__(self, **kwargs):
-        name = kwargs.get('name', 'Brick')
-        if name in Brick._names:
-            self.name = "{name}{i}".format(name=name, i=Brick._names[name])
-            Brick._names[name] += 1
-        else:
-            self.name = "{name}".format(name=name)
-            Brick._names[name] = 1
+        self.name = Names.current().name('Brick', kwargs.get('name', 'Brick'))
         self.component = kwargs.get('component', 'component1')
         self.material = kwargs.get('material', 'PEC')
         if not 'points' in kwargs:
@@ -166,20 +273,35 @@ class Component(object):
         return "\n".join(['Component.New "{name}"'.format(name=name), '' ])
 
 
-class CST(list):
+class CST(_Macro, list):
     Formatting = ":.5f"
+    # congruent extrusions written as transformed copies of the first one; CST names
+    # the copy of source source_1, which must not be the name of another solid
+    Replicate = False
     def __init__(self, **kwargs):
         self.component = kwargs.get('component', 'component1')
         self.name = kwargs.get('name', 'object1')
-    def __str__(self):
-        s = ['Sub Main ()', '']
-        for line in self:
-            if not isinstance(line, CST):
-                s.append( str(line) )
+    def write_to(self, fileobj):
+        if CST.Replicate and getattr(fileobj, 'replicas', None) is None:
+            fileobj = _Replicas(fileobj)
+        fileobj.write('Sub Main ()\n')
+        if len(self):
+            fileobj.write('\n')
+        self._write_lines(fileobj)
+        fileobj.write('\nEnd Sub')
+    def _write_lines(self, fileobj):
+        # the lines between Sub Main () and End Sub, those of a nested CST written in place
+        for i, line in enumerate(self):
+            if i:
+                fileobj.write('\n')
+            if isinstance(line, CST):
+                line._write_lines(fileobj)
             else:
-                s.append( "\n".join(str(line).split('\n')[2:-1]) )
-        s.extend(['End Sub'])
-        return "\n".join(s)
+                _write(line, fileobj)
+    def export(self, filename):
+        """ write the macro to filename, line by line """
+        with open(filename, 'w', 1<<20) as fileobj:
+            self.write_to(fileobj)
             
 
 class Layer(list):
@@ -239,8 +361,10 @@ class Layers(list):
                 return list.__setitem__(self, i, newlayer)
         list.append(self, layer)
     def append(self, layer):
+        # (name, material, zrange) or (name, material, zrange, gds), see gdsii.layermap
         if isinstance(layer, tuple):
-            layer = Layer(name=layer[0], material=layer[1], zmin=min(layer[2]), zmax=max(layer[2]))
+            kwargs = {'gds': layer[3]} if len(layer) > 3 else {}
+            layer = Layer(name=layer[0], material=layer[1], zmin=min(layer[2]), zmax=max(layer[2]), **kwargs)
         list.append(self, layer)
        
             
@@ -256,20 +380,19 @@ def flatten(sequence):
         else:
             yield el
 
-class DiscretePort(object):
-    index = 1
+class DiscretePort(_Macro):
     def __init__(self, name='port', **kwargs):
-        self.name = "{name}{i}".format(name=name, i=DiscretePort.index)
-        DiscretePort.index += 1
-        self.index = DiscretePort.index
+        i = Names.current().index('DiscretePort')
+        self.name = "{name}{i}".format(name=name, i=i)
+        self.index = i+1
         self.p1 = kwargs.get('P1', (0, 0, 0))
         self.p2 = kwargs.get('P2', (1, 0, 0))
     def __str__(self):
-        if isinstance(self.p1, Point):
+        # a point with x, y and z attributes is written as its coordinates
+        if hasattr(self.p1, 'z'):
             self.p1 = self.p1.x, self.p1.y, self.p1.z
-        if isinstance(self.p2, Point):
+        if hasattr(self.p2, 'z'):
             self.p2 = self.p2.x, self.p2.y, self.p2.z
-        DiscretePort.index = 1
         return "\n".join([ 'With DiscretePort',
                            '  .Reset',
                            '  .PortNumber "{i}"'.format(i=self.index-1),
@@ -289,12 +412,11 @@ class DiscretePort(object):
                            ''
                         ])
 
-class LumpedElement(object):
-    index = 1
+class LumpedElement(_Macro):
     def __init__(self, name='element', **kwargs):
-        self.name = "{name}{i}".format(name=name, i=LumpedElement.index)
-        LumpedElement.index += 1
-        self.index = LumpedElement.index
+        i = Names.current().index('LumpedElement')
+        self.name = "{name}{i}".format(name=name, i=i)
+        self.index = i+1
         self.p1 = kwargs.get('P1', (0, 0, 0))
         self.p2 = kwargs.get('P2', (1, 0, 0))
         self.R = kwargs.get('R', 0)
@@ -323,7 +445,7 @@ class LumpedElement(object):
                         ])
 
 
-class Boundary(object):
+class Boundary(_Macro):
     def __init__(self, name='boundary', **kwargs):
         self.name = "{name}".format(name=name)
         self.xmin = kwargs.get('xmin', "electric")
@@ -371,7 +493,7 @@ class Boundary(object):
                            ])
 
 
-class Unit(object):
+class Unit(_Macro):
     def __init__(self, name='unit', **kwargs):
         self.name = "{name}".format(name=name)
     def __str__(self):
@@ -391,7 +513,7 @@ class Unit(object):
                            ])
 
             
-class Material:
+class Material(_Macro):
     tnom = 25.0
     temp = 25.0
     def __init__(self, name='material1', **kwargs):
@@ -428,7 +550,7 @@ class Material:
 
 
 
-class Mesh(object):
+class Mesh(_Macro):
     def __init__(self, **kwargs):
         self.type = kwargs.get('type', 'Tetrahedral')
     def __str__(self):
@@ -436,7 +558,7 @@ class Mesh(object):
                            ''
                            ])
 
-class Solver(object):
+class Solver(_Macro):
     def __init__(self, **kwargs):
         self.frequencyrange = kwargs.get('FrequencyRange', (1, 2))
     def __str__(self):
@@ -445,21 +567,14 @@ class Solver(object):
                            ])
 
 
-class _Extrude(list):
-    _names = {'Extrude':1}
+class _Extrude(_Macro, list):
     def __init__(self, **kwargs):
-        name = kwargs.get('name', 'Extrude')
-        if name in Extrude._names:
-            self.name = "{name}{i}".format(name=name, i=Extrude._names[name])
-            Extrude._names[name] += 1
-        else:
-            self.name = "{name}".format(name=name)
-            Extrude._names[name] = 1
+        self.name = Names.current().name('Extrude', kwargs.get('name', 'Extrude'))
         self.component = kwargs.get('component', 'component1')
         self.material = kwargs.get('material', 'PEC')
         self.zrange = kwargs.get('zrange', (0.0, 1.0))
         
-    def __str__(self):
+    def write_to(self, fileobj):
         s = []
         s.append( 'With Extrude' )
         s.append( '  .Reset' )
@@ -477,31 +592,55 @@ class _Extrude(list):
             s.append( '  .Point "{{pt.x{format}}}", "{{pt.y{format}}}"'.format(format=CST.Formatting).format(pt=self[0]) )
         else:
             s.append( '  .Point "{{pt[0]{format}}}", "{{pt[1]{format}}}"'.format(format=CST.Formatting).format(pt=self[0]) )
+        s.append( '' )
+        fileobj.write( "\n".join(s) )
         for pt in self[1:]:
             if isinstance(pt, Point):
-                s.append( '  .LineTo "{{pt.x{format}}}", "{{pt.y{format}}}"'.format(format=CST.Formatting).format(pt=pt) )
+                fileobj.write( '  .LineTo "{{pt.x{format}}}", "{{pt.y{format}}}"\n'.format(format=CST.Formatting).format(pt=pt) )
             else:
-                s.append( '  .LineTo "{{pt[0]{format}}}", "{{pt[1]{format}}}"'.format(format=CST.Formatting).format(pt=pt) )
-        s.append( '  .Create' )
-        s.append( 'End With' )
-        s.append( '' )
-        return "\n".join(s)
+                fileobj.write( '  .LineTo "{{pt[0]{format}}}", "{{pt[1]{format}}}"\n'.format(format=CST.Formatting).format(pt=pt) )
+        fileobj.write( '  .Create\nEnd With\n' )
 
-class Extrude(list):
-    _names = {'Extrude':1}
+class Extrude(_Macro, list):
     def __init__(self, **kwargs):
-        name = kwargs.get('name', 'Extrude')
-        if name in Extrude._names:
-            self.name = "{name}{i}".format(name=name, i=Extrude._names[name])
-            Extrude._names[name] += 1
-        else:
-            self.name = "{name}".format(name=name)
-            Extrude._names[name] = 1
+        self.name = Names.current().name('Extrude', kwargs.get('name', 'Extrude'))
         self.component = kwargs.get('component', 'component1')
         self.material = kwargs.get('material', 'PEC')
         self.zrange = kwargs.get('zrange', (0.0, 1.0))
         
-    def __str__(self):
+    def _points(self):
+        # (x, y) written in the macro, rounded and without the repeated ones
+        Round = lambda x: round(x*1e6)/1e6
+        pt = self[0]
+        if isPoint(pt):
+            points = ((pt.x, pt.y) for pt in self)
+        else:
+            points = ((pt[0], pt[1]) for pt in self)
+        rounded = []
+        for x, y in points:
+            x, y = Round(x), Round(y)
+            if rounded and rounded[-1]==(x, y): continue
+            rounded.append( (x, y) )
+        return rounded
+
+    def write_to(self, fileobj):
+        points = self._points()
+        replicas = getattr(fileobj, 'replicas', None)
+        if replicas is not None:
+            copy = replicas.find(self, points)
+            if copy:
+                # the copy is only written when its macro is the shorter one
+                copied, written = StringIO(), StringIO()
+                self._copy(copied, *copy)
+                self._write(written, points)
+                if copied.tell() < written.tell():
+                    fileobj.write( copied.getvalue() )
+                else:
+                    fileobj.write( written.getvalue() )
+                return
+        self._write(fileobj, points)
+
+    def _write(self, fileobj, points):
         Round = lambda x: round(x*1e6)/1e6
         s = []
         s.append( 'With Extrude' )
@@ -516,32 +655,36 @@ class Extrude(list):
         s.append( '  .Origin "0.0", "0.0", "{origin}"'.format(origin=Round(self.zrange[0])))
         s.append( '  .Uvector "1.0", "0.0", "0.0" ' )
         s.append( '  .Vvector "0.0", "1.0", "0.0" ' )
-        pt = self[0]
-        if isPoint(pt):
-            x, y = Round(pt.x), Round(pt.y)
-            s.append( '  .Point "{x}", "{y}"'.format(x=x, y=y) )
-            x0, y0 = x, y
-            for pt in self[1:]:
-                x, y = Round(pt.x), Round(pt.y)
-                if x==x0 and y==y0: continue
-                s.append( '  .LineTo "{x}", "{y}"'.format(x=x, y=y) )
-                x0, y0 = x, y
-        else:
-            x, y = Round(pt[0]), Round(pt[1])
-            s.append( '  .Point "{x}", "{y}"'.format(x=x, y=y) )
-            x0, y0 = x, y
-            for pt in self[1:]:
-                x, y = Round(pt[0]), Round(pt[1])
-                if x==x0 and y==y0: continue
-                s.append( '  .LineTo "{x}", "{y}"'.format(x=x, y=y) )
-                x0, y0 = x, y
-        s.append( '  .Create' )
-        s.append( 'End With' )
+        x, y = points[0]
+        s.append( '  .Point "{x}", "{y}"'.format(x=x, y=y) )
         s.append( '' )
-        return "\n".join(s)
+        fileobj.write( "\n".join(s) )
+        for x, y in points[1:]:
+            fileobj.write( '  .LineTo "{x}", "{y}"\n'.format(x=x, y=y) )
+        fileobj.write( '  .Create\nEnd With\n' )
+
+    def _copy(self, fileobj, name, mirror, angle, vector):
+        # copy of the extrusion name (named name_1 by CST) renamed, then mirrored, rotated
+        # and translated
+        Round = lambda x: round(x*1e6)/1e6
+        source = Extrude.__new__(Extrude)
+        source.component, source.name = self.component, name
+        transforms = []
+        if mirror:
+            transforms.append( lambda solid, copy: Transform.Mirror(solid, planenormal=(0, 1, 0), copy=copy) )
+        if Round(angle)%360:
+            transforms.append( lambda solid, copy: Transform.Rotate(solid, angle=(0, 0, Round(angle)), copy=copy) )
+        if Round(vector[0]) or Round(vector[1]) or not transforms:
+            transforms.append( lambda solid, copy: Transform.Translate(solid, vector=(Round(vector[0]), Round(vector[1]), 0), copy=copy) )
+        for i, transform in enumerate(transforms):
+            if i==0:
+                fileobj.write( str(transform(source, True)) )
+                fileobj.write( 'Solid.Rename "{source.component}:{source.name}_1", "{name}"\n'.format(source=source, name=self.name) )
+            else:
+                fileobj.write( '\n' + str(transform(self, False)) )
 
 
-class Group:
+class Group(_Macro):
     def __init__(self):
         self.add = list()
         self.addItem = list()
@@ -560,7 +703,7 @@ class Group:
         s.append('')
         return "\n".join(s)
 
-class MeshSettings:
+class MeshSettings(_Macro):
     def __init__(self, name, size):
         self.name = name
         self.size = size
@@ -586,7 +729,7 @@ try:
 except:
     pass
 try:    
-    from Solid import Solid, Solids, Subtract, Intersect
+    from Solid import Solid, Solids, Subtract, Intersect, ExtrudeHoles
 except:
     pass
 try:    
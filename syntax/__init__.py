@@ -1,9 +1,16 @@
 from math import *
+import numpy
 import clipper
 from linalg import solve
 from libarray import *
 from newton import fmin as newton
 from _functions import *
+from affine import *
+from spatial import *
+import boolean
+from boolean import *
+import curves
+from curves import *
 
 from CSTlib import *
 from gdsii import *
@@ -14,6 +21,14 @@ from layers import *
 
 generator = type((x for x in xrange(5)))
 
+def _coords(points):
+    """ (n, 2) float array with the coordinates of a sequence of points """
+    if isinstance(points, PackedPrimitive):
+        return points.coords
+    if isinstance(points, numpy.ndarray):
+        return numpy.asarray(points, dtype=float).reshape(-1, 2)
+    return numpy.array([(point[0], point[1]) for point in points], dtype=float).reshape(-1, 2)
+
 #__all__ = ['Point', 'Line', 'Primitive', 'Primitives', 'Vector', 'Segment', 'Path', 'Paths', 'Spline', 'linspace', 'newton']
 
 class Point(object):
@@ -258,6 +273,8 @@ class Line(list):
 
 
 class Primitive(list):
+    _bbox = None
+    holes = None    # Primitives, set on the outer contours by the tree booleans
     def __init__(self, *points):
         if len(points):
             if len(points)==1:
@@ -299,44 +316,138 @@ class Primitive(list):
     def __pos__(self):
         return Primitive(mypoint for mypoint in self)
     
+    def Transform(self, affine):
+        obj = Primitive(*[Point(x, y) for x, y in affine.transform(self.tolist())])
+        if self.holes:
+            obj.holes = self.holes.Transform(affine)
+        return obj
+
     def Rotate(self, center=None, angle=None):
-        return Primitive(mypoint.Rotate(center=center, angle=angle) for mypoint in self)
+        return self.Transform(Affine().Rotate(center=center, angle=angle))
     
     def Mirror(self, center=None, planenormal=None):
-        return Primitive(mypoint.Mirror(center=center, planenormal=planenormal) for mypoint in self)
+        return self.Transform(Affine().Mirror(center=center, planenormal=planenormal))
     
     def Translate(self, vector=None, angle=None, radius=None):
-        return Primitive(mypoint.Translate(vector=vector, angle=angle, radius=radius) for mypoint in self)
+        return self.Transform(Affine().Translate(vector=vector, angle=angle, radius=radius))
     
     def __contains__(self, item):
         if isinstance(item, Point):
-            return self.PointInPolygon(self, item) in (-1, 1)
+            xmin, ymin, xmax, ymax = self.bbox
+            if not (xmin <= item.x <= xmax and ymin <= item.y <= ymax):
+                return False
+            return self.PointInPolygon(item) in (-1, 1)
         elif isinstance(item, Primitive):
-            return self.PolygonInPolygon(self, item) in (-1, 1)
+            return item.PolygonInPolygon(self)
 
     def PointInPolygon(self, point):
         return _PointInPolygon(point, self)
 
+    def PointsInPolygon(self, points):
+        """ batched PointInPolygon: numpy array with one 0, +1 or -1 code per point """
+        xy = _coords(points)
+        codes = numpy.zeros(len(xy), dtype=int)
+        xmin, ymin, xmax, ymax = self.bbox
+        inbox = (xy[:,0] >= xmin) & (xy[:,0] <= xmax) & (xy[:,1] >= ymin) & (xy[:,1] <= ymax)
+        codes[inbox] = _PointsInPolygon(xy[inbox], _coords(self))
+        return codes
+
     def PolygonInPolygon(self, item):
+        if isinstance(item, Primitive):
+            xmin, ymin, xmax, ymax = self.bbox
+            xmin2, ymin2, xmax2, ymax2 = item.bbox
+            if xmin < xmin2 or ymin < ymin2 or xmax > xmax2 or ymax > ymax2:
+                return False
         for point in self:
             if _PointInPolygon(point, item) == 0:
                 return False
         return True
         return _PolygonInPolygon(self, item)
     
+    def _boundingbox(self):
+        xs = [point.x for point in self]
+        ys = [point.y for point in self]
+        return min(xs), min(ys), max(xs), max(ys)
+
+    def _extendbbox(self, point):
+        if self._bbox is not None:
+            x, y = point[0], point[1]
+            xmin, ymin, xmax, ymax = self._bbox
+            self._bbox = min(xmin, x), min(ymin, y), max(xmax, x), max(ymax, y)
+
+    @property
+    def bbox(self):
+        """ (xmin, ymin, xmax, ymax) computed once, then kept up to date when the primitive is modified.
+            Points modified in place are not tracked. """
+        if self._bbox is None:
+            self._bbox = self._boundingbox()
+        return self._bbox
+
     @property
     def bounds(self):
-        return Point(self.xmin, self.ymin), Point(self.xmax, self.ymax)
+        xmin, ymin, xmax, ymax = self.bbox
+        return Point(xmin, ymin), Point(xmax, ymax)
     
     def __getitem__(self, y):
         assert isinstance(y, int), 'TypeError: list indices must be integers, not str'
         return list.__getitem__(self, y%len(self))
+
+    def append(self, point):
+        list.append(self, point)
+        self._extendbbox(point)
+
+    def extend(self, points):
+        list.extend(self, points)
+        self._bbox = None
+
+    def __iadd__(self, points):
+        self.extend(points)
+        return self
+
+    def insert(self, i, point):
+        list.insert(self, i, point)
+        self._extendbbox(point)
+
+    def __setitem__(self, i, point):
+        list.__setitem__(self, i, point)
+        self._bbox = None
+
+    def __delitem__(self, i):
+        list.__delitem__(self, i)
+        self._bbox = None
+
+    def __setslice__(self, i, j, points):
+        list.__setslice__(self, i, j, points)
+        self._bbox = None
+
+    def __delslice__(self, i, j):
+        list.__delslice__(self, i, j)
+        self._bbox = None
+
+    def pop(self, i=-1):
+        self._bbox = None
+        return list.pop(self, i)
+
+    def remove(self, point):
+        list.remove(self, point)
+        self._bbox = None
     
     def __getslice__(self, i, j):
         return Primitive(*list.__getslice__(self, i, j))
     
-    def Simplify(self, radius=1e-6):
-        return Primitive(*_Simplify(self, radius))
+    def Simplify(self, radius=1e-6, tolerance=0.0, grid=None):
+        """ consecutive points closer than radius merged, Douglas-Peucker within tolerance,
+            then the points snapped on the grid when given and the repeated and collinear
+            points removed """
+        obj = Primitive(*[Point(x, y) for x, y in _Simplify(self, radius, tolerance, grid)])
+        if self.holes:
+            obj.holes = self.holes.Simplify(radius, tolerance, grid)
+        return obj
+
+    def Fillet(self, radius, n=None):
+        """ every corner rounded by an arc of radius on n points, as few as chorderror()
+            allows when n is None """
+        return Primitive(*[Point(x, y) for x, y in curves.corners(_coords(self), radius, n).tolist()])
     
     @property
     def edges(poly):
@@ -350,26 +461,23 @@ class Primitive(list):
         if not center:
             pt1, pt2 = self.bounds
             center = 0.5*(pt1+pt2)
-        obj = Primitive()
-        for point in self:
-            obj.append( scale*(point-center) )
-        return obj.Translate(vector=center)
+        return self.Transform(Affine().Scale(center=center, scale=scale))
     
     @property
     def xmin(self):
-        return min(point.x for point in self)
+        return self.bbox[0]
     
     @property
     def xmax(self):
-        return max(point.x for point in self)
+        return self.bbox[2]
     
     @property
     def ymin(self):
-        return min(point.y for point in self)
+        return self.bbox[1]
     
     @property
     def ymax(self):
-        return max(point.y for point in self)
+        return self.bbox[3]
 
     def tolist(self):
         return [p.tolist() for p in self]
@@ -414,8 +522,11 @@ class Primitive(list):
                     clip.append(primitive)
         return Xor(self, clip)
 
+    def Offset(self, delta, join=JoinType.Square, miter_limit=2.0, arc_tolerance=None):
+        return Offset(self, delta, join=join, miter_limit=miter_limit, arc_tolerance=arc_tolerance)
+
     def __eq__(self, item):
-        if type(item) is Primitive:
+        if isinstance(item, Primitive):
             for point1, point2 in zip(self, item):
                 if point1<>point2:
                     return False
@@ -434,7 +545,303 @@ class Primitive(list):
     def ongrid(self, grid):
         return Primitive(mypoint.ongrid(grid) for mypoint in self)
 
+    def pack(self):
+        obj = PackedPrimitive(numpy.array(self.tolist(), dtype=float).reshape(-1, 2))
+        obj.holes = self.holes
+        return obj
+
+
+class PackedPrimitive(Primitive):
+    """ Primitive stored in one contiguous float64 buffer of (x, y) rows.
+        Point objects are only built when the primitive is indexed or iterated.
+        The storage of the list base stays empty, every list method reading or
+        writing the points is defined on the buffer. """
+    def __init__(self, *points):
+        list.__init__(self)
+        if len(points)==1 and isinstance(points[0], numpy.ndarray):
+            coords = numpy.array(points[0], dtype=float).reshape(-1, 2)
+        else:
+            if len(points)==1:
+                assert isinstance(points[0], generator), 'TypeError: argument is not a generator'
+                points = list(points[0])
+            coords = numpy.array([(point[0], point[1]) for point in points], dtype=float).reshape(-1, 2)
+        self._buffer = coords
+        self._size = len(coords)
+
+    @property
+    def coords(self):
+        return self._buffer[:self._size]
+
+    def _reserve(self, size):
+        if size > len(self._buffer):
+            buffer = numpy.empty((max(size, 2*len(self._buffer), 4), 2), dtype=float)
+            buffer[:self._size] = self.coords
+            self._buffer = buffer
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        for x, y in self.coords.tolist():
+            yield Point(x, y)
+
+    def __reversed__(self):
+        for x, y in reversed(self.coords.tolist()):
+            yield Point(x, y)
+
+    def __getitem__(self, y):
+        if isinstance(y, slice):
+            return PackedPrimitive(self.coords[y])
+        assert isinstance(y, (int, long, numpy.integer)), 'TypeError: list indices must be integers, not str'
+        x, y = self._buffer[y%self._size]
+        return Point(x, y)
+
+    def __getslice__(self, i, j):
+        return PackedPrimitive(self.coords[i:j])
+
+    def _assign(self, coords):
+        self._buffer, self._size = coords, len(coords)
+        self._bbox = None
+
+    def _matches(self, point):
+        # positions of the points equal to point, Point.__eq__ only matches a Point
+        if type(point) is not Point:
+            return numpy.zeros(0, dtype=int)
+        coords = self.coords
+        return numpy.flatnonzero((coords[:,0]==point.x) & (coords[:,1]==point.y))
+
+    def __setitem__(self, i, point):
+        if isinstance(i, slice):
+            coords = self.coords
+            indices = range(*i.indices(self._size))
+            points = _coords(point)
+            if i.step not in (None, 1):
+                if len(points)<>len(indices):
+                    raise ValueError('attempt to assign sequence of size %d to extended slice of size %d'%(len(points), len(indices)))
+                coords[indices] = points
+            else:
+                start, stop = i.indices(self._size)[:2]
+                stop = max(start, stop)
+                self._assign(numpy.concatenate((coords[:start], points, coords[stop:])))
+            self._bbox = None
+            return
+        self.coords[i%self._size] = point[0], point[1]
+        self._bbox = None
+
+    def __setslice__(self, i, j, points):
+        self.__setitem__(slice(i, j), points)
+
+    def __delitem__(self, i):
+        if isinstance(i, slice):
+            indices = range(*i.indices(self._size))
+        else:
+            indices = [i%self._size]
+        self._assign(numpy.delete(self.coords, indices, axis=0))
+
+    def __delslice__(self, i, j):
+        self.__delitem__(slice(i, j))
+
+    def index(self, point, start=0, stop=None):
+        stop = self._size if stop is None else stop
+        start, stop = slice(start, stop).indices(self._size)[:2]
+        for i in self._matches(point).tolist():
+            if start <= i < stop:
+                return i
+        raise ValueError('%s is not in list'%repr(point))
+
+    def count(self, point):
+        return len(self._matches(point))
+
+    def remove(self, point):
+        self.__delitem__(self.index(point))
+
+    def sort(self, cmp=None, key=None, reverse=False):
+        points = list(self)
+        points.sort(cmp, key, reverse)
+        self.coords[:] = _coords(points)
+
+    def __imul__(self, object):
+        return self.__mul__(object)
+
+    def __lt__(self, item):
+        return list(self) < list(item)
+
+    def __le__(self, item):
+        return list(self) <= list(item)
+
+    def __gt__(self, item):
+        return list(self) > list(item)
+
+    def __ge__(self, item):
+        return list(self) >= list(item)
+
+    def append(self, point):
+        self._reserve(self._size+1)
+        self._buffer[self._size] = point[0], point[1]
+        self._size += 1
+        self._extendbbox(point)
+
+    def extend(self, points):
+        if isinstance(points, PackedPrimitive):
+            coords = points.coords
+        else:
+            coords = numpy.array([(point[0], point[1]) for point in points], dtype=float).reshape(-1, 2)
+        self._reserve(self._size+len(coords))
+        self._buffer[self._size:self._size+len(coords)] = coords
+        self._size += len(coords)
+        self._bbox = None
+
+    def __iadd__(self, points):
+        self.extend(points)
+        return self
+
+    def insert(self, i, point):
+        coords = numpy.insert(self.coords, i, (point[0], point[1]), axis=0)
+        self._buffer, self._size = coords, len(coords)
+        self._extendbbox(point)
+
+    def pop(self, i=-1):
+        point = self[i]
+        coords = numpy.delete(self.coords, i%self._size, axis=0)
+        self._buffer, self._size = coords, len(coords)
+        self._bbox = None
+        return point
+
+    def reverse(self):
+        self.coords[:] = self.coords[::-1].copy()
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def __str__(self):
+        return str(list(self))
+
+    def __reduce__(self):
+        return (PackedPrimitive, (self.coords.copy(),))
+
+    def __eq__(self, item):
+        if isinstance(item, PackedPrimitive):
+            return len(self)==len(item) and bool((self.coords==item.coords).all())
+        return Primitive.__eq__(self, item)
+
+    def __ne__(self, item):
+        return not self.__eq__(item)
+
+    def _operand(self, object):
+        if isinstance(object, Point):
+            return numpy.array([object.x, object.y])
+        if isinstance(object, (float, int)):
+            return float(object)
+        raise Exception('%s is not a float, an integer or a Point'%repr(object))
+
+    def __add__(self, object):
+        return PackedPrimitive(self.coords+self._operand(object))
+
+    def __sub__(self, object):
+        return PackedPrimitive(self.coords-self._operand(object))
+
+    def __mul__(self, object):
+        return PackedPrimitive(self.coords*self._operand(object))
+
+    def __div__(self, object):
+        return PackedPrimitive(self.coords/self._operand(object))
+
+    def __neg__(self):
+        return PackedPrimitive(-self.coords)
+
+    def __pos__(self):
+        return PackedPrimitive(self.coords)
+
+    def Transform(self, affine):
+        obj = PackedPrimitive(affine(self.coords))
+        if self.holes:
+            obj.holes = self.holes.Transform(affine)
+        return obj
+
+    def _boundingbox(self):
+        (xmin, ymin), (xmax, ymax) = self.coords.min(axis=0).tolist(), self.coords.max(axis=0).tolist()
+        return xmin, ymin, xmax, ymax
+
+    @property
+    def edges(self):
+        points = list(self)
+        return [Segment(point1, point2) for point1, point2 in zip(points, points[1:]+points[:1])]
+
+    def tolist(self):
+        return [tuple(xy) for xy in self.coords.tolist()]
+
+    def ongrid(self, grid):
+        coords = self.coords/grid
+        return PackedPrimitive(numpy.sign(coords)*numpy.floor(numpy.abs(coords)+0.5)*grid)
+
+    def pack(self):
+        return self
+
+    def unpack(self):
+        obj = Primitive(*self)
+        obj.holes = self.holes
+        return obj
+
+
+class TransformedPrimitive(PackedPrimitive):
+    """ Primitive defined as the affine transformation of another primitive.
+        Its vertices are only computed on first access. """
+    def __init__(self, source, affine):
+        list.__init__(self)
+        if isinstance(source, TransformedPrimitive) and source._source is not None and not '_buffer' in source.__dict__:
+            source, affine = source._source, affine*source._affine
+        self._source = source
+        self._affine = affine
+        if source.holes:
+            self.holes = source.holes.Transform(affine, lazy=True)
+
+    def __getattr__(self, name):
+        if name in ('_buffer', '_size'):
+            self._buffer = self._affine(_coords(self._source))
+            self._size = len(self._buffer)
+            return self.__dict__[name]
+        raise AttributeError("'TransformedPrimitive' object has no attribute '%s'"%name)
+
+    def _detach(self):
+        # the vertices no longer derive from the source once they are modified
+        self._buffer
+        self._source = None
+
+    def __setitem__(self, i, point):
+        self._detach()
+        PackedPrimitive.__setitem__(self, i, point)
+
+    def append(self, point):
+        self._detach()
+        PackedPrimitive.append(self, point)
+
+    def extend(self, points):
+        self._detach()
+        PackedPrimitive.extend(self, points)
+
+    def insert(self, i, point):
+        self._detach()
+        PackedPrimitive.insert(self, i, point)
+
+    def pop(self, i=-1):
+        self._detach()
+        return PackedPrimitive.pop(self, i)
+
+    def reverse(self):
+        self._detach()
+        PackedPrimitive.reverse(self)
+
+    def __delitem__(self, i):
+        self._detach()
+        PackedPrimitive.__delitem__(self, i)
+
+    def sort(self, cmp=None, key=None, reverse=False):
+        self._detach()
+        PackedPrimitive.sort(self, cmp, key, reverse)
+
+
 class Primitives(list):
+    spatialindex = None
     def __init__(self, *primitives):
         if len(primitives):
             if len(primitives)==1:
@@ -447,34 +854,60 @@ class Primitives(list):
             if not(isinstance(primitive, Primitive)):
                 raise Exception('at least, one element is not a primitive')
         list.__init__(self, list(primitives))
-        
-    def Mirror(self, center=None, planenormal=None):
+
+    def Transform(self, affine, lazy=None):
+        """ transformed copy of the primitives; with lazy, a LazyPrimitives keeping the
+            transformation of these primitives, the default for LazyPrimitives """
+        if lazy is None:
+            lazy = isinstance(self, LazyPrimitives)
+        if lazy:
+            return LazyPrimitives(self, affine)
+        # one matrix product over the vertices of every primitive
+        coords = [_coords(primitive) for primitive in self]
         obj = Primitives()
-        for primitive in self:
-            obj.append( primitive.Mirror(center=center, planenormal=planenormal) )
+        if not coords:
+            return obj
+        result = affine(numpy.concatenate(coords))
+        start = 0
+        for primitive, xy in zip(self, coords):
+            block = result[start:start+len(xy)]
+            start += len(xy)
+            if isinstance(primitive, PackedPrimitive):
+                obj.append( PackedPrimitive(block) )
+            else:
+                obj.append( Primitive(*[Point(x, y) for x, y in block.tolist()]) )
+            if primitive.holes:
+                obj[-1].holes = primitive.holes.Transform(affine)
         return obj
+
+    def Mirror(self, center=None, planenormal=None, lazy=None):
+        return self.Transform(Affine().Mirror(center=center, planenormal=planenormal), lazy=lazy)
     
-    def Translate(self, vector=None, radius=None, angle=None):
-        obj = Primitives()
-        for primitive in self:
-            obj.append( primitive.Translate(vector=vector, radius=radius, angle=angle) )
-        return obj
+    def Translate(self, vector=None, radius=None, angle=None, lazy=None):
+        return self.Transform(Affine().Translate(vector=vector, radius=radius, angle=angle), lazy=lazy)
     
-    def Rotate(self, center=None, angle=None):
-        obj = Primitives()
-        for primitive in self:
-            obj.append( primitive.Rotate(center=center, angle=angle) )
-        return obj
+    def Rotate(self, center=None, angle=None, lazy=None):
+        return self.Transform(Affine().Rotate(center=center, angle=angle), lazy=lazy)
 
-    def Scale(self, center=None, scale=Point(1,1)):
+    def Scale(self, center=None, scale=Point(1,1), lazy=None):
+        if center:
+            return self.Transform(Affine().Scale(center=center, scale=scale), lazy=lazy)
+        # each primitive is scaled around its own center
         obj = Primitives()
         for primitive in self:
             obj.append( primitive.Scale(center=center, scale=scale) )
         return obj
     
+    @property
+    def bbox(self):
+        """ (xmin, ymin, xmax, ymax) combined from the cached bounding box of each primitive """
+        xmins, ymins, xmaxs, ymaxs = zip(*[primitive.bbox for primitive in self])
+        return min(xmins), min(ymins), max(xmaxs), max(ymaxs)
+
     @property
     def bounds(self):
-        return Point(self.xmin, self.ymin), Point(self.xmax, self.ymax)
+        xmin, ymin, xmax, ymax = self.bbox
+        return Point(xmin, ymin), Point(xmax, ymax)
     
     def __mul__(self, object):
         obj = Primitives()
@@ -517,24 +950,30 @@ class Primitives(list):
     
     @property
     def xmin(self):
-        return min(primitive.xmin for primitive in self)
+        return min(primitive.bbox[0] for primitive in self)
     
     @property
     def xmax(self):
-        return max(primitive.xmax for primitive in self)
+        return max(primitive.bbox[2] for primitive in self)
     
     @property
     def ymin(self):
-        return min(primitive.ymin for primitive in self)
+        return min(primitive.bbox[1] for primitive in self)
     
     @property
     def ymax(self):
-        return max(primitive.ymax for primitive in self)
+        return max(primitive.bbox[3] for primitive in self)
 
-    def Simplify(self, radius=1e-6):
+    def Fillet(self, radius, n=None):
         obj = Primitives()
         for primitive in self:
-            obj.append( primitive.Simplify(radius=radius) )
+            obj.append( primitive.Fillet(radius, n=n) )
+        return obj
+
+    def Simplify(self, radius=1e-6, tolerance=0.0, grid=None):
+        obj = Primitives()
+        for primitive in self:
+            obj.append( primitive.Simplify(radius, tolerance, grid) )
         return obj
 
     def Difference(self, *objs):
@@ -549,16 +988,19 @@ class Primitives(list):
     
     def Union(self, *objs):
         clip = Primitives()
-        if len(objs)>0:
-            for obj in objs:
-                if isinstance(obj, Primitive):
-                    clip.append(obj)
-                elif isinstance(obj, Primitives):
-                    for primitive in obj:
-                        clip.append(primitive)
+        for obj in objs:
+            if isinstance(obj, Primitive):
+                clip.append(obj)
+            elif isinstance(obj, Primitives):
+                for primitive in obj:
+                    clip.append(primitive)
+        # the NonZero rule applies within each operand: they are turned the same way
+        # for the bulk union, unless one of them is wound both ways (holes)
+        steps = _ClipSteps(None)
+        subject, others = boolean.orient(_ClipPolygons(self, steps)), boolean.orient(_ClipPolygons(clip, steps))
+        if subject is None or others is None:
             return Union(self, clip)
-        else:
-            return Union(self[0], Primitives(*self[1:]))
+        return _ClipPrimitives(boolean.bulkunion(subject+others, integer=steps is not None), steps)
     
     def Intersection(self, *objs):
         clip = Primitives()
@@ -580,49 +1022,288 @@ class Primitives(list):
                     clip.append(primitive)
         return Xor(self, clip)
 
+    def Offset(self, delta, join=JoinType.Square, miter_limit=2.0, arc_tolerance=None):
+        return Offset(self, delta, join=join, miter_limit=miter_limit, arc_tolerance=arc_tolerance)
+
     def ongrid(self, grid):
         obj = Primitives()
         for primitive in self:
             obj.append( primitive.ongrid(grid) )
         return obj
-        
+
+    def pack(self):
+        obj = Primitives()
+        for primitive in self:
+            obj.append( primitive.pack() )
+        return obj
+
+    def PointsInPolygon(self, points):
+        """ numpy array with one code per point: +1 inside a primitive, -1 on the boundary
+            of a primitive (and inside none), 0 outside all of them """
+        xy = _coords(points)
+        inside = numpy.zeros(len(xy), dtype=bool)
+        boundary = numpy.zeros(len(xy), dtype=bool)
+        # points sorted along x so that each primitive only sees the points of its bounding box
+        order = numpy.argsort(xy[:,0], kind='mergesort')
+        xs = xy[order,0]
+        for primitive in self:
+            xmin, ymin, xmax, ymax = primitive.bbox
+            candidates = order[numpy.searchsorted(xs, xmin, 'left'):numpy.searchsorted(xs, xmax, 'right')]
+            candidates = candidates[(xy[candidates,1] >= ymin) & (xy[candidates,1] <= ymax)]
+            if not len(candidates):
+                continue
+            codes = _PointsInPolygon(xy[candidates], _coords(primitive))
+            inside[candidates[codes==1]] = True
+            boundary[candidates[codes==-1]] = True
+        return numpy.where(inside, 1, numpy.where(boundary, -1, 0))
+
+    def Index(self, cellsize=None):
+        """ attach a uniform grid over the bounding boxes of the primitives.
+            The index follows append and extend, any other change of the list drops it;
+            primitives modified in place are not tracked. """
+        self.spatialindex = GridIndex([primitive.bbox for primitive in self], cellsize)
+        return self.spatialindex
+
+    def _grid(self):
+        if self.spatialindex is not None:
+            return self.spatialindex
+        return GridIndex([primitive.bbox for primitive in self])
+
+    def Window(self, xmin, ymin, xmax, ymax):
+        # primitives whose bounding box overlaps the window
+        obj = Primitives()
+        for i in self._grid().window(xmin, ymin, xmax, ymax):
+            obj.append( self[i] )
+        return obj
+
+    def Nearest(self, point):
+        distance = lambda i, x, y: _PointPolygonDistance(Point(x, y), self[i])
+        i = self._grid().nearest(point.x, point.y, distance)
+        if i is None:
+            return None
+        return self[i]
+
+    def Touching(self, primitive):
+        # primitives overlapping or touching primitive
+        obj = Primitives()
+        for i in self._grid().window(*primitive.bbox):
+            if self[i] is primitive:
+                continue
+            if not _PolygonOutPolygon(self[i], primitive):
+                obj.append( self[i] )
+        return obj
+
+    def append(self, primitive):
+        list.append(self, primitive)
+        if self.spatialindex is not None:
+            self.spatialindex.insert(primitive.bbox)
+
+    def extend(self, primitives):
+        primitives = list(primitives)
+        list.extend(self, primitives)
+        if self.spatialindex is not None:
+            for primitive in primitives:
+                self.spatialindex.insert(primitive.bbox)
+
+    def __iadd__(self, primitives):
+        self.extend(primitives)
+        return self
+
+    def insert(self, i, primitive):
+        list.insert(self, i, primitive)
+        self.spatialindex = None
+
+    def __setitem__(self, i, primitive):
+        list.__setitem__(self, i, primitive)
+        self.spatialindex = None
+
+    def __delitem__(self, i):
+        list.__delitem__(self, i)
+        self.spatialindex = None
+
+    def __setslice__(self, i, j, primitives):
+        list.__setslice__(self, i, j, primitives)
+        self.spatialindex = None
+
+    def __delslice__(self, i, j):
+        list.__delslice__(self, i, j)
+        self.spatialindex = None
+
+    def pop(self, i=-1):
+        self.spatialindex = None
+        return list.pop(self, i)
+
+    def remove(self, primitive):
+        list.remove(self, primitive)
+        self.spatialindex = None
+
+    def reverse(self):
+        list.reverse(self)
+        self.spatialindex = None
+
+    def sort(self, *args, **kwargs):
+        list.sort(self, *args, **kwargs)
+        self.spatialindex = None
+
+
+class LazyPrimitives(Primitives):
+    """ Primitives defined as the affine transformation of other Primitives.
+        Consecutive transformations are folded into one matrix and the vertices
+        of each primitive are only computed when they are accessed. """
+    def __init__(self, source, affine):
+        if isinstance(source, LazyPrimitives) and source.reference:
+            source, affine = source.source, affine*source.affine
+        list.__init__(self, [TransformedPrimitive(primitive, affine) for primitive in source])
+        self.source = source
+        self.affine = affine
+
+    @property
+    def reference(self):
+        """ (source, affine) while the primitives are still the transformation of source, None otherwise """
+        if len(self)<>len(self.source):
+            return None
+        for primitive, original in zip(self, self.source):
+            if not isinstance(primitive, TransformedPrimitive):
+                return None
+            if primitive._source is not original or primitive._affine is not self.affine:
+                return None
+        return self.source, self.affine
+
         
 # clipper wrap
-def Intersection(subject, clip):
-    return _Clip(subject, clip, clipper.ClipType.Intersection)
-def Union(subject, clip):
-    return _Clip(subject, clip, clipper.ClipType.Union)
-def Difference(subject, clip):
-    return _Clip(subject, clip, clipper.ClipType.Difference)
-def Xor(subject, clip):
-    return _Clip(subject, clip, clipper.ClipType.Xor)
-    
-def _Clip(subject, clip, cliptype):
-    c = clipper.Clipper()
-    if isinstance(subject, Primitive):
-        polygon = [clipper.Point(point.x, point.y) for point in subject]
-        c.AddPolygon(polygon, clipper.PolyType.Subject)
-    elif isinstance(subject, Primitives):
-        for primitive in subject:
-            polygon = [clipper.Point(point.x, point.y) for point in primitive]
-            c.AddPolygon(polygon, clipper.PolyType.Subject)
-    if isinstance(clip, Primitive):
-        polygon = [clipper.Point(point.x, point.y) for point in clip]
-        c.AddPolygon(polygon, clipper.PolyType.Subject)
-    elif isinstance(clip, Primitives):
-        for primitive in clip:
-            polygon = [clipper.Point(point.x, point.y) for point in primitive]
-            c.AddPolygon(polygon, clipper.PolyType.Clip)
-    solution = []
-    pft = clipper.PolyFillType.NonZero
-    result = c.Execute(cliptype, solution, pft, pft)
+global __integerclip__
+__integerclip__ = False
+def integerclip(flag=True):
+    """ snap the polygons on the gds database grid (gdsii.unit/gdsii.precision)
+        and clip them as integers """
+    global __integerclip__
+    __integerclip__ = flag
+
+global __simplify__
+__simplify__ = None
+def simplify(tolerance=None):
+    """ reduce the polygons before clipping and gds export: Douglas-Peucker within tolerance,
+        snapped on the gds database grid and without repeated and collinear points;
+        None disables it """
+    global __simplify__
+    __simplify__ = tolerance
+    gdsii.Cell.simplify = tolerance
+
+# with tree=True, the outer contours are returned with their holes in primitive.holes
+def Intersection(subject, clip, integer=None, tiles=None, tree=False):
+    return _Clip(subject, clip, clipper.ClipType.Intersection, integer, tiles, tree)
+def Union(subject, clip, integer=None, tiles=None, tree=False):
+    return _Clip(subject, clip, clipper.ClipType.Union, integer, tiles, tree)
+def Difference(subject, clip, integer=None, tiles=None, tree=False):
+    return _Clip(subject, clip, clipper.ClipType.Difference, integer, tiles, tree)
+def Xor(subject, clip, integer=None, tiles=None, tree=False):
+    return _Clip(subject, clip, clipper.ClipType.Xor, integer, tiles, tree)
+
+class Boolean(object):
+    """ booleans of a prepared subject against changing clip primitives:
+            shield = Boolean(ground)
+            for via in vias:
+                holes = shield.Difference(via)
+        Add() accumulates clip primitives, an operation called with primitives
+        replaces them. """
+    def __init__(self, subject, integer=None):
+        self.steps = _ClipSteps(integer)
+        self.context = boolean.Context(_ClipPolygons(subject, self.steps), self.steps is not None)
+
+    def Add(self, *objs):
+        for obj in objs:
+            self.context.add(_ClipPolygons(obj, self.steps))
+        return self
+
+    def Clear(self):
+        self.context.clear()
+        return self
+
+    def _Execute(self, cliptype, objs):
+        if len(objs)>0:
+            self.Clear()
+            self.Add(*objs)
+        return _ClipPrimitives(self.context.execute(cliptype), self.steps)
+
+    def Difference(self, *objs):
+        return self._Execute(clipper.ClipType.Difference, objs)
+
+    def Union(self, *objs):
+        return self._Execute(clipper.ClipType.Union, objs)
+
+    def Intersection(self, *objs):
+        return self._Execute(clipper.ClipType.Intersection, objs)
+
+    def Xor(self, *objs):
+        return self._Execute(clipper.ClipType.Xor, objs)
+
+def Offset(primitives, delta, join=JoinType.Square, miter_limit=2.0, arc_tolerance=None, closed=True,
+           end=EndType.Butt, integer=None):
+    """ offset of primitives, see boolean.offset; the Round joins and ends default to
+        one database step between the arcs and their chords """
+    steps = _ClipSteps(integer)
+    scale = steps or 1
+    arc_tolerance = (arc_tolerance or 1.0/gdsii.resolution())*scale
+    polygons = boolean.offset(_ClipPolygons(primitives, steps, closed), delta*scale, join, miter_limit,
+                              arc_tolerance, closed, end, steps is not None)
+    return _ClipPrimitives(polygons, steps)
+
+def BulkUnion(primitives, groupsize=64, integer=None):
+    """ union of a large set of primitives, see boolean.bulkunion """
+    steps = _ClipSteps(integer)
+    polygons = boolean.bulkunion(_ClipPolygons(primitives, steps), groupsize, steps is not None)
+    return _ClipPrimitives(polygons, steps)
+
+def _ClipSteps(integer):
+    # database steps per user unit when clipping on integers
+    if integer is None:
+        integer = __integerclip__
+    return gdsii.resolution() if integer else None
+
+def _ClipPolygons(primitives, steps=None, closed=True):
+    # (x, y) of each polygon, as database steps when steps is given
+    if isinstance(primitives, (Primitive, Path)):
+        primitives = [primitives]
+    polygons = []
+    for primitive in primitives:
+        if __simplify__ is not None:
+            polygon = _Simplify(primitive, 0, __simplify__, 1.0/gdsii.resolution(), closed)
+            if len(polygon) < (3 if closed else 2):
+                continue
+        else:
+            polygon = [(x, y) for x, y in _coords(primitive).tolist()]
+        if steps is not None:
+            coords = numpy.floor(_coords(polygon)*steps + 0.5).astype(int)
+            polygon = [(x, y) for x, y in coords.tolist()]
+        polygons.append(polygon)
+    return polygons
+
+def _ClipPrimitives(polygons, steps=None):
     primitives = Primitives()
-    for bloc in solution:
-        p = Primitive()
-        for point in bloc:
-            p.append( Point(float(point.x), float(point.y)) )
+    for polygon in polygons:
+        if steps is None:
+            p = Primitive(*[Point(float(x), float(y)) for x, y in polygon])
+        else:
+            # back to user units once, on the output only
+            coords = numpy.array(polygon, dtype=float)/steps
+            p = Primitive(*[Point(x, y) for x, y in coords.tolist()])
         primitives.append(p)
     return primitives
+    
+def _Clip(subject, clip, cliptype, integer=None, tiles=None, tree=False):
+    steps = _ClipSteps(integer)
+    if tree:
+        # a single sweep, the tiles would cut the contours
+        primitives = Primitives()
+        for outer, holes in boolean.cliptree(_ClipPolygons(subject, steps), _ClipPolygons(clip, steps),
+                                             cliptype, steps is not None):
+            primitive = _ClipPrimitives([outer], steps)[0]
+            primitive.holes = _ClipPrimitives(holes, steps)
+            primitives.append(primitive)
+        return primitives
+    polygons = boolean.tiledclip(_ClipPolygons(subject, steps), _ClipPolygons(clip, steps),
+                                 cliptype, tiles, steps is not None)
+    return _ClipPrimitives(polygons, steps)
                         
 
 class Vector(Point):
@@ -677,6 +1358,11 @@ class Segment(list):
                 return 2
             
         p1, q1, p2, q2 = self[0], self[1], segment[0], segment[1]
+        # disjoint bounding boxes can not intersect
+        if max(p1.x, q1.x) < min(p2.x, q2.x) or max(p2.x, q2.x) < min(p1.x, q1.x):
+            return None
+        if max(p1.y, q1.y) < min(p2.y, q2.y) or max(p2.y, q2.y) < min(p1.y, q1.y):
+            return None
         # Find the four orientations needed for general and
         # special cases
         o1 = orientation(p1, q1, p2)
@@ -735,56 +1421,50 @@ class Path(list):
             r.append( Vector(poly[i+1].x-poly[i].x, poly[i+1].y-poly[i].y) )
         return r
     
-    def Simplify(self, radius=1e-6):
-        return Path(*_Simplify(self, radius))
+    def Simplify(self, radius=1e-6, tolerance=0.0, grid=None):
+        """ see Primitive.Simplify, the reduction keeps the first and last points """
+        return Path(*[Point(x, y) for x, y in _Simplify(self, radius, tolerance, grid, closed=False)])
+
+    def Fillet(self, radius, n=None):
+        """ every inner corner rounded by an arc of radius on n points, see Primitive.Fillet """
+        if len(self)<3:
+            return Path(*self)
+        return Path(*[Point(x, y) for x, y in curves.corners(_coords(self), radius, n, closed=False).tolist()])
+
+    def Offset(self, delta, join=JoinType.Square, end=EndType.Butt, miter_limit=2.0, arc_tolerance=None):
+        """ outline at delta on both sides of the path """
+        return Offset(Primitive(*self), delta, join=join, miter_limit=miter_limit, arc_tolerance=arc_tolerance,
+                      closed=False, end=end)
     
     def enlarge(self, width):
-        primitive = Primitive()
-
-        vector = self.vectors[0].orthogonal()
-        primitive.append( self[0]-0.5*width*vector/vector.norm() )
-
-        vector = self.vectors[0].orthogonal()
-        primitive.append( self[0]+0.5*width*vector/vector.norm() )
-    
-        for i in xrange(len(self)-2):
-            vector = self.vectors[i].orthogonal()
-            line3 = Line(self[i], self[i+1]).Translate(vector=0.5*width*vector/vector.norm())
-            vector = self.vectors[i+1].orthogonal()
-            line4 = Line(self[i+1], self[i+2]).Translate(vector=0.5*width*vector/vector.norm())
-            try:
-                primitive.append( line3.Intersect(line4) )
-            except:
-                # colinear
-                pass
-
-        vector = self.vectors[-1].orthogonal()
-        primitive.append( self[-1]+0.5*width*vector/vector.norm() )
-    
-        vector = self.vectors[-1].orthogonal()
-        primitive.append( self[-1]-0.5*width*vector/vector.norm() )
-   
-        for i in xrange(len(self)-3, -1, -1):
-            vector = self.vectors[i].orthogonal()
-            line3 = Line(self[i], self[i+1]).Translate(vector=-0.5*width*vector/vector.norm())
-            vector = self.vectors[i+1].orthogonal()
-            line4 = Line(self[i+1], self[i+2]).Translate(vector=-0.5*width*vector/vector.norm())
-            try:
-                primitive.append( line3.Intersect(line4) )
-            except:
-                # colinear
-                pass
-
-        return primitive
-    
+        """ polygon of the path widened by width, or by width[i] along the segment i """
+        xy = _coords(self)
+        d = xy[1:]-xy[:-1]
+        widths = numpy.zeros(len(d)) + numpy.asarray(width, dtype=float)
+        assert widths.shape==(len(d),), 'TypeError: one width per segment is expected'
+        # repeated points have no direction
+        length = numpy.hypot(d[:,0], d[:,1])
+        keep = length>0
+        xy = numpy.concatenate((xy[:1], xy[1:][keep]))
+        d = d[keep]/length[keep][:,None]
+        widths = widths[keep]
+        # offsets of each segment, the normal is the direction rotated by +90deg
+        h = 0.5*widths[:,None]*numpy.column_stack((-d[:,1], d[:,0]))
+        plus = _enlargeside(xy, d, h)
+        minus = _enlargeside(xy, d, -h)
+        return Primitive(*[Point(x, y) for x, y in [minus[0]]+plus+minus[:0:-1]])
+
+    def Transform(self, affine):
+        return Path(*[Point(x, y) for x, y in affine.transform(point.tolist() for point in self)])
+
     def Rotate(self, center=None, angle=None):
-        return Path(*[mypoint.Rotate(center=center, angle=angle) for mypoint in self])
+        return self.Transform(Affine().Rotate(center=center, angle=angle))
     
     def Mirror(self, center=None, planenormal=None):
-        return Path(*[mypoint.Mirror(center=center, planenormal=planenormal) for mypoint in self])
+        return self.Transform(Affine().Mirror(center=center, planenormal=planenormal))
     
     def Translate(self, vector=None):
-        return Path(*[mypoint.Translate(vector=vector) for mypoint in self])
+        return self.Transform(Affine().Translate(vector=vector))
     
     def __add__(self, object):
         assert isinstance(object, Point) , 'TypeError: %s is not a Point'%repr(object)
@@ -851,6 +1531,25 @@ class Path(list):
     def ymax(self):
         return max(point.y for point in self)
     
+def _enlargeside(xy, d, h):
+    # one side of Path.enlarge: the offset segments are joined at the intersection
+    # of their lines, colinear segments of the same width share their point
+    a = xy[1:-1]+h[:-1]
+    b = xy[1:-1]+h[1:]
+    d1, d2 = d[:-1], d[1:]
+    cross = d1[:,0]*d2[:,1]-d1[:,1]*d2[:,0]
+    colinear = numpy.abs(cross)<1e-9
+    t = ((b[:,0]-a[:,0])*d2[:,1]-(b[:,1]-a[:,1])*d2[:,0])/numpy.where(colinear, 1.0, cross)
+    joints = a+t[:,None]*d1
+    side = [tuple(xy[0]+h[0])]
+    for joint, start, stop, flag in zip(joints.tolist(), a.tolist(), b.tolist(), colinear.tolist()):
+        if not flag:
+            side.append(tuple(joint))
+        elif start!=stop:
+            side.extend((tuple(start), tuple(stop)))
+    side.append(tuple(xy[-1]+h[-1]))
+    return side
+
 class Paths(list):
     def __init__(self, *paths):
         for path in paths:
@@ -866,22 +1565,39 @@ def polyval(p,x):
     return y
 
 def Spline(curve1, curve2, n=100):
-    n = int(n)
     if isinstance(curve1, Segment) and isinstance(curve2, Segment): 
-        x0, y0 = curve1[1].x, curve1[1].y
-        x1, y1 = curve2[0].x, curve2[0].y
+        return Splines([(curve1, curve2)], n)[0]
+
+def Splines(pairs, n=100):
+    """ Spline of each (segment1, segment2) pair, solved and sampled together on n points,
+        or on as few points as chorderror() allows when n is None """
+    rows = []
+    for curve1, curve2 in pairs:
         slope0 = (curve1[1].y-curve1[0].y)/(curve1[1].x-curve1[0].x)
         slope1 = (curve2[1].y-curve2[0].y)/(curve2[1].x-curve2[0].x)
-        A = array([[x0**3, x0**2, x0, 1.0],
-                   [x1**3, x1**2, x1, 1.0],
-                   [3.0*x0**2, 2.0*x0, 1.0, 0.0],
-                   [3.0*x1**2, 2.0*x1, 1.0, 0.0]])
-        B = array([y0, y1, slope0, slope1])
-        X = solve(A, B)
-        curve3 = []
-        for x in linspace(x0, x1, n):
-            curve3.append( Point(x, polyval(X, x)) )
-        return Path(*curve3)
+        rows.append((curve1[1].x, curve1[1].y, slope0, curve2[0].x, curve2[0].y, slope1))
+    if not rows:
+        return []
+    rows = numpy.array(rows)
+    if n:
+        counts = numpy.zeros(len(rows), dtype=int) + int(n)
+    else:
+        counts = curves.splinesamples(rows)
+    # the splines with the same number of points are sampled together
+    paths = [None]*len(rows)
+    for count in set(counts.tolist()):
+        index = numpy.flatnonzero(counts==count)
+        for i, curve in zip(index.tolist(), curves.splines(rows[index], count)):
+            paths[i] = Path(*[Point(x, y) for x, y in curve.tolist()])
+    return paths
+
+def Arc(center, radius, start, stop, n=100):
+    """ Path of the arc from the angle start to stop, in degrees, on n points or on
+        as few points as chorderror() allows when n is None """
+    if not n:
+        n = curves.arcsegments(radius, (stop-start)*pi/180.)+1
+    curve = curves.arcs([(center.x, center.y)], radius, start, stop, int(n))[0]
+    return Path(*[Point(x, y) for x, y in curve.tolist()])
 
 
 ####### functions
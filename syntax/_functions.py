@@ -1,6 +1,8 @@
 from math import *
+import numpy
 
-__all__ = ['_PointInPolygon', '_PolygonInPolygon', '_Simplify', '_Clockwise', '_Distance']
+__all__ = ['_PointInPolygon', '_PointsInPolygon', '_PolygonInPolygon', '_PolygonOutPolygon', '_EdgesIntersect',
+           '_PointPolygonDistance', '_Simplify', '_Clockwise', '_Distance']
 
 def _PointInPolygon(pt, path):
     #returns 0 if false, +1 if true, -1 if pt ON polygon boundary
@@ -35,6 +37,32 @@ def _PointInPolygon(pt, path):
         ip = ipNext
     return result
 
+def _PointsInPolygon(xy, path):
+    """ Vectorized _PointInPolygon: classify the (n, 2) array of points xy against
+        the (m, 2) array of vertices path. Returns an int array of 0, +1 or -1 codes. """
+    xy = numpy.asarray(xy, dtype=float).reshape(-1, 2)
+    path = numpy.asarray(path, dtype=float).reshape(-1, 2)
+    px, py = xy[:,0], xy[:,1]
+    inside = numpy.zeros(len(xy), dtype=bool)
+    boundary = numpy.zeros(len(xy), dtype=bool)
+    if len(path) < 3:
+        return numpy.zeros(len(xy), dtype=int)
+    # the edges are processed one at a time, all the points at once
+    for (ipx, ipy), (inx, iny) in zip(path.tolist(), numpy.roll(path, -1, axis=0).tolist()):
+        on_y = iny == py
+        boundary |= on_y & ((inx == px) | ((ipy == py) & ((inx > px) == (ipx < px))))
+        crossing = (ipy < py) != (iny < py)
+        if not crossing.any():
+            continue
+        right = ipx >= px
+        nextright = inx > px
+        inside ^= crossing & right & nextright
+        mixed = crossing & (right != nextright)
+        d = (ipx - px) * (iny - py) - (inx - px) * (ipy - py)
+        boundary |= mixed & (d == 0)
+        inside ^= mixed & (d != 0) & ((d > 0) == (iny > ipy))
+    return numpy.where(boundary, -1, inside.astype(int))
+
 def _PointInPolygon_old(self, item):
     cn = 0    # the  crossing number counter
     # loop through all edges of the polygon
@@ -71,44 +99,152 @@ def _PolygonInPolygon(polygon1, polygon2):
             return False
     return True
 
-def _PolygonOutPolygon(polygon1, polygon2):
-    for point in polygon1:
-        if _PointInPolygon(point, polygon2) in (-1, 1):
-            return False
-    for point in polygon2:
-        if _PointInPolygon(point, polygon1) in (-1, 1):
-            return False
-    segments1 = []
-    for i in xrange(len(polygon1)-1):
-        segments1.append( (polygon1[i], polygon1[i+1]) )
-    segments1.append( (polygon1[-1], polygon1[0]) )
-    segments2 = []
-    for i in xrange(len(polygon2)-1):
-        segments2.append( (polygon2[i], polygon2[i+1]) )
-    segments2.append( (polygon2[-1], polygon2[0]) )
-
-    for segment1 in segments1:
-        for segment2 in segments2:
+def _BoundingBox(polygon):
+    xs = [point.x for point in polygon]
+    ys = [point.y for point in polygon]
+    return min(xs), min(ys), max(xs), max(ys)
+
+def _EdgesIntersect(polygon1, polygon2):
+    """ True if an edge of polygon1 crosses an edge of polygon2.
+        The edges are swept along x so that only edges with overlapping extents are compared. """
+    events = []
+    for tag, polygon in enumerate((polygon1, polygon2)):
+        points = list(polygon)
+        for p, q in zip(points, points[1:]+points[:1]):
+            events.append( (min(p.x, q.x), max(p.x, q.x), min(p.y, q.y), max(p.y, q.y), tag, p, q) )
+    events.sort(key=lambda event: event[0])
+    active = ([], [])
+    for xmin, xmax, ymin, ymax, tag, p, q in events:
+        other = [edge for edge in active[1-tag] if edge[1] >= xmin]
+        active[1-tag][:] = other
+        for edge in other:
+            if edge[3] < ymin or edge[2] > ymax:
+                continue
             try:
-                _Intersect(segment1[0], segment1[1], segment2[0], segment2[1])
-                return False
-            except:
+                _Intersect(p, q, edge[5], edge[6])
+                return True
+            except TypeError:
                 pass
-    return True
+        active[tag].append( (xmin, xmax, ymin, ymax, tag, p, q) )
+    return False
+
+def _PolygonOutPolygon(polygon1, polygon2):
+    bbox1, bbox2 = _BoundingBox(polygon1), _BoundingBox(polygon2)
+    if bbox1[2] < bbox2[0] or bbox2[2] < bbox1[0] or bbox1[3] < bbox2[1] or bbox2[3] < bbox1[1]:
+        return True
+    for points, polygon, bbox in ((polygon1, polygon2, bbox2), (polygon2, polygon1, bbox1)):
+        for point in points:
+            if bbox[0] <= point.x <= bbox[2] and bbox[1] <= point.y <= bbox[3]:
+                if _PointInPolygon(point, polygon) in (-1, 1):
+                    return False
+    return not _EdgesIntersect(polygon1, polygon2)
+
+def _SegmentDistance(pt, p, q):
+    dx, dy = q.x-p.x, q.y-p.y
+    d2 = dx*dx+dy*dy
+    t = 0.0 if d2==0 else max(0.0, min(1.0, ((pt.x-p.x)*dx+(pt.y-p.y)*dy)/d2))
+    return sqrt( (p.x+t*dx-pt.x)**2 + (p.y+t*dy-pt.y)**2 )
+
+def _PointPolygonDistance(pt, polygon):
+    # 0 inside or on the boundary, else distance to the closest edge
+    if _PointInPolygon(pt, polygon) <> 0:
+        return 0.0
+    points = list(polygon)
+    return min(_SegmentDistance(pt, p, q) for p, q in zip(points, points[1:]+points[:1]))
+
+def _Unique(xy, closed=True):
+    # the points without their consecutive repetitions
+    if len(xy) < 2:
+        return xy
+    keep = numpy.ones(len(xy), dtype=bool)
+    keep[1:] = (xy[1:] != xy[:-1]).any(axis=1)
+    xy = xy[keep]
+    if closed and len(xy) > 1 and (xy[0] == xy[-1]).all():
+        xy = xy[:-1]
+    return xy
 
-def _Simplify(points, radius=1e-6):
+def _Collinear(xy, closed=True):
+    # mask of the points that are not on the line through their neighbours,
+    # the ends of an open polyline are kept
+    keep = numpy.ones(len(xy), dtype=bool)
+    if len(xy) < 3:
+        return keep
+    if closed:
+        previous, following, middle = numpy.roll(xy, 1, axis=0), numpy.roll(xy, -1, axis=0), keep
+    else:
+        previous, following, middle = xy[:-2], xy[2:], keep[1:-1]
+        xy = xy[1:-1]
+    d1, d2 = xy-previous, following-xy
+    cross = d1[:,0]*d2[:,1] - d1[:,1]*d2[:,0]
+    scale = numpy.hypot(d1[:,0], d1[:,1])*numpy.hypot(d2[:,0], d2[:,1])
+    # backtracking points (spikes) are collinear as well
+    middle[:] = numpy.abs(cross) > 1e-12*scale
+    return keep
+
+def _DouglasPeucker(xy, tolerance):
+    # mask of the points kept by Douglas-Peucker on the open polyline xy
+    n = len(xy)
+    keep = numpy.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n-1)]
+    while stack:
+        i, j = stack.pop()
+        if j-i < 2:
+            continue
+        a, d = xy[i], xy[j]-xy[i]
+        p = xy[i+1:j]-a
+        # distance to the segment, which also handles the closed ring (a == b)
+        length = d[0]*d[0] + d[1]*d[1]
+        t = numpy.clip(numpy.dot(p, d)/length, 0.0, 1.0) if length > 0 else numpy.zeros(len(p))
+        e = p - t[:,None]*d
+        distance = numpy.hypot(e[:,0], e[:,1])
+        k = int(distance.argmax())
+        if distance[k] > tolerance:
+            k += i+1
+            keep[k] = True
+            stack.append((i, k))
+            stack.append((k, j))
+    return keep
+
+def _Merge(xy, radius):
+    # consecutive points closer than radius replaced by their middle
+    xy = xy.tolist()
     shape = []
-    i=0
-    while i<len(points)-1:
-        if points[i].distance(points[i+1])>radius:
-            shape.append(points[i])
+    i = 0
+    while i < len(xy)-1:
+        (x0, y0), (x1, y1) = xy[i], xy[i+1]
+        if sqrt((x1-x0)**2 + (y1-y0)**2) > radius:
+            shape.append((x0, y0))
             i = i+1
         else:
-            shape.append(0.5*(points[i]+points[i+1]))
+            shape.append((0.5*(x0+x1), 0.5*(y0+y1)))
             i = i+2
-    if self[-1].distance(shape[-1])>radius:
-        shape.append(points[-1])
-    return shape
+    if xy and (not shape or _Distance(xy[-1], shape[-1]) > radius):
+        shape.append(tuple(xy[-1]))
+    return numpy.array(shape, dtype=float).reshape(-1, 2)
+
+def _Simplify(points, radius=1e-6, tolerance=0.0, grid=None, closed=True):
+    """ (x, y) of the points without the consecutive ones closer than radius (merged in
+        their middle), reduced by Douglas-Peucker within tolerance, snapped on the grid
+        and without their repeated and collinear points """
+    xy = numpy.array([(pt[0], pt[1]) for pt in points], dtype=float).reshape(-1, 2)
+    if radius > 0:
+        xy = _Merge(xy, radius)
+    if tolerance and len(xy) > 2:
+        if closed:
+            xy = xy[_DouglasPeucker(numpy.vstack((xy, xy[:1])), tolerance)[:-1]]
+        else:
+            xy = xy[_DouglasPeucker(xy, tolerance)]
+    if grid:
+        # snapped after the reduction, the grid may be coarser than the tolerance
+        xy = numpy.floor(xy/grid + 0.5)*grid
+    xy = _Unique(xy, closed)
+    keep = _Collinear(xy, closed)
+    while not keep.all():
+        # removing a spike may leave a repeated point or another spike
+        xy = _Unique(xy[keep], closed)
+        keep = _Collinear(xy, closed)
+    return [(x, y) for x, y in xy.tolist()]
 
 def _Distance(point1, point2):
     return sqrt( (point1[0]-point2[0])**2 + (point1[1]-point2[1])**2 )
@@ -0,0 +1,122 @@
+from math import pi, cos, sin, sqrt, atan2
+import numpy
+
+__all__ = ['Affine']
+
+
+def _cossin(angle):
+    # exact values for the quarter turns so that orthogonal layouts stay on grid
+    angle = angle%360
+    if angle==0:
+        return 1.0, 0.0
+    if angle==90:
+        return 0.0, 1.0
+    if angle==180:
+        return -1.0, 0.0
+    if angle==270:
+        return 0.0, -1.0
+    theta = angle*pi/180.
+    return cos(theta), sin(theta)
+
+
+class Affine(object):
+    """ 2D affine transformation stored as a 3x3 homogeneous matrix.
+        Transformations are chained in the order they are called, like on a Primitive:
+            Affine().Rotate(angle=90).Mirror(planenormal=(1,0))
+        rotates first and then mirrors. """
+    def __init__(self, matrix=None):
+        if matrix is None:
+            matrix = numpy.identity(3)
+        self.matrix = numpy.array(matrix, dtype=float)
+
+    def __repr__(self):
+        return 'Affine(%s)'%self.matrix.tolist()
+
+    def __mul__(self, affine):
+        # (self*affine)(x) == self(affine(x))
+        return Affine(numpy.dot(self.matrix, affine.matrix))
+
+    def __eq__(self, affine):
+        return isinstance(affine, Affine) and bool((self.matrix==affine.matrix).all())
+
+    def __ne__(self, affine):
+        return not self.__eq__(affine)
+
+    def then(self, matrix):
+        return Affine(numpy.dot(matrix, self.matrix))
+
+    def Rotate(self, center=None, angle=None):
+        cx, cy = (center.x, center.y) if center is not None else (0.0, 0.0)
+        c, s = _cossin(angle or 0)
+        return self.then([[c, -s, cx-c*cx+s*cy],
+                          [s,  c, cy-s*cx-c*cy],
+                          [0., 0., 1.]])
+
+    def Mirror(self, center=None, planenormal=None):
+        cx, cy = (center.x, center.y) if center is not None else (0.0, 0.0)
+        if planenormal is None:
+            planenormal = (0,0)
+        planenormal = tuple(planenormal)
+        if planenormal==(0,0):
+            return Affine(self.matrix)
+        if planenormal==(1,0):
+            return self.then([[-1., 0., cx], [0., 1., 0.], [0., 0., 1.]])
+        if planenormal==(0,1):
+            return self.then([[1., 0., 0.], [0., -1., cy], [0., 0., 1.]])
+        if planenormal==(1,1):
+            return self.then([[-1., 0., cx], [0., -1., cy], [0., 0., 1.]])
+        raise Exception('%s is not a supported planenormal'%repr(planenormal))
+
+    def Translate(self, vector=None, angle=None, radius=None):
+        if vector:
+            dx, dy = vector.x, vector.y
+        elif radius:
+            c, s = _cossin(angle or 0)
+            dx, dy = radius*c, radius*s
+        else:
+            return Affine(self.matrix)
+        return self.then([[1., 0., dx], [0., 1., dy], [0., 0., 1.]])
+
+    def Scale(self, center=None, scale=None):
+        cx, cy = (center.x, center.y) if center is not None else (0.0, 0.0)
+        if scale is None:
+            sx, sy = 1.0, 1.0
+        elif isinstance(scale, (int, float)):
+            sx, sy = scale, scale
+        else:
+            sx, sy = scale.x, scale.y
+        return self.then([[sx, 0., cx-sx*cx], [0., sy, cy-sy*cy], [0., 0., 1.]])
+
+    @property
+    def coefficients(self):
+        """ return (a, b, c, d, e, f) with x' = a*x+b*y+c and y' = d*x+e*y+f """
+        (a, b, c), (d, e, f) = self.matrix[:2].tolist()
+        return a, b, c, d, e, f
+
+    def decompose(self):
+        """ return (origin, rotation, magnification, x_reflection) following the GDSII convention
+            (reflection about the x axis, then magnification, rotation in degrees and translation),
+            or None when the transformation is not a similarity (non uniform scale, shear) """
+        a, b, c, d, e, f = self.coefficients
+        x_reflection = a*e-b*d < 0
+        if x_reflection:
+            b, e = -b, -e
+        tol = 1e-12*max(abs(a), abs(b), abs(d), abs(e))
+        if tol==0 or abs(a-e)>tol or abs(b+d)>tol:
+            return None
+        magnification = sqrt(a*a+d*d)
+        rotation = atan2(d, a)*180./pi
+        return (c, f), rotation, magnification, x_reflection
+
+    def inverse(self):
+        return Affine(numpy.linalg.inv(self.matrix))
+
+    def __call__(self, coords):
+        """ apply the transformation to a (n, 2) array of coordinates """
+        coords = numpy.asarray(coords, dtype=float).reshape(-1, 2)
+        return numpy.dot(coords, self.matrix[:2,:2].T) + self.matrix[:2,2]
+
+    def transform(self, points):
+        """ apply the transformation to a sequence of (x, y) tuples """
+        a, b, c, d, e, f = self.coefficients
+        return [(a*x+b*y+c, d*x+e*y+f) for x, y in points]
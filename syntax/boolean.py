@@ -0,0 +1,428 @@
+from math import pi, acos, atan2, cos, sin, tan
+import multiprocessing
+import numpy
+import clipper
+from clipper import JoinType, EndType
+from spatial import _overlap, GridIndex
+
+__all__ = ['processes', 'tiles', 'JoinType', 'EndType']
+
+# polygons are lists of (x, y) tuples so that they are cheap to send to the workers
+
+
+global __processes__
+__processes__ = 1
+def processes(n=None):
+    """ number of worker processes of the bulk booleans, one per core when n is None """
+    global __processes__
+    __processes__ = n or multiprocessing.cpu_count()
+
+global __tiles__
+__tiles__ = 1
+def tiles(n=1):
+    """ cut the booleans in n x n tiles (or nx x ny for a tuple), 1 disables the tiling """
+    global __tiles__
+    __tiles__ = n
+
+
+def clip(subject, clip, cliptype, integer=False):
+    """ clip the subject polygons by the clip polygons with the NonZero rule """
+    c = clipper.Clipper()
+    c.Integer = integer
+    for polygon in subject:
+        c.AddPolygon([clipper.Point(x, y) for x, y in polygon], clipper.PolyType.Subject)
+    for polygon in clip:
+        c.AddPolygon([clipper.Point(x, y) for x, y in polygon], clipper.PolyType.Clip)
+    return _execute(c, cliptype)
+
+
+def cliptree(subject, clip, cliptype, integer=False):
+    """ clip through the PolyTree: list of (outer, holes) with the holes of each
+        outer contour, the islands inside the holes are outer contours again """
+    c = clipper.Clipper()
+    c.Integer = integer
+    for polygon in subject:
+        c.AddPolygon([clipper.Point(x, y) for x, y in polygon], clipper.PolyType.Subject)
+    for polygon in clip:
+        c.AddPolygon([clipper.Point(x, y) for x, y in polygon], clipper.PolyType.Clip)
+    tree = clipper.PolyTree()
+    pft = clipper.PolyFillType.NonZero
+    c.Execute2(cliptype, tree, pft, pft)
+    contour = lambda node: [(point.x, point.y) for point in node.Contour]
+    result = []
+    outers = list(tree.Childs)
+    while outers:
+        node = outers.pop(0)
+        result.append((contour(node), [contour(hole) for hole in node.Childs]))
+        for hole in node.Childs:
+            outers.extend(hole.Childs)
+    return result
+
+
+def _execute(c, cliptype):
+    solution = []
+    pft = clipper.PolyFillType.NonZero
+    c.Execute(cliptype, solution, pft, pft)
+    return [[(point.x, point.y) for point in bloc] for bloc in solution]
+
+
+class Context(object):
+    """ prepared subject for repeated booleans: the clip polygons are added and
+        cleared, the subject is converted and indexed once. Difference and
+        Intersection only clip the subject polygons reaching the clip polygons,
+        the other operations reuse one clipper holding the subject edges. The
+        Difference returns the union of the other polygons, computed once, so
+        that the result is the one of clip(subject, clip, Difference). """
+    def __init__(self, subject=(), integer=False):
+        self.integer = integer
+        self.subject = [[clipper.Point(x, y) for x, y in polygon] for polygon in subject]
+        self.clip = []
+        self.index = None
+        self.groups = None
+        self.unions = {}
+        self.clipper = None
+
+    def _clipper(self, subject, clip=None):
+        c = clipper.Clipper()
+        c.Integer = self.integer
+        for polygon in subject:
+            c.AddPolygon(polygon, clipper.PolyType.Subject)
+        for polygon in (self.clip if clip is None else clip):
+            c.AddPolygon(polygon, clipper.PolyType.Clip)
+        return c
+
+    def add(self, polygons):
+        polygons = [[clipper.Point(x, y) for x, y in polygon] for polygon in polygons]
+        self.clip.extend(polygons)
+        if self.clipper is not None:
+            for polygon in polygons:
+                self.clipper.AddPolygon(polygon, clipper.PolyType.Clip)
+
+    def clear(self):
+        self.clip = []
+        if self.clipper is not None:
+            self.clipper.RemovePolygons(clipper.PolyType.Clip)
+
+    def _index(self):
+        if self.index is None:
+            self.index = GridIndex([_box([polygon]) for polygon in self.subject])
+        return self.index
+
+    def _near(self):
+        # position of the subject polygons overlapping the clip polygons
+        box = _box(self.clip)
+        if box is None:
+            return []
+        return self._index().window(*box)
+
+    def _groups(self):
+        # group of each subject polygon, the polygons of a group are linked by their
+        # overlapping boxes and only merge with the polygons of their group
+        if self.groups is None:
+            index = self._index()
+            parent = range(len(self.subject))
+            def root(i):
+                while parent[i] != i:
+                    parent[i] = parent[parent[i]]
+                    i = parent[i]
+                return i
+            for i, box in enumerate(index.bboxes):
+                for j in index.window(*box):
+                    parent[root(j)] = root(i)
+            self.groups = [root(i) for i in xrange(len(self.subject))]
+        return self.groups
+
+    def _far(self, near):
+        # positions of the polygons of the groups reaching near, union of the others
+        groups = self._groups()
+        reached = set(groups[i] for i in near)
+        members = {}
+        for i, group in enumerate(groups):
+            if not group in reached:
+                members.setdefault(group, []).append(i)
+        far = []
+        for group in sorted(members):
+            if not group in self.unions:
+                subject = [self.subject[i] for i in members[group]]
+                self.unions[group] = _execute(self._clipper(subject, []), clipper.ClipType.Union)
+            far.extend(self.unions[group])
+        return [i for i, group in enumerate(groups) if group in reached], far
+
+    def execute(self, cliptype):
+        """ solution with the NonZero rule """
+        if cliptype in (clipper.ClipType.Difference, clipper.ClipType.Intersection):
+            near, far = self._near(), []
+            if cliptype == clipper.ClipType.Difference:
+                near, far = self._far(near)
+            if len(near) < len(self.subject):
+                return far + _execute(self._clipper([self.subject[i] for i in near]), cliptype)
+        if self.clipper is None:
+            self.clipper = self._clipper(self.subject)
+        return _execute(self.clipper, cliptype)
+
+
+def _box(polygons):
+    xs = [x for polygon in polygons for x, y in polygon]
+    ys = [y for polygon in polygons for x, y in polygon]
+    if not xs:
+        return None
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def _partition(boxes, indices, groupsize):
+    # split at the median of the centers along the wider side, the groups come out
+    # in spatial order so that neighbouring groups are merged together
+    if len(indices) <= groupsize:
+        return [indices]
+    xmin = min(boxes[i][0] for i in indices)
+    ymin = min(boxes[i][1] for i in indices)
+    xmax = max(boxes[i][2] for i in indices)
+    ymax = max(boxes[i][3] for i in indices)
+    axis = 0 if xmax-xmin >= ymax-ymin else 1
+    indices = sorted(indices, key=lambda i: boxes[i][axis]+boxes[i][axis+2])
+    half = len(indices)//2
+    return _partition(boxes, indices[:half], groupsize) + _partition(boxes, indices[half:], groupsize)
+
+
+def _union(args):
+    polygons, integer = args
+    return clip(polygons, [], clipper.ClipType.Union, integer)
+
+
+def _merge(args):
+    # only the polygons reaching the other group go through the clipper again
+    first, second, integer = args
+    box1, box2 = _box(first), _box(second)
+    if box1 is None or box2 is None:
+        return first + second
+    kept, subject = [], []
+    for polygons, box in ((first, box2), (second, box1)):
+        for polygon in polygons:
+            if _overlap(_box([polygon]), box):
+                subject.append(polygon)
+            else:
+                kept.append(polygon)
+    if not subject:
+        return kept
+    return kept + clip(subject, [], clipper.ClipType.Union, integer)
+
+
+def _pool(tasks):
+    if __processes__ > 1 and tasks > 1:
+        return multiprocessing.Pool(min(__processes__, tasks))
+    return None
+
+def _map(pool, function, tasks):
+    if pool is None or len(tasks) < 2:
+        return map(function, tasks)
+    return pool.map(function, tasks)
+
+
+def bulkunion(polygons, groupsize=64, integer=False):
+    """ union of many polygons: groups of neighbouring polygons are united first and
+        the partial results are merged pairwise, in parallel over processes() workers """
+    polygons = [polygon for polygon in polygons if len(polygon) > 2]
+    if len(polygons) <= groupsize or orient(polygons) is None:
+        # a hole wound the other way would be filled in a group without its outer contour
+        return clip(polygons, [], clipper.ClipType.Union, integer)
+    boxes = [_box([polygon]) for polygon in polygons]
+    groups = _partition(boxes, range(len(polygons)), groupsize)
+    pool = _pool(len(groups))
+    try:
+        results = _map(pool, _union, [([polygons[i] for i in group], integer) for group in groups])
+        while len(results) > 1:
+            tasks = [(results[i], results[i+1], integer) for i in xrange(0, len(results)-1, 2)]
+            merged = _map(pool, _merge, tasks)
+            if len(results)%2:
+                merged.append(results[-1])
+            results = merged
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return results[0]
+
+
+def _tile(args):
+    # op(subject, clip) restricted to the tile, only the polygons reaching the tile are sent
+    subject, clip_, cliptype, rect, integer = args
+    if not subject and cliptype != clipper.ClipType.Xor and cliptype != clipper.ClipType.Union:
+        return []
+    pieces = clip(subject, clip_, cliptype, integer)
+    return clip(pieces, [rect], clipper.ClipType.Intersection, integer)
+
+
+def _cuts(start, stop, n, integer):
+    if integer:
+        return [start + (stop-start)*i//n for i in xrange(n)] + [stop]
+    return [start + (stop-start)*i/float(n) for i in xrange(n)] + [stop]
+
+
+def tiledclip(subject, clip_, cliptype, n=None, integer=False):
+    """ clip tile by tile over the bounding box of the polygons, in parallel over
+        processes() workers; the pieces cut by the seams are stitched by a local union """
+    if n is None:
+        n = __tiles__
+    nx, ny = n if isinstance(n, tuple) else (n, n)
+    subject = [polygon for polygon in subject if len(polygon) > 2]
+    clip_ = [polygon for polygon in clip_ if len(polygon) > 2]
+    box = _box(subject + clip_)
+    if box is None or nx*ny < 2:
+        return clip(subject, clip_, cliptype, integer)
+    xcuts = _cuts(box[0], box[2], nx, integer)
+    ycuts = _cuts(box[1], box[3], ny, integer)
+    subjectboxes = [_box([polygon]) for polygon in subject]
+    clipboxes = [_box([polygon]) for polygon in clip_]
+    tasks, rects = [], []
+    for i in xrange(nx):
+        for j in xrange(ny):
+            rect = xcuts[i], ycuts[j], xcuts[i+1], ycuts[j+1]
+            tasks.append(([polygon for polygon, b in zip(subject, subjectboxes) if _overlap(b, rect)],
+                          [polygon for polygon, b in zip(clip_, clipboxes) if _overlap(b, rect)],
+                          cliptype,
+                          [(rect[0], rect[1]), (rect[2], rect[1]), (rect[2], rect[3]), (rect[0], rect[3])],
+                          integer))
+            rects.append(rect)
+    pool = _pool(len(tasks))
+    try:
+        results = _map(pool, _tile, tasks)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    kept, seams = [], []
+    for rect, pieces in zip(rects, results):
+        for piece in pieces:
+            b = _box([piece])
+            if rect[0] < b[0] and b[2] < rect[2] and rect[1] < b[1] and b[3] < rect[3]:
+                kept.append(piece)
+            else:
+                seams.append(piece)
+    return kept + bulkunion(seams, integer=integer)
+
+
+def area(polygon):
+    """ signed area of the polygon, positive when it turns counterclockwise """
+    polygon = list(polygon)
+    return 0.5*sum(x0*y1-x1*y0 for (x0, y0), (x1, y1) in zip(polygon, polygon[1:]+polygon[:1]))
+
+
+def orient(polygons):
+    """ the polygons turned counterclockwise when they all turn the same way, None when
+        they are wound both ways: for the NonZero rule the clockwise ones may be holes """
+    areas = [area(polygon) for polygon in polygons]
+    if any(a < 0 for a in areas) and any(a > 0 for a in areas):
+        return None
+    return [polygon[::-1] if a < 0 else polygon for polygon, a in zip(polygons, areas)]
+
+
+def _arc(p, n, angle, delta, stepsperrad):
+    # points of the arc of radius delta centered on p, from the direction n
+    steps = max(int(round(stepsperrad*abs(angle))), 1)
+    c, s = cos(angle/steps), sin(angle/steps)
+    nx, ny = n
+    points = []
+    for i in xrange(steps+1):
+        points.append((p[0]+nx*delta, p[1]+ny*delta))
+        nx, ny = nx*c-ny*s, nx*s+ny*c
+    return points
+
+
+def _outline(polygon, delta, join, miter_limit=2.0, arc_tolerance=None, closed=True, end=EndType.Butt):
+    """ raw offset of a counterclockwise polygon, or of both sides of an open path;
+        the loops at the concave vertices are removed by the final union """
+    points = [polygon[0]]
+    for point in polygon[1:]:
+        if point != points[-1]:
+            points.append(point)
+    if closed:
+        while len(points) > 1 and points[-1] == points[0]:
+            points.pop()
+        if len(points) < 3:
+            return []
+    else:
+        if len(points) < 2:
+            return []
+        points = points + points[-2:0:-1]
+    xy = numpy.array(points, dtype=float)
+    d = numpy.roll(xy, -1, axis=0) - xy
+    d /= numpy.hypot(d[:,0], d[:,1])[:,None]
+    # outward normal of the edge i -> i+1, the tangent rotated by -90deg
+    normals = numpy.column_stack((d[:,1], -d[:,0])).tolist()
+    tangents = d.tolist()
+    if join == JoinType.Miter:
+        # as ClipperOffset, a limit under 2 is taken as 2
+        rmin = 2.0/(miter_limit*miter_limit) if miter_limit > 2 else 0.5
+    if join == JoinType.Round or (not closed and end == EndType.Round):
+        tolerance = min(arc_tolerance, 0.25*abs(delta)) if arc_tolerance > 0 else 0.25*abs(delta)
+        stepsperrad = 1.0/(2.0*acos(1.0-tolerance/abs(delta))) if delta else 0.0
+    n = len(points)
+    outline = []
+    for i in xrange(n):
+        p = points[i]
+        n1, n2 = normals[i-1], normals[i]
+        if not closed and i in (0, n//2):
+            # end caps: the path turns back on itself
+            t = tangents[i-1]
+            if end == EndType.Round:
+                outline.extend(_arc(p, n1, pi, delta, stepsperrad))
+            elif end == EndType.Square:
+                outline.append((p[0]+(n1[0]+t[0])*delta, p[1]+(n1[1]+t[1])*delta))
+                outline.append((p[0]+(t[0]-n1[0])*delta, p[1]+(t[1]-n1[1])*delta))
+            else:
+                outline.append((p[0]+n1[0]*delta, p[1]+n1[1]*delta))
+                outline.append((p[0]-n1[0]*delta, p[1]-n1[1]*delta))
+            continue
+        sina = n1[0]*n2[1]-n2[0]*n1[1]
+        cosa = n1[0]*n2[0]+n1[1]*n2[1]
+        if abs(sina) < 1e-12 and cosa > 0:
+            # colinear edges
+            outline.append((p[0]+n2[0]*delta, p[1]+n2[1]*delta))
+        elif sina*delta < 0:
+            outline.append((p[0]+n1[0]*delta, p[1]+n1[1]*delta))
+            outline.append(p)
+            outline.append((p[0]+n2[0]*delta, p[1]+n2[1]*delta))
+        elif join == JoinType.Miter and 1.0+cosa >= rmin:
+            r = delta/(1.0+cosa)
+            outline.append((p[0]+(n1[0]+n2[0])*r, p[1]+(n1[1]+n2[1])*r))
+        elif join == JoinType.Round:
+            outline.extend(_arc(p, n1, atan2(sina, cosa), delta, stepsperrad))
+        else:
+            # square, the corner is cut at delta from the vertex
+            dx = tan(atan2(sina, cosa)/4.0)
+            outline.append((p[0]+delta*(n1[0]-n1[1]*dx), p[1]+delta*(n1[1]+n1[0]*dx)))
+            outline.append((p[0]+delta*(n2[0]+n2[1]*dx), p[1]+delta*(n2[1]-n2[0]*dx)))
+    return outline
+
+
+def offset(polygons, delta, join=JoinType.Square, miter_limit=2.0, arc_tolerance=None, closed=True,
+           end=EndType.Butt, integer=False):
+    """ grow (delta > 0) or shrink (delta < 0) the polygons, or enlarge open paths by
+        delta on both sides. As for the ClipperOffset of the C++ library, miter_limit is
+        the largest distance of the Miter joins from their vertex in delta (squared off
+        beyond, 2 at least), arc_tolerance the largest distance between the Round joins
+        and ends and their chords (a quarter of delta at most). Unlike the C++ library,
+        whose default of 0.25 is a distance on integer coordinates, arc_tolerance
+        defaults to a quarter of delta. All the outlines are united in a single clipper
+        sweep. """
+    polygons = [list(polygon) for polygon in polygons if len(polygon) > 1]
+    if closed:
+        oriented = orient(polygons)
+        if oriented is None:
+            # holes or mixed orientations, the union sorts out counterclockwise outers
+            polygons = clip(polygons, [], clipper.ClipType.Union, integer)
+        else:
+            polygons = oriented
+    else:
+        delta = abs(delta)
+    c = clipper.Clipper()
+    c.Integer = integer
+    for polygon in polygons:
+        outline = _outline(polygon, delta, join, miter_limit, arc_tolerance, closed, end)
+        if integer:
+            outline = numpy.floor(numpy.array(outline) + 0.5).astype(int).tolist()
+        c.AddPolygon([clipper.Point(x, y) for x, y in outline], clipper.PolyType.Subject)
+    solution = []
+    pft = clipper.PolyFillType.Positive
+    c.Execute(clipper.ClipType.Union, solution, pft, pft)
+    return [[(point.x, point.y) for point in bloc] for bloc in solution]
@@ -32,6 +32,7 @@
 #===============================================================================
 
 import math
+import heapq
 from collections import namedtuple
 
 horizontal = float('-inf')
@@ -56,16 +57,6 @@ class LocalMinima(object):
         self.leftBound = leftBound
         self.rightBound = rightBound
 
-class Scanbeam(object):
-    __slots__ = ('y','nextSb')
-    def __init__(self, y, nextSb = None):
-        self.y = y
-        self.nextSb = nextSb
-    def __repr__(self):
-        s = 'None'
-        if self.nextSb is not None: s = '<obj>'
-        return "(y:%i, nextSb:%s)" % (self.y, s)
-
 class IntersectNode(object):
     __slots__ = ('e1','e2','pt','nextIn')
     def __init__(self, e1, e2, pt):
@@ -139,9 +130,10 @@ class PolyNode(object):
     
     def IsHole(self):
         result = True
-        while (self.Parent is not None):
+        node = self.Parent
+        while (node is not None):
             result = not result
-            self.Parent = self.Parent.Parent
+            node = node.Parent
         return result
     
     def GetNext(self):
@@ -276,21 +268,22 @@ class ClipperBase(object):
 
     def __init__(self):
         self._EdgeList      = []       # 2D array
+        self._LocalMinima   = []       # LocalMinima in the order they were added
         self._LocalMinList  = None     # single-linked list of LocalMinima
         self._CurrentLocMin = None
         
     def _InsertLocalMinima(self, lm):
-        if self._LocalMinList is None:
-            self._LocalMinList = lm
-        elif lm.y >= self._LocalMinList.y:
-            lm.nextLm = self._LocalMinList
-            self._LocalMinList = lm
-        else:
-            tmp = self._LocalMinList
-            while tmp.nextLm is not None and lm.y < tmp.nextLm.y:
-                    tmp = tmp.nextLm
-            lm.nextLm = tmp.nextLm
-            tmp.nextLm = lm
+        # the list is sorted once before the sweep rather than walked on every insert
+        self._LocalMinima.append(lm)
+        self._LocalMinList = None
+
+    def _SortLocalMinima(self):
+        # descending y, the latest added first for the same y
+        if self._LocalMinList is not None or not self._LocalMinima: return
+        lms = sorted(reversed(self._LocalMinima), key=lambda lm: -lm.y)
+        for lm, nextLm in zip(lms, lms[1:] + [None]):
+            lm.nextLm = nextLm
+        self._LocalMinList = lms[0]
 
     def _AddBoundsToLML(self, e):
         e.nextInLML = None
@@ -322,6 +315,7 @@ class ClipperBase(object):
         return e.nextE
 
     def _Reset(self):
+        self._SortLocalMinima()
         lm = self._LocalMinList
         if lm is not None: self._CurrentLocMin = lm
         while lm is not None:
@@ -401,20 +395,36 @@ class ClipperBase(object):
 
     def Clear(self):
         self._EdgeList = []
+        self._LocalMinima = []
         self._LocalMinList    = None
         self._CurrentLocMin = None
 
+    def RemovePolygons(self, polyType):
+        # drop the edges and local minima of one polyType, the others are kept as added
+        self._EdgeList = [edges for edges in self._EdgeList if edges[0].PolyType != polyType]
+        self._LocalMinima = [lm for lm in self._LocalMinima if lm.leftBound.PolyType != polyType]
+        self._LocalMinList = None
+        self._CurrentLocMin = None
+
     def _PopLocalMinima(self):
         if self._CurrentLocMin is not None:
             self._CurrentLocMin = self._CurrentLocMin.nextLm
 
-def round(x):
+def _identity(x):
     return x
 
+def _nearest(x):
+    # integer rounding of the C++ library, halves away from zero
+    if x < 0: return -int(math.floor(0.5 - x))
+    return int(math.floor(x + 0.5))
+
+# intersections keep float coordinates unless Clipper.Integer is set: the rounding
+# function is given by the Clipper executing, see Clipper._round
+
 #===============================================================================
 # Clipper class (+ data structs & ancilliary functions)
 #===============================================================================
-def _IntersectPoint(edge1, edge2):
+def _IntersectPoint(edge1, edge2, round=_identity):
     if _SlopesEqual2(edge1, edge2):
         if (edge2.Bot.y > edge1.Bot.y): y = edge2.Bot.y 
         else: y = edge1.Bot.y
@@ -444,22 +454,22 @@ def _IntersectPoint(edge1, edge2):
             x = round(edge2.dx * m + b2)
     if (y < edge1.Top.y) or (y < edge2.Top.y):
         if (edge1.Top.y > edge2.Top.y):
-            return edge1.Top, _TopX(edge2, edge1.Top.y) < edge1.Top.x
+            return edge1.Top, _TopX(edge2, edge1.Top.y, round) < edge1.Top.x
         else:
-            return edge2.Top, _TopX(edge1, edge2.Top.y) > edge2.Top.x
+            return edge2.Top, _TopX(edge1, edge2.Top.y, round) > edge2.Top.x
     else:
         return Point(x,y), True
 
-def _TopX(e, currentY):
+def _TopX(e, currentY, round=_identity):
     if currentY == e.Top.y: return e.Top.x
     elif e.Top.x == e.Bot.x: return e.Bot.x
     else: return e.Bot.x + round(e.dx * float(currentY - e.Bot.y))
 
-def _E2InsertsBeforeE1(e1,e2):
+def _E2InsertsBeforeE1(e1,e2, round=_identity):
     if (e2.Curr.x == e1.Curr.x): 
         if (e2.Top.y > e1.Top.y):
-            return e2.Top.x < _TopX(e1, e2.Top.y) 
-        return e1.Top.x > _TopX(e2, e1.Top.y) 
+            return e2.Top.x < _TopX(e1, e2.Top.y, round) 
+        return e1.Top.x > _TopX(e2, e1.Top.y, round) 
     else: 
         return e2.Curr.x < e1.Curr.x
 
@@ -727,10 +737,13 @@ class Clipper(ClipperBase):
 
         self.ReverseSolution     = False
         self.ForceSimple       = False
+        self.Integer           = False
+        self._round            = _identity
         
         self._PolyOutList = []        
         self._ClipType         = ClipType.Intersection
-        self._Scanbeam         = None
+        self._Scanbeam         = []     # heap of -y
+        self._ScanbeamSet      = set()
         self._ActiveEdges      = None
         self._SortedEdges      = None
         self._IntersectNodes   = None
@@ -743,7 +756,8 @@ class Clipper(ClipperBase):
         
     def _Reset(self):
         ClipperBase._Reset(self)
-        self._Scanbeam = None
+        self._Scanbeam = []
+        self._ScanbeamSet = set()
         self._PolyOutList = []
         lm = self._LocalMinList
         while lm is not None:
@@ -755,21 +769,14 @@ class Clipper(ClipperBase):
         ClipperBase.Clear(self)
 
     def _InsertScanbeam(self, y):
-        if self._Scanbeam is None:
-            self._Scanbeam = Scanbeam(y)
-        elif y > self._Scanbeam.y:
-            self._Scanbeam = Scanbeam(y, self._Scanbeam)
-        else:
-            sb = self._Scanbeam
-            while sb.nextSb is not None and y <= sb.nextSb.y:
-                sb = sb.nextSb
-            if y == sb.y: return
-            newSb = Scanbeam(y, sb.nextSb)
-            sb.nextSb = newSb
+        # scanbeams are popped from the highest y, each y once
+        if y in self._ScanbeamSet: return
+        self._ScanbeamSet.add(y)
+        heapq.heappush(self._Scanbeam, -y)
 
     def _PopScanbeam(self):
-        result = self._Scanbeam.y
-        self._Scanbeam = self._Scanbeam.nextSb
+        result = -heapq.heappop(self._Scanbeam)
+        self._ScanbeamSet.discard(result)
         return result
 
     def _SetWindingCount(self, edge):
@@ -892,14 +899,14 @@ class Clipper(ClipperBase):
         edge.nextInAEL = None
         if self._ActiveEdges is None:
             self._ActiveEdges = edge
-        elif _E2InsertsBeforeE1(self._ActiveEdges, edge):
+        elif _E2InsertsBeforeE1(self._ActiveEdges, edge, self._round):
             edge.nextInAEL = self._ActiveEdges
             self._ActiveEdges.prevInAEL = edge
             self._ActiveEdges = edge
         else:
             e = self._ActiveEdges
             while e.nextInAEL is not None and \
-                not _E2InsertsBeforeE1(e.nextInAEL, edge):
+                not _E2InsertsBeforeE1(e.nextInAEL, edge, self._round):
                     e = e.nextInAEL
             edge.nextInAEL = e.nextInAEL
             if e.nextInAEL is not None: e.nextInAEL.prevInAEL = edge
@@ -1159,7 +1166,7 @@ class Clipper(ClipperBase):
         while e is not None:
             e.prevInSEL = e.prevInAEL
             e.nextInSEL = e.nextInAEL
-            e.Curr = Point(_TopX(e, topY), e.Curr.y)
+            e.Curr = Point(_TopX(e, topY, self._round), e.Curr.y)
             e = e.nextInAEL
         while True:
             isModified = False
@@ -1169,11 +1176,11 @@ class Clipper(ClipperBase):
                 if e.Curr.x <= eNext.Curr.x:
                     e = eNext
                     continue
-                pt, intersected = _IntersectPoint(e, eNext)
+                pt, intersected = _IntersectPoint(e, eNext, self._round)
                 if not intersected and e.Curr.x > eNext.Curr.x +1: 
                     raise Exception("Intersect Error")  
                 if pt.y > botY:
-                    pt = Point(_TopX(e, botY), botY)
+                    pt = Point(_TopX(e, botY, self._round), botY)
                 self._InsertIntersectNode(e, eNext, pt)
                 self._SwapPositionsInSEL(e, eNext)
                 isModified = True
@@ -1386,7 +1393,7 @@ class Clipper(ClipperBase):
             else: prevE = e.prevInAEL
 
         if prevE is not None and prevE.outIdx >= 0 and \
-            _TopX(prevE, pt.y) == _TopX(e, pt.y) and \
+            _TopX(prevE, pt.y, self._round) == _TopX(e, pt.y, self._round) and \
            _SlopesEqual2(e, prevE): 
                 self._AddJoin(e, prevE)
         return
@@ -1546,7 +1553,7 @@ class Clipper(ClipperBase):
                     e = self._UpdateEdgeIntoAEL(e)
                     self._AddEdgeToSEL(e)
                 else:
-                    e.Curr = Point(_TopX(e, topY), topY)
+                    e.Curr = Point(_TopX(e, topY, self._round), topY)
                     if (self.ForceSimple and e.prevInAEL is not None and
                       e.prevInAEL.Curr.x == e.Curr.x and
                       e.outIdx >= 0 and e.prevInAEL.outIdx >= 0):
@@ -1788,8 +1795,9 @@ class Clipper(ClipperBase):
     def _ExecuteInternal(self):
 #         try: 
             try:
+                self._round = _nearest if self.Integer else _identity
                 self._Reset()
-                if self._Scanbeam is None: return True
+                if not self._Scanbeam: return True
                 botY = self._PopScanbeam()
                 while True:
                     self._InsertLocalMinimaIntoAEL(botY)
@@ -1799,7 +1807,7 @@ class Clipper(ClipperBase):
                     if not self._ProcessIntersections(botY, topY): return False
                     self._ProcessEdgesAtTopOfScanbeam(topY)
                     botY = topY
-                    if self._Scanbeam is None and self._CurrentLocMin is None: break
+                    if not self._Scanbeam and self._CurrentLocMin is None: break
                     
                 for outRec in self._PolyOutList:
                     if outRec.pts is None: continue                
@@ -0,0 +1,128 @@
+from math import pi, tan, atan2, acos, ceil, sqrt
+import numpy
+import gdsii
+
+__all__ = ['chorderror']
+
+# curves are generated on numpy arrays, many at once: (k, n, 2) for k curves of n points
+
+
+global __chorderror__
+__chorderror__ = None
+def chorderror(x=None):
+    """ largest distance between the curves and their chords when their number of points
+        is n=None (Arc, Spline, Blend, Fillet), one gds database step
+        (gdsii.unit/gdsii.precision) when None """
+    global __chorderror__
+    __chorderror__ = x
+
+def _tolerance(tolerance=None):
+    if tolerance:
+        return tolerance
+    return __chorderror__ or 1.0/gdsii.resolution()
+
+
+def arcsegments(radius, angle, tolerance=None):
+    """ smallest number of chords staying within tolerance of an arc of angle (radians) """
+    tolerance = _tolerance(tolerance)
+    radius = abs(radius)
+    if radius == 0 or angle == 0:
+        return 1
+    step = 2.0*acos(max(1.0-tolerance/radius, -1.0))
+    return max(int(ceil(abs(angle)/step - 1e-9)), 1)
+
+
+# at most _FILLETS arcs are cached, the cache starts again when it is full
+_FILLETS = 4096
+_fillets = {}
+def fillet(angle, radius, n):
+    """ (n, 2) points of the arc of radius joining an edge arriving at the origin along +x
+        to an edge leaving the origin with the direction angle (radians, counterclockwise).
+        The arcs are cached by (angle, radius, n), do not modify them in place. """
+    key = round(angle, 12), radius, n
+    if not key in _fillets:
+        if len(_fillets) >= _FILLETS:
+            _fillets.clear()
+        sign = 1.0 if angle > 0 else -1.0
+        t = radius*tan(0.5*abs(angle))
+        phi = -sign*0.5*pi + angle*numpy.linspace(0.0, 1.0, n)
+        points = numpy.column_stack((radius*numpy.cos(phi)-t, radius*numpy.sin(phi)+sign*radius))
+        points.flags.writeable = False
+        _fillets[key] = points
+    return _fillets[key]
+
+
+def corners(xy, radius, n, closed=True, tolerance=None):
+    """ points of the polyline xy with every corner replaced by a fillet of n points,
+        or of as few points as the tolerance allows when n is None;
+        the first and last points of an open polyline are kept """
+    xy = numpy.asarray(xy, dtype=float)
+    if closed:
+        previous, following = numpy.roll(xy, 1, axis=0), numpy.roll(xy, -1, axis=0)
+    else:
+        previous, following = xy[:-2], xy[2:]
+        xy = xy[1:-1]
+    d1, d2 = xy-previous, following-xy
+    heading = numpy.arctan2(d1[:,1], d1[:,0])
+    turn = numpy.arctan2(d1[:,0]*d2[:,1]-d1[:,1]*d2[:,0], (d1*d2).sum(axis=1))
+    c, s = numpy.cos(heading), numpy.sin(heading)
+    blocks = []
+    for point, angle, cos_, sin_ in zip(xy.tolist(), turn.tolist(), c.tolist(), s.tolist()):
+        if abs(angle) < 1e-12:
+            blocks.append(numpy.array([point]))
+            continue
+        arc = fillet(angle, radius, n or arcsegments(radius, angle, tolerance)+1)
+        blocks.append(numpy.dot(arc, [[cos_, sin_], [-sin_, cos_]]) + point)
+    if not closed:
+        blocks = [previous[:1]] + blocks + [following[-1:]]
+    return numpy.concatenate(blocks) if blocks else numpy.zeros((0, 2))
+
+
+def _cubics(rows):
+    # coefficients (a, b, c, d) of y = a*x**3+b*x**2+c*x+d for each row
+    x0, y0, s0, x1, y1, s1 = rows.T
+    one, zero = numpy.ones_like(x0), numpy.zeros_like(x0)
+    A = numpy.stack([numpy.column_stack((x0**3, x0**2, x0, one)),
+                     numpy.column_stack((x1**3, x1**2, x1, one)),
+                     numpy.column_stack((3.0*x0**2, 2.0*x0, one, zero)),
+                     numpy.column_stack((3.0*x1**2, 2.0*x1, one, zero))], axis=1)
+    B = numpy.column_stack((y0, y1, s0, s1))
+    return numpy.linalg.solve(A, B[:,:,None])[:,:,0]
+
+
+def splinesamples(rows, tolerance=None):
+    """ number of samples of each spline keeping the chords within tolerance,
+        from the largest second derivative (reached at one end of a cubic) """
+    rows = numpy.asarray(rows, dtype=float).reshape(-1, 6)
+    tolerance = _tolerance(tolerance)
+    X = _cubics(rows)
+    x0, x1 = rows[:,0], rows[:,3]
+    curvature = numpy.maximum(numpy.abs(6.0*X[:,0]*x0+2.0*X[:,1]), numpy.abs(6.0*X[:,0]*x1+2.0*X[:,1]))
+    # a chord of length h under y'' deviates by at most y''*h**2/8
+    steps = numpy.abs(x1-x0)*numpy.sqrt(curvature/(8.0*tolerance))
+    return numpy.maximum(numpy.ceil(steps-1e-9), 1).astype(int) + 1
+
+
+def splines(rows, n):
+    """ cubic y(x) of each row (x0, y0, slope0, x1, y1, slope1), solved together;
+        returns the (k, n, 2) samples from x0 to x1 """
+    rows = numpy.asarray(rows, dtype=float).reshape(-1, 6)
+    X = _cubics(rows)
+    x0, x1 = rows[:,0], rows[:,3]
+    x = x0[:,None] + (x1-x0)[:,None]*numpy.linspace(0.0, 1.0, n)
+    # Horner over the whole sample array
+    y = X[:,:1]
+    for i in xrange(1, 4):
+        y = y*x + X[:,i:i+1]
+    return numpy.dstack((x, y*numpy.ones_like(x)))
+
+
+def arcs(centers, radius, start, stop, n):
+    """ (k, n, 2) points of the arcs, the angles are in degrees """
+    centers = numpy.asarray(centers, dtype=float).reshape(-1, 2)
+    radius = numpy.zeros(len(centers)) + radius
+    start = numpy.zeros(len(centers)) + start
+    stop = numpy.zeros(len(centers)) + stop
+    theta = (start[:,None] + (stop-start)[:,None]*numpy.linspace(0.0, 1.0, n))*pi/180.
+    return numpy.dstack((centers[:,:1] + radius[:,None]*numpy.cos(theta),
+                         centers[:,1:] + radius[:,None]*numpy.sin(theta)))
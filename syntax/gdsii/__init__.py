@@ -1,21 +1,290 @@
 import gdspy
+import numpy
+import struct
+import time
+import hashlib
+import mmap
+import warnings
+from math import pi, cos, sin
 
 
 class Cell(gdspy.Cell):
+    # default layer, see _gdslayer for the ways to give a layer
     layer = 1
+    datatype = 0
+    # Douglas-Peucker tolerance applied before writing the polygons, see syntax.simplify
+    simplify = None
+    # smallest number of copies of a polygon (translated, rotated by quarter turns or
+    # mirrored) written once in its own cell and placed with references, such as 2;
+    # None writes every polygon in the cell
+    instances = None
     def __init__(self, name):
         gdspy.Cell.__init__(self, name)
     def append(self, primitives, layer=None):
-        if layer:
-            self.layer = layer
-        else:
-            self.layer = Cell.layer
-        for primitive in primitives:
-            points = [(pt.x, pt.y) for pt in primitive]
-            poly1 = gdspy.Polygon(points, layer)
+        """ polygons of the primitives on layer: a gds layer number, a (layer, datatype)
+            pair, or the name of a layer of the layermap() """
+        self.layer, self.datatype = _gdslayer(layer)
+        # transformed copies (LazyPrimitives) are written as a reference to their source
+        reference = getattr(primitives, 'reference', None)
+        if reference:
+            source, affine = reference
+            transformation = affine.decompose()
+            if transformation:
+                origin, rotation, magnification, x_reflection = transformation
+                cell = Cell._referenced(source, (self.layer, self.datatype))
+                self.add( gdspy.CellReference(cell, origin, rotation, magnification, x_reflection) )
+                return
+        polygons = [points for points in map(_boundary, primitives) if points]
+        if Cell.instances:
+            polygons = self._instantiate(polygons)
+        for points in polygons:
+            poly1 = gdspy.Polygon(points, self.layer, self.datatype)
             self.add(poly1)
-            
-        
+
+    def _instantiate(self, polygons):
+        # places the repeated polygons as references (SREF/AREF) to one cell per shape,
+        # returns the other ones
+        single, instances = _instances(polygons)
+        for key, points, arrays in instances:
+            cell = Cell._shape(key, points, (self.layer, self.datatype))
+            for rotation, x_reflection, origin, spacing, columns, rows in arrays:
+                if columns*rows == 1:
+                    self.add( gdspy.CellReference(cell, origin, rotation, None, x_reflection) )
+                else:
+                    self.add( gdspy.CellArray(cell, columns, rows, spacing, origin,
+                                              rotation, None, x_reflection) )
+        return single
+
+    @staticmethod
+    def _shape(key, points, layer):
+        shapes = _cache('shapes')
+        key = key, layer
+        if not key in shapes:
+            cell = Cell('SHAPE%d'%len(shapes))
+            cell.add( gdspy.Polygon(points, *layer) )
+            shapes[key] = cell
+        return shapes[key]
+
+    @staticmethod
+    def _referenced(source, layer):
+        # keyed by the points of source: a source modified since gets its own cell
+        references = _cache('references')
+        key = _digest(source), layer
+        if not key in references:
+            cell = Cell('REF%d'%len(references))
+            cell.append(source, layer=layer)
+            references[key] = cell
+        return references[key]
+
+
+_caches = [None, {}]
+def _cache(name):
+    # cells shared by the polygons of the current library, dropped with it by clear()
+    if _caches[0] is not gdspy.current_library:
+        _caches[:] = [gdspy.current_library, {}]
+    return _caches[1].setdefault(name, {})
+
+def _digest(primitives):
+    digest = hashlib.md5()
+    for primitive in primitives:
+        coords = getattr(primitive, 'coords', None)
+        if coords is None:
+            coords = numpy.array([(pt.x, pt.y) for pt in primitive], dtype=float)
+        digest.update(numpy.ascontiguousarray(coords, dtype=float).tostring())
+        digest.update(str(len(coords)))
+    return digest.digest()
+
+
+
+global __layermap__
+__layermap__ = {}
+def layermap(layers=None):
+    """ gds (layer, datatype) of the layers by name, from a dict or from a Layers stack
+        whose layers carry a gds attribute: Layer(name='TM2', ..., gds=(40, 0));
+        None clears the map """
+    global __layermap__
+    __layermap__ = {}
+    if isinstance(layers, dict):
+        for name, gds in layers.iteritems():
+            __layermap__[name] = _gdslayer(gds)
+    elif layers is not None:
+        for layer in layers:
+            if getattr(layer, 'gds', None) is not None:
+                __layermap__[layer.name] = _gdslayer(layer.gds)
+    return __layermap__
+
+def _gdslayer(layer=None):
+    # (layer, datatype) of a gds layer number, a (layer, datatype) pair, a layer name
+    # of the layermap or a Layer of the stack, Cell.layer when None
+    if layer is None:
+        layer = Cell.layer
+    if isinstance(layer, (int, long)):
+        return layer, Cell.datatype
+    if isinstance(layer, (tuple, list)):
+        return int(layer[0]), int(layer[1])
+    if getattr(layer, 'gds', None) is not None:
+        return _gdslayer(layer.gds)
+    name = getattr(layer, 'name', layer)
+    if not name in __layermap__:
+        raise Exception('layer %s is not in the gds layer map, see gdsii.layermap'%name)
+    return __layermap__[name]
+
+
+def _boundary(primitive):
+    # (x, y) of the boundary written for a primitive, None when it is simplified away
+    if Cell.simplify is not None:
+        primitive = primitive.Simplify(0, tolerance=Cell.simplify, grid=1.0/resolution())
+        if len(primitive) < 3:
+            return None
+    points = [(pt.x, pt.y) for pt in primitive]
+    if getattr(primitive, 'holes', None):
+        points = _keyhole(points, [[(pt.x, pt.y) for pt in hole] for hole in primitive.holes])
+    return points
+
+
+def _area(polygon):
+    return 0.5*sum(x0*y1-x1*y0 for (x0, y0), (x1, y1) in zip(polygon, polygon[1:]+polygon[:1]))
+
+def _cross(a, b, c):
+    return (b[0]-a[0])*(c[1]-a[1]) - (b[1]-a[1])*(c[0]-a[0])
+
+def _intriangle(a, b, c, p):
+    d1, d2, d3 = _cross(a, b, p), _cross(b, c, p), _cross(c, a, p)
+    return not ((d1 < 0 or d2 < 0 or d3 < 0) and (d1 > 0 or d2 > 0 or d3 > 0))
+
+def _keyhole(outer, holes):
+    """ single boundary going in and out of each hole along a zero width cut """
+    polygon = list(outer) if _area(outer) > 0 else list(reversed(outer))
+    holes = [hole if _area(hole) < 0 else list(reversed(hole)) for hole in holes]
+    # rightmost holes first, the cuts go towards +x
+    for hole in sorted(holes, key=lambda hole: -max(x for x, y in hole)):
+        i = max(xrange(len(hole)), key=lambda k: hole[k][0])
+        m = hole[i]
+        # nearest edge hit by the ray from the rightmost vertex of the hole
+        n = len(polygon)
+        hit, j = None, None
+        for k in xrange(n):
+            (x0, y0), (x1, y1) = polygon[k], polygon[(k+1)%n]
+            if (y0 > m[1]) == (y1 > m[1]):
+                continue
+            x = x0 + (m[1]-y0)*(x1-x0)/float(y1-y0)
+            if x >= m[0] and (hit is None or x < hit):
+                hit, j = x, k if x0 > x1 else (k+1)%n
+        if hit is None:
+            raise Exception('hole is not inside its outer contour')
+        # the vertices inside the triangle (hole, hit, end of the edge) may hide the end
+        # of the edge, the one seen with the smallest angle from the ray is visible
+        p = polygon[j]
+        if (hit, m[1]) != p:
+            best = None
+            for k, r in enumerate(polygon):
+                if r[0] <= m[0] or r == p or not _intriangle(m, (hit, m[1]), p, r):
+                    continue
+                key = abs(r[1]-m[1])/float(r[0]-m[0]), r[0]
+                if best is None or key < best[0]:
+                    best = key, k
+            if best is not None:
+                j = best[1]
+        polygon = polygon[:j+1] + hole[i:] + hole[:i+1] + polygon[j:]
+    return polygon
+
+
+def _cossin(angle):
+    # exact values for the quarter turns so that the arrays stay on grid
+    angle = angle%360
+    if angle%90 == 0:
+        return ((1, 0), (0, 1), (-1, 0), (0, -1))[int(angle)//90]
+    return cos(angle*pi/180.), sin(angle*pi/180.)
+
+# the gdsii references mirror about the x axis first and then rotate:
+# (rotation, x_reflection) and the matrix of the reference on integer coordinates
+_orientations = []
+for _rotation, (_c, _s) in zip((0, 90, 180, 270), ((1, 0), (0, 1), (-1, 0), (0, -1))):
+    for _reflection in (False, True):
+        _matrix = numpy.dot([[_c, -_s], [_s, _c]], [[1, 0], [0, -1 if _reflection else 1]])
+        _orientations.append(((_rotation, _reflection), _matrix))
+
+def _canonical(points, steps):
+    """ (key, coords, placement) of a polygon: the points on the database grid are
+        matrix*(coords+origin) for placement = (orientation, origin, matrix, points),
+        coords being the same for every copy of the shape """
+    p = numpy.floor(numpy.asarray(points, dtype=float)*steps + 0.5).astype(numpy.int64)
+    best = None
+    for orientation, matrix in _orientations:
+        q = numpy.dot(p, matrix)
+        # from the lowest vertex, in the direction giving the smallest key
+        i = numpy.lexsort((q[:,1], q[:,0]))[0]
+        origin = q[i]
+        forward = numpy.roll(q-origin, -i, axis=0)
+        backward = numpy.roll(forward[::-1], 1, axis=0)
+        for coords in (forward, backward):
+            key = coords.tostring()
+            if best is None or key < best[0]:
+                best = key, coords, orientation, origin, matrix
+    key, coords, orientation, origin, matrix = best
+    return (len(p), key), coords, (orientation, origin, matrix, points)
+
+def _instances(polygons):
+    """ (single, instances) of the polygons: the ones with less than Cell.instances copies,
+        written as given, and (key, points, arrays) for the others, points being the
+        canonical shape and arrays the (rotation, x_reflection, origin, spacing, columns,
+        rows) placing its copies """
+    steps = resolution()
+    grid = 1.0/steps
+    shapes = {}
+    for points in polygons:
+        key, coords, placement = _canonical(points, steps)
+        shapes.setdefault(key, (coords, []))[1].append(placement)
+    single, instances = [], []
+    for key, (coords, placements) in sorted(shapes.iteritems()):
+        if len(placements) < Cell.instances:
+            # the polygon is written as given, not as its canonical form
+            single.extend(placement[3] for placement in placements)
+            continue
+        groups = {}
+        for orientation, origin, matrix, points in placements:
+            # origins in the frame of the reference, where the gdsii arrays are regular
+            groups.setdefault(orientation, (matrix, []))[1].append(tuple(origin.tolist()))
+        arrays = []
+        for (rotation, x_reflection), (matrix, origins) in sorted(groups.iteritems()):
+            for x, y, dx, dy, columns, rows in _lattice(origins):
+                origin = tuple((numpy.dot(matrix, (x, y))*grid).tolist())
+                arrays.append((rotation or None, x_reflection, origin, (dx*grid, dy*grid), columns, rows))
+        instances.append((key, (coords*grid).tolist(), arrays))
+    return single, instances
+
+def _runs(values):
+    # sorted values split in arithmetic progressions (first, step, count)
+    i = 0
+    while i < len(values):
+        j = i+1
+        step = values[j]-values[i] if j < len(values) else 0
+        if step == 0:
+            yield values[i], 0, 1
+            i = j
+            continue
+        while j+1 < len(values) and values[j+1]-values[j] == step:
+            j += 1
+        yield values[i], step, j-i+1
+        i = j+1
+
+def _lattice(origins):
+    """ (x, y, dx, dy, columns, rows) of the arrays covering the origins:
+        rows of evenly spaced origins, then the identical rows evenly stacked """
+    rows = {}
+    for x, y in origins:
+        rows.setdefault(y, []).append(x)
+    stacks = {}
+    for y, xs in rows.iteritems():
+        for x, dx, columns in _runs(sorted(xs)):
+            stacks.setdefault((x, dx, columns), []).append(y)
+    arrays = []
+    for (x, dx, columns), ys in sorted(stacks.iteritems()):
+        for y, dy, count in _runs(sorted(ys)):
+            arrays.append((x, y, dx, dy, columns, count))
+    return arrays
+
+
 global __unit__
 __unit__ = 1.0e-6
 def unit(x):
@@ -27,13 +296,504 @@ __precision__ = 5.0e-9
 def precision(x):
     global __precision__
     __precision__=x
+
+def resolution():
+    """ number of database steps in a user unit """
+    steps = __unit__/__precision__
+    if abs(steps-int(steps+0.5)) < 1e-9*steps:
+        return int(steps+0.5)
+    return steps
     
 
 
 def export(filename):
-    global __precision__
-    global __unit__
-    gdspy.gds_print(filename, unit=__unit__, precision=__precision__)
+    """ write the cells built with Cell, see Writer to stream the polygons instead """
+    with Writer(filename) as gds:
+        for name, cell in sorted(gdspy.current_library.cell_dict.iteritems()):
+            gds.write(cell)
+
+def extract(filename, namespace, name='TOP'):
+    """ write in one cell of filename every Primitives of namespace (a dict such as
+        globals()) on the gds layer mapped to its name by layermap(), or on Cell.layer
+        with a warning; the names starting with _ are skipped. The cells built with Cell
+        are written too. """
+    from syntax import Primitives
+    with Writer(filename) as gds:
+        for cellname, cell in sorted(gdspy.current_library.cell_dict.iteritems()):
+            gds.write(cell)
+        gds.cell(name)
+        for key, value in sorted(namespace.iteritems()):
+            if isinstance(value, Primitives) and key[0] <> '_':
+                if not key in __layermap__:
+                    warnings.warn('%s is not in the gds layer map, written on layer %d/%d, see gdsii.layermap'
+                                  %(key, Cell.layer, Cell.datatype), stacklevel=2)
+                gds.append(value, layer=key if key in __layermap__ else None)
+
+def clear():
+    """ forget the cells and the layer map of the previous runs """
+    gdspy.current_library = gdspy.GdsLibrary()
+    layermap(None)
+
+
+# gdsii record types, with their data type in the low byte
+_HEADER, _BGNLIB, _LIBNAME, _UNITS, _ENDLIB = 0x0002, 0x0102, 0x0206, 0x0305, 0x0400
+_BGNSTR, _STRNAME, _ENDSTR = 0x0502, 0x0606, 0x0700
+_BOUNDARY, _PATH, _SREF, _AREF, _ENDEL = 0x0800, 0x0900, 0x0A00, 0x0B00, 0x1100
+_LAYER, _DATATYPE, _WIDTH, _XY, _PATHTYPE = 0x0D02, 0x0E02, 0x0F03, 0x1003, 0x2102
+_SNAME, _COLROW, _STRANS, _MAG, _ANGLE = 0x1206, 0x1302, 0x1A01, 0x1B05, 0x1C05
+_TEXT, _NODE, _BOX = 0x0C00, 0x1500, 0x2D00
+_TEXTTYPE, _PRESENTATION, _STRING = 0x1602, 0x1701, 0x1906
+_BOXTYPE, _BGNEXTN, _ENDEXTN = 0x2E02, 0x3003, 0x3103
+
+# a record holds at most 65535 bytes: 8191 points of 2 int32
+_MAXPOINTS = 8191
+
+def _real8(value):
+    """ gdsii 8 byte real: sign, excess 64 exponent of 16 and 56 bit mantissa """
+    if value == 0:
+        return '\0'*8
+    sign = 0x80 if value < 0 else 0
+    value = abs(value)
+    exponent = 64
+    while value >= 1.0:
+        value /= 16.
+        exponent += 1
+    while value < 1.0/16:
+        value *= 16.
+        exponent -= 1
+    mantissa = int(value*2**56 + 0.5)
+    if mantissa >= 2**56:
+        mantissa >>= 4
+        exponent += 1
+    return struct.pack('>Q', (sign|exponent) << 56 | mantissa)
+
+def _float8(data):
+    value, = struct.unpack('>Q', data)
+    sign = -1.0 if value >> 63 else 1.0
+    return sign*(value & (2**56-1))*16.0**(((value >> 56) & 0x7f)-64)/2**56
+
+def _string(name):
+    return name + '\0'*(len(name)%2)
+
+def _timestamp():
+    return struct.pack('>6h', *time.localtime()[:6])*2
+
+
+class Writer(object):
+    """ GDSII stream written record by record to a buffered file: the polygons are
+        encoded as they are given and only the names of the cells are kept.
+            with gdsii.Writer('chip.gds') as gds:
+                gds.cell('TOP')
+                gds.append(primitives, layer=4)
+                gds.reference('VIA', origin=(10, 0), rotation=90)
+        The transformed copies (LazyPrimitives) are written as references to one cell
+        per source, and the repeated polygons as references and arrays to one cell per
+        shape when Cell.instances is set, these cells being written after the current
+        cell. unit and precision default to the ones given to gdsii.unit() and
+        gdsii.precision(). """
+    def __init__(self, filename, name='LIBRARY', unit=None, precision=None, buffering=1<<20):
+        self.unit = unit or __unit__
+        self.precision = precision or __precision__
+        self.steps = self.unit/self.precision
+        self.file = open(filename, 'wb', buffering)
+        self.structure = None
+        self.names = set()
+        self._references = {}
+        self._shapes = {}
+        self._pending = []
+        self._record(_HEADER, struct.pack('>h', 600))
+        self._record(_BGNLIB, _timestamp())
+        self._record(_LIBNAME, _string(name))
+        self._record(_UNITS, _real8(self.precision/self.unit) + _real8(self.precision))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _record(self, rtype, data=''):
+        if len(data) > 65531:
+            raise Exception('%d bytes do not fit in a gdsii record'%len(data))
+        self.file.write(struct.pack('>2H', len(data)+4, rtype) + data)
+
+    def _xy(self, points, closed=False):
+        xy = numpy.floor(numpy.asarray(points, dtype=float).reshape(-1, 2)*self.steps + 0.5)
+        if closed:
+            xy = numpy.vstack((xy, xy[:1]))
+        if len(xy) > _MAXPOINTS:
+            raise Exception('%d points do not fit in a gdsii element, simplify them'%len(xy))
+        if len(xy) and numpy.abs(xy).max() >= 2**31:
+            raise Exception('coordinates out of the gdsii range')
+        return xy.astype('>i4').tostring()
+
+    def _element(self, name):
+        if self.structure is None:
+            raise Exception('no cell to write %s in, call Writer.cell(name) first'%name)
+
+    def _begin(self, name):
+        if name in self.names:
+            raise Exception('cell %s is already written'%name)
+        self.names.add(name)
+        self.structure = name
+        self._record(_BGNSTR, _timestamp())
+        self._record(_STRNAME, _string(name))
+
+    def _end(self):
+        if self.structure is not None:
+            self._record(_ENDSTR)
+            self.structure = None
+        # cells of the references, a source may reference other sources
+        while self._pending:
+            name, write = self._pending.pop()
+            self._begin(name)
+            write()
+            self._record(_ENDSTR)
+            self.structure = None
+
+    def cell(self, name):
+        """ end the current cell and begin the cell name """
+        self._end()
+        self._begin(name)
+
+    def close(self):
+        if self.file.closed:
+            return
+        self._end()
+        self._record(_ENDLIB)
+        self.file.close()
+
+    def boundary(self, points, layer, datatype=0):
+        self._element('a boundary')
+        self._record(_BOUNDARY)
+        self._record(_LAYER, struct.pack('>h', layer))
+        self._record(_DATATYPE, struct.pack('>h', datatype))
+        self._record(_XY, self._xy(points, closed=True))
+        self._record(_ENDEL)
+
+    def path(self, points, width, layer, datatype=0, pathtype=0):
+        self._element('a path')
+        self._record(_PATH)
+        self._record(_LAYER, struct.pack('>h', layer))
+        self._record(_DATATYPE, struct.pack('>h', datatype))
+        self._record(_PATHTYPE, struct.pack('>h', pathtype))
+        self._record(_WIDTH, struct.pack('>i', int(round(width*self.steps))))
+        self._record(_XY, self._xy(points))
+        self._record(_ENDEL)
+
+    def text(self, text, position, layer, texttype=0, anchor=0, rotation=None, magnification=None,
+             x_reflection=False):
+        """ TEXT at position, anchor being the gdsii presentation of gdspy.Label """
+        self._element('a text')
+        self._record(_TEXT)
+        self._record(_LAYER, struct.pack('>h', layer))
+        self._record(_TEXTTYPE, struct.pack('>h', texttype))
+        self._record(_PRESENTATION, struct.pack('>H', anchor))
+        self._transformation(rotation, magnification, x_reflection)
+        self._record(_XY, self._xy([position]))
+        self._record(_STRING, _string(text))
+        self._record(_ENDEL)
+
+    def _transformation(self, rotation, magnification, x_reflection):
+        if rotation or (magnification not in (None, 1)) or x_reflection:
+            self._record(_STRANS, struct.pack('>H', 0x8000 if x_reflection else 0))
+            if magnification not in (None, 1):
+                self._record(_MAG, _real8(magnification))
+            if rotation:
+                self._record(_ANGLE, _real8(rotation))
+
+    def reference(self, name, origin=(0, 0), rotation=None, magnification=None, x_reflection=False):
+        """ SREF to the cell name, reflected about the x axis, magnified, rotated (degrees)
+            and translated to origin """
+        self._element('a reference')
+        self._record(_SREF)
+        self._record(_SNAME, _string(name))
+        self._transformation(rotation, magnification, x_reflection)
+        self._record(_XY, self._xy([origin]))
+        self._record(_ENDEL)
+
+    def array(self, name, columns, rows, spacing, origin=(0, 0), rotation=None, magnification=None,
+              x_reflection=False):
+        """ AREF of columns x rows references to the cell name, spacing being the distances
+            between the columns and the rows in the frame of the cell """
+        self._element('an array')
+        self._record(_AREF)
+        self._record(_SNAME, _string(name))
+        self._transformation(rotation, magnification, x_reflection)
+        self._record(_COLROW, struct.pack('>2h', columns, rows))
+        c, s = _cossin(rotation or 0)
+        m = -1 if x_reflection else 1
+        x, y = origin
+        u, v = columns*spacing[0], m*rows*spacing[1]
+        self._record(_XY, self._xy([(x, y), (x+c*u, y+s*u), (x-s*v, y+c*v)]))
+        self._record(_ENDEL)
+
+    def append(self, primitives, layer=None):
+        """ boundaries of the primitives, see Cell.append for the layer """
+        layer = _gdslayer(layer)
+        reference = getattr(primitives, 'reference', None)
+        if reference:
+            source, affine = reference
+            transformation = affine.decompose()
+            if transformation:
+                origin, rotation, magnification, x_reflection = transformation
+                self.reference(self._referenced(source, layer), origin, rotation, magnification, x_reflection)
+                return
+        polygons = [points for points in map(_boundary, primitives) if points]
+        if Cell.instances:
+            polygons = self._instantiate(polygons, layer)
+        for points in polygons:
+            self.boundary(points, *layer)
+
+    def _instantiate(self, polygons, layer):
+        # as Cell._instantiate, the cells of the shapes written after the current cell
+        single, instances = _instances(polygons)
+        for key, points, arrays in instances:
+            key = key, layer
+            if not key in self._shapes:
+                self._shapes[key] = self._cellname('SHAPE%d'%len(self._shapes))
+                self._pending.append((self._shapes[key], lambda points=points: self.boundary(points, *layer)))
+            for rotation, x_reflection, origin, spacing, columns, rows in arrays:
+                if columns*rows == 1:
+                    self.reference(self._shapes[key], origin, rotation, None, x_reflection)
+                else:
+                    self.array(self._shapes[key], columns, rows, spacing, origin, rotation, None, x_reflection)
+        return single
+
+    def _cellname(self, name):
+        # the cells of the library may be written in the same file
+        while name in self.names or name in gdspy.current_library.cell_dict:
+            name += '_'
+        return name
+
+    def _referenced(self, source, layer):
+        key = _digest(source), layer
+        if not key in self._references:
+            name = self._cellname('REF%d'%len(self._references))
+            self._references[key] = name
+            self._pending.append((name, lambda: self.append(source, layer)))
+        return self._references[key]
+
+    def write(self, cell):
+        """ cell built with gdspy: its polygons, paths, labels, references and arrays """
+        self.cell(cell.name)
+        for polygonset in cell.polygons:
+            for points, layer, datatype in zip(polygonset.polygons, polygonset.layers, polygonset.datatypes):
+                self.boundary(points, layer, datatype)
+        for path in cell.paths:
+            # FlexPath and RobustPath encoded by gdspy, as GdsLibrary.write_gds does
+            self._element('a path')
+            self.file.write(path.to_gds(self.steps))
+        for label in cell.labels:
+            self.text(label.text, label.position, label.layer, label.texttype, label.anchor,
+                      label.rotation, label.magnification, label.x_reflection)
+        for reference in cell.references:
+            name = getattr(reference.ref_cell, 'name', reference.ref_cell)
+            if isinstance(reference, gdspy.CellArray):
+                self.array(name, reference.columns, reference.rows, reference.spacing, reference.origin,
+                           reference.rotation, reference.magnification, reference.x_reflection)
+            else:
+                self.reference(name, reference.origin, reference.rotation, reference.magnification,
+                               reference.x_reflection)
+
+
+def _outline(xy, width, pathtype=0, extensions=(0, 0)):
+    # boundary of a gdsii path with mitered joins: pathtype 0 ends flush, 1 ends in half
+    # circles within one database step, 2 extends the ends by half the width and 4 by
+    # the extensions (BGNEXTN, ENDEXTN)
+    from syntax.curves import arcsegments
+    xy = xy[numpy.r_[True, (xy[1:] != xy[:-1]).any(axis=1)]]
+    if len(xy) < 2 or width == 0:
+        return None
+    d = xy[1:]-xy[:-1]
+    d /= numpy.hypot(d[:,0], d[:,1])[:,None]
+    h = 0.5*abs(width)
+    if pathtype in (2, 4):
+        begin, end = (h, h) if pathtype == 2 else extensions
+        xy = xy.copy()
+        xy[0] -= begin*d[0]
+        xy[-1] += end*d[-1]
+    n = numpy.column_stack((-d[:,1], d[:,0]))
+    miter = (n[:-1]+n[1:])/numpy.maximum(1.0+(n[:-1]*n[1:]).sum(axis=1), 1e-12)[:,None]
+    normals = numpy.vstack((n[:1], miter, n[-1:]))
+    if pathtype != 1:
+        return numpy.vstack((xy + h*normals, (xy - h*normals)[::-1]))
+    # the half circles from the left side of the path to its right side at the end,
+    # and back at the beginning
+    t = numpy.linspace(0, pi, arcsegments(h, pi, 1.0)+1)[1:-1, None]
+    end = xy[-1] + h*(numpy.cos(t)*n[-1] + numpy.sin(t)*d[-1])
+    begin = xy[0] - h*(numpy.cos(t)*n[0] + numpy.sin(t)*d[0])
+    return numpy.vstack((xy + h*normals, end, (xy - h*normals)[::-1], begin))
+
+
+class Reader(object):
+    """ GDSII file mapped in memory: the offsets of the cells are indexed when it is
+        opened and a cell is only decoded when its primitives are requested.
+            pads = gdsii.Reader('foundry.gds').primitives('PAD', layers=[40, (41, 2)])
+        layers are layer numbers or (layer, datatype) pairs, None reads them all. """
+    def __init__(self, filename):
+        self.file = open(filename, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.offsets = {}
+        self.units = None
+        self._cells = {}
+        self._flat = {}
+        self._index()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self._cells.clear()
+        self._flat.clear()
+        self.map.close()
+        self.file.close()
+
+    @property
+    def cells(self):
+        return sorted(self.offsets)
+
+    def _index(self):
+        # one pass over the record headers, the data of the elements is skipped
+        data, header = self.map, struct.Struct('>2H').unpack_from
+        library = _BGNSTR, _STRNAME, _ENDSTR, _UNITS, _ENDLIB
+        size, offset, start, name = len(data), 0, None, None
+        while offset+4 <= size:
+            length, rtype = header(data, offset)
+            if length < 4:
+                break
+            if not rtype in library:
+                offset += length
+                continue
+            if rtype == _BGNSTR:
+                start = offset
+            elif rtype == _STRNAME:
+                name = data[offset+4:offset+length].rstrip('\0')
+            elif rtype == _ENDSTR:
+                self.offsets[name] = start, offset
+            elif rtype == _UNITS:
+                self.units = _float8(data[offset+4:offset+12]), _float8(data[offset+12:offset+20])
+            elif rtype == _ENDLIB:
+                break
+            offset += length
+
+    def _decode(self, name, layers):
+        """ (polygons, references) of the cell: polygons in database steps and references
+            as (name, matrix, offsets) """
+        key = name, layers
+        if key in self._cells:
+            return self._cells[key]
+        if not name in self.offsets:
+            raise Exception('no cell %s in %s'%(name, self.file.name))
+        data, unpack = self.map, struct.unpack_from
+        header = struct.Struct('>2H').unpack_from
+        elements = _BOUNDARY, _PATH, _SREF, _AREF, _TEXT, _NODE, _BOX
+        offset, end = self.offsets[name]
+        polygons, references = [], []
+        element, pathtypes = None, set()
+        while offset < end:
+            length, rtype = header(data, offset)
+            body = offset+4
+            offset += length
+            if rtype in elements:
+                element, xy = rtype, None
+                layer, datatype, width, pathtype, extensions = 0, 0, 0, 0, [0, 0]
+                strans, magnification, angle, colrow = 0, 1.0, 0.0, (1, 1)
+            elif element is None:
+                continue
+            elif rtype == _XY:
+                # the coordinates of the shapes outside the layers are not decoded
+                if element in (_BOUNDARY, _PATH, _BOX) and not (layers is None or layer in layers
+                                                                 or (layer, datatype) in layers):
+                    element = None
+                else:
+                    xy = numpy.frombuffer(data, '>i4', (length-4)//4, body).reshape(-1, 2).astype(float)
+            elif rtype == _LAYER:
+                layer, = unpack('>h', data, body)
+            elif rtype in (_DATATYPE, _BOXTYPE):
+                # a box is read on (layer, boxtype)
+                datatype, = unpack('>h', data, body)
+            elif rtype == _ENDEL:
+                if xy is None:
+                    pass
+                elif element in (_BOUNDARY, _BOX):
+                    polygons.append(xy[:-1] if (xy[0] == xy[-1]).all() else xy)
+                elif element == _PATH:
+                    if not pathtype in (0, 1, 2, 4):
+                        pathtypes.add(pathtype)
+                    outline = _outline(xy, width, pathtype, extensions)
+                    if outline is not None:
+                        polygons.append(outline)
+                elif element in (_SREF, _AREF):
+                    references.append(_reference(sname, strans, magnification, angle, colrow, xy))
+                element = None
+            elif rtype == _WIDTH:
+                width, = unpack('>i', data, body)
+            elif rtype == _PATHTYPE:
+                pathtype, = unpack('>h', data, body)
+            elif rtype in (_BGNEXTN, _ENDEXTN):
+                extensions[rtype == _ENDEXTN], = unpack('>i', data, body)
+            elif rtype == _SNAME:
+                sname = data[body:offset].rstrip('\0')
+            elif rtype == _STRANS:
+                strans, = unpack('>H', data, body)
+            elif rtype == _MAG:
+                magnification = _float8(data[body:body+8])
+            elif rtype == _ANGLE:
+                angle = _float8(data[body:body+8])
+            elif rtype == _COLROW:
+                colrow = unpack('>2h', data, body)
+        for pathtype in sorted(pathtypes):
+            warnings.warn('paths of type %d in cell %s are read with flush ends'%(pathtype, name))
+        self._cells[key] = polygons, references
+        return polygons, references
+
+    def _flatten(self, name, layers):
+        # polygons of the cell and of the cells it references, in database steps
+        key = name, layers
+        if not key in self._flat:
+            polygons, references = self._decode(name, layers)
+            flat = list(polygons)
+            for sname, matrix, offsets in references:
+                for xy in self._flatten(sname, layers):
+                    xy = numpy.dot(xy, matrix.T)
+                    flat.extend(xy + offset for offset in offsets)
+            self._flat[key] = flat
+        return self._flat[key]
+
+    def primitives(self, name, layers=None, flatten=True):
+        """ Primitives of the cell in user units (gdsii.unit), with the cells it references
+            unless flatten is False """
+        from syntax import Primitives, PackedPrimitive
+        if layers is not None:
+            layers = frozenset(layers)
+        if flatten:
+            polygons = self._flatten(name, layers)
+        else:
+            polygons = self._decode(name, layers)[0]
+        if not len(polygons):
+            return Primitives()
+        scale = self.units[1]/__unit__
+        return Primitives(PackedPrimitive(xy*scale) for xy in polygons)
+
+def _reference(sname, strans, magnification, angle, colrow, xy):
+    # (name, matrix, offsets) of a SREF or an AREF: reflection about the x axis,
+    # magnification, rotation and translation to each offset
+    c, s = _cossin(angle)
+    matrix = magnification*numpy.array([[c, -s], [s, c]])
+    if strans & 0x8000:
+        matrix[:,1] *= -1
+    origin = xy[0]
+    if len(xy) == 1:
+        return sname, matrix, origin[None,:]
+    columns, rows = colrow
+    u, v = (xy[1]-origin)/columns, (xy[2]-origin)/rows
+    i, j = numpy.meshgrid(numpy.arange(columns), numpy.arange(rows))
+    return sname, matrix, origin + i.reshape(-1, 1)*u + j.reshape(-1, 1)*v
+
 
 def viewer():
     gdspy.LayoutViewer()
@@ -18,19 +18,20 @@ material.append( Material(name='SiO2', epsilon=4.0, transparency=0.5) )
 material.append( Material(name='SiON', epsilon=5.0, transparency=0.5) )
 
 
+# (name, material, zrange, gds) with gds the (layer, datatype) of the layout
 metal = Layers()
-metal.append( ('ALRDL', 'Aluminum', (99200*1e-4, 113700*1e-4)) )
-metal.append( ('TM2', 'Copper', (91200*1e-4, 58700*1e-4)) )
-metal.append( ('TM1', 'Copper', (50400*1e-4, 50400*1e-4-8300*1e-4)) )
-metal.append( ('Metal8', 'Copper', (33400*1e-4, 33400*1e-4-2200*1e-4)) )
-metal.append( ('Metal7', 'Copper', (29450*1e-4, 29450*1e-4-2200*1e-4)) )
-metal.append( ('Metal6', 'Copper', (25500*1e-4, 25500*1e-4-2200*1e-4)) )
-metal.append( ('Metal5', 'Copper', (21550*1e-4, 21550*1e-4-2200*1e-4)) )
-metal.append( ('Metal4', 'Copper', (17600*1e-4, 17600*1e-4-2200*1e-4)) )
-metal.append( ('Metal3', 'Copper', (13650*1e-4, 13650*1e-4-2200*1e-4)) )
-metal.append( ('Metal2', 'Copper', (9700*1e-4, 9700*1e-4-2200*1e-4)) )
-metal.append( ('Metal1', 'Copper', (5750*1e-4, 5750*1e-4-1800*1e-4)) )
-metal.append( ('Poly', 'Poly', (0*1e-4, 1000*1e-4)) )
+metal.append( ('ALRDL', 'Aluminum', (99200*1e-4, 113700*1e-4), (74, 0)) )
+metal.append( ('TM2', 'Copper', (91200*1e-4, 58700*1e-4), (40, 0)) )
+metal.append( ('TM1', 'Copper', (50400*1e-4, 50400*1e-4-8300*1e-4), (39, 0)) )
+metal.append( ('Metal8', 'Copper', (33400*1e-4, 33400*1e-4-2200*1e-4), (38, 0)) )
+metal.append( ('Metal7', 'Copper', (29450*1e-4, 29450*1e-4-2200*1e-4), (37, 0)) )
+metal.append( ('Metal6', 'Copper', (25500*1e-4, 25500*1e-4-2200*1e-4), (36, 0)) )
+metal.append( ('Metal5', 'Copper', (21550*1e-4, 21550*1e-4-2200*1e-4), (35, 0)) )
+metal.append( ('Metal4', 'Copper', (17600*1e-4, 17600*1e-4-2200*1e-4), (34, 0)) )
+metal.append( ('Metal3', 'Copper', (13650*1e-4, 13650*1e-4-2200*1e-4), (33, 0)) )
+metal.append( ('Metal2', 'Copper', (9700*1e-4, 9700*1e-4-2200*1e-4), (32, 0)) )
+metal.append( ('Metal1', 'Copper', (5750*1e-4, 5750*1e-4-1800*1e-4), (31, 0)) )
+metal.append( ('Poly', 'Poly', (0*1e-4, 1000*1e-4), (17, 0)) )
 metal.append( ('Pwell', 'Pwell', (0*1e-4, -6000*1e-4)) )
 
 
@@ -142,17 +143,18 @@ if PROCESS == 'SMIC55LL':
     dielectric['Pass6'] = Layer(name='Pass6',  zmin=dielectric['Pass5'].zmax,  thickness=eps/dielectric['Pass6'].eps*dielectric['Pass6'].thickness)
     
     Layer.unit = 'um'
+    # gds (layer, datatype) of the metals, see gdsii.layermap(metal)
     metal = Layers()
-    metal.append( Layer(name='ALRDL', material='Aluminum', zmin=dielectric['Pass5'].zmin, thickness=1.45) )
-    metal.append( Layer(name='TM2', material='CopperTM2', zmin=dielectric['UTMa'].zmin, thickness=3.4) )
-    metal.append( Layer(name='Metal6', material='CopperM2M8', zmax=dielectric['IMD6b'].zmax, thickness=0.2) )
-    metal.append( Layer(name='Metal5', material='CopperM2M8', zmax=dielectric['IMD5b'].zmax, thickness=0.2) )
-    metal.append( Layer(name='Metal4', material='CopperM2M8', zmax=dielectric['IMD4b'].zmax, thickness=0.2) )
-    metal.append( Layer(name='Metal3', material='CopperM2M8', zmax=dielectric['IMD3b'].zmax, thickness=0.2) )
-    metal.append( Layer(name='Metal2', material='CopperM2M8', zmax=dielectric['IMD2b'].zmax, thickness=0.2) )
-    metal.append( Layer(name='Metal1', material='CopperM1', zmax=dielectric['IMD1b'].zmax, thickness=0.165) )
-    metal.append( Layer(name='Poly', material='Poly', zmin=0.035, thickness=0.1) )
-    metal.append( Layer(name='AA', material='Si', zmax=0.0, thickness=0.31) )
+    metal.append( Layer(name='ALRDL', material='Aluminum', zmin=dielectric['Pass5'].zmin, thickness=1.45, gds=(74, 0)) )
+    metal.append( Layer(name='TM2', material='CopperTM2', zmin=dielectric['UTMa'].zmin, thickness=3.4, gds=(40, 0)) )
+    metal.append( Layer(name='Metal6', material='CopperM2M8', zmax=dielectric['IMD6b'].zmax, thickness=0.2, gds=(36, 0)) )
+    metal.append( Layer(name='Metal5', material='CopperM2M8', zmax=dielectric['IMD5b'].zmax, thickness=0.2, gds=(35, 0)) )
+    metal.append( Layer(name='Metal4', material='CopperM2M8', zmax=dielectric['IMD4b'].zmax, thickness=0.2, gds=(34, 0)) )
+    metal.append( Layer(name='Metal3', material='CopperM2M8', zmax=dielectric['IMD3b'].zmax, thickness=0.2, gds=(33, 0)) )
+    metal.append( Layer(name='Metal2', material='CopperM2M8', zmax=dielectric['IMD2b'].zmax, thickness=0.2, gds=(32, 0)) )
+    metal.append( Layer(name='Metal1', material='CopperM1', zmax=dielectric['IMD1b'].zmax, thickness=0.165, gds=(31, 0)) )
+    metal.append( Layer(name='Poly', material='Poly', zmin=0.035, thickness=0.1, gds=(17, 0)) )
+    metal.append( Layer(name='AA', material='Si', zmax=0.0, thickness=0.31, gds=(6, 0)) )
     
     material.append( Material(name='Oxide1', epsilon=3, transparency=0.5) )
     material.append( Material(name='Oxide2', epsilon=4, transparency=0.5) )
@@ -239,16 +241,17 @@ if PROCESS == 'TSMC40G':
         prev_layer = dielectric[i+1]
 
     Layer.unit = 'um'
+    # gds (layer, datatype) of the metals, see gdsii.layermap(metal)
     metal = Layers()
-    metal.append( Layer(name='ALRDL', material='Aluminum', zmin=dielectric['Pass3'].zmin, thickness=1.45) )
-    metal.append( Layer(name='TM2', material='Copper1', zmax=dielectric['IMD10c'].zmax, thickness=3.5) )
-    metal.append( Layer(name='Metal6', material='Copper2', zmax=dielectric['IMD6c'].zmax, thickness=0.15) )
-    metal.append( Layer(name='Metal5', material='Copper2', zmax=dielectric['IMD5c'].zmax, thickness=0.15) )
-    metal.append( Layer(name='Metal4', material='Copper2', zmax=dielectric['IMD4c'].zmax, thickness=0.15) )
-    metal.append( Layer(name='Metal3', material='Copper2', zmax=dielectric['IMD3c'].zmax, thickness=0.15) )
-    metal.append( Layer(name='Metal2', material='Copper2', zmax=dielectric['IMD2c'].zmax, thickness=0.15) )
-    metal.append( Layer(name='Metal1', material='Copper3', zmax=dielectric['IMD1c'].zmax-0.05, thickness=0.125) )
-    metal.append( Layer(name='Poly', material='Copper', zmin=0, thickness=0.08) )
+    metal.append( Layer(name='ALRDL', material='Aluminum', zmin=dielectric['Pass3'].zmin, thickness=1.45, gds=(74, 0)) )
+    metal.append( Layer(name='TM2', material='Copper1', zmax=dielectric['IMD10c'].zmax, thickness=3.5, gds=(40, 0)) )
+    metal.append( Layer(name='Metal6', material='Copper2', zmax=dielectric['IMD6c'].zmax, thickness=0.15, gds=(36, 0)) )
+    metal.append( Layer(name='Metal5', material='Copper2', zmax=dielectric['IMD5c'].zmax, thickness=0.15, gds=(35, 0)) )
+    metal.append( Layer(name='Metal4', material='Copper2', zmax=dielectric['IMD4c'].zmax, thickness=0.15, gds=(34, 0)) )
+    metal.append( Layer(name='Metal3', material='Copper2', zmax=dielectric['IMD3c'].zmax, thickness=0.15, gds=(33, 0)) )
+    metal.append( Layer(name='Metal2', material='Copper2', zmax=dielectric['IMD2c'].zmax, thickness=0.15, gds=(32, 0)) )
+    metal.append( Layer(name='Metal1', material='Copper3', zmax=dielectric['IMD1c'].zmax-0.05, thickness=0.125, gds=(31, 0)) )
+    metal.append( Layer(name='Poly', material='Copper', zmin=0, thickness=0.08, gds=(17, 0)) )
     
     material.append( Material(name='Oxide1', epsilon=2.55, transparency=0.5) )
     material.append( Material(name='Oxide2', epsilon=4.2, transparency=0.5) )
@@ -83,17 +83,18 @@ dielectric['Pass6'] = Layer(name='Pass6',  zmin=dielectric['Pass5'].zmax,  thick
 
    
 Layer.unit = 'um'
+# gds (layer, datatype) of the metals, see gdsii.layermap(metal)
 metal = Layers()
-metal.append( Layer(name='ALRDL', material='Aluminum', zmin=dielectric['Pass5'].zmin, thickness=1.45) )
-metal.append( Layer(name='TM2', material='CopperTM2', zmin=dielectric['UTMa'].zmin, thickness=3.4) )
-metal.append( Layer(name='Metal6', material='CopperM2M8', zmax=dielectric['IMD6b'].zmax, thickness=0.2) )
-metal.append( Layer(name='Metal5', material='CopperM2M8', zmax=dielectric['IMD5b'].zmax, thickness=0.2) )
-metal.append( Layer(name='Metal4', material='CopperM2M8', zmax=dielectric['IMD4b'].zmax, thickness=0.2) )
-metal.append( Layer(name='Metal3', material='CopperM2M8', zmax=dielectric['IMD3b'].zmax, thickness=0.2) )
-metal.append( Layer(name='Metal2', material='CopperM2M8', zmax=dielectric['IMD2b'].zmax, thickness=0.2) )
-metal.append( Layer(name='Metal1', material='CopperM1', zmax=dielectric['IMD1b'].zmax, thickness=0.165) )
-metal.append( Layer(name='Poly', material='Poly', zmin=0.035, thickness=0.1) )
-metal.append( Layer(name='AA', material='AA', zmax=0.0, thickness=0.31) )
+metal.append( Layer(name='ALRDL', material='Aluminum', zmin=dielectric['Pass5'].zmin, thickness=1.45, gds=(74, 0)) )
+metal.append( Layer(name='TM2', material='CopperTM2', zmin=dielectric['UTMa'].zmin, thickness=3.4, gds=(40, 0)) )
+metal.append( Layer(name='Metal6', material='CopperM2M8', zmax=dielectric['IMD6b'].zmax, thickness=0.2, gds=(36, 0)) )
+metal.append( Layer(name='Metal5', material='CopperM2M8', zmax=dielectric['IMD5b'].zmax, thickness=0.2, gds=(35, 0)) )
+metal.append( Layer(name='Metal4', material='CopperM2M8', zmax=dielectric['IMD4b'].zmax, thickness=0.2, gds=(34, 0)) )
+metal.append( Layer(name='Metal3', material='CopperM2M8', zmax=dielectric['IMD3b'].zmax, thickness=0.2, gds=(33, 0)) )
+metal.append( Layer(name='Metal2', material='CopperM2M8', zmax=dielectric['IMD2b'].zmax, thickness=0.2, gds=(32, 0)) )
+metal.append( Layer(name='Metal1', material='CopperM1', zmax=dielectric['IMD1b'].zmax, thickness=0.165, gds=(31, 0)) )
+metal.append( Layer(name='Poly', material='Poly', zmin=0.035, thickness=0.1, gds=(17, 0)) )
+metal.append( Layer(name='AA', material='AA', zmax=0.0, thickness=0.31, gds=(6, 0)) )
 
    
 material.append( Material(name='Oxide1', epsilon=3, transparency=0.5) )
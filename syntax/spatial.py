@@ -0,0 +1,121 @@
+from math import floor
+
+__all__ = ['GridIndex']
+
+
+def _overlap(bbox1, bbox2):
+    return not (bbox1[2] < bbox2[0] or bbox2[2] < bbox1[0] or bbox1[3] < bbox2[1] or bbox2[3] < bbox1[1])
+
+
+class GridIndex(object):
+    """ Uniform grid over bounding boxes (xmin, ymin, xmax, ymax).
+        Each box is registered in every cell it covers; queries return the position
+        of the boxes in the order they were inserted. """
+    def __init__(self, bboxes=(), cellsize=None):
+        bboxes = list(bboxes)
+        if cellsize is None:
+            # the average size of the boxes keeps a few shapes per cell
+            sizes = [max(bbox[2]-bbox[0], bbox[3]-bbox[1]) for bbox in bboxes]
+            sizes = [size for size in sizes if size > 0]
+            cellsize = sum(sizes)/len(sizes) if sizes else 1.0
+        self.cellsize = float(cellsize)
+        self.bboxes = []
+        self.cells = {}
+        self.limits = None
+        for bbox in bboxes:
+            self.insert(bbox)
+
+    def __len__(self):
+        return len(self.bboxes)
+
+    def _range(self, xmin, ymin, xmax, ymax):
+        size = self.cellsize
+        return (int(floor(xmin/size)), int(floor(ymin/size)),
+                int(floor(xmax/size)), int(floor(ymax/size)))
+
+    def insert(self, bbox):
+        i = len(self.bboxes)
+        bbox = tuple(bbox)
+        self.bboxes.append(bbox)
+        i0, j0, i1, j1 = self._range(*bbox)
+        for ci in xrange(i0, i1+1):
+            for cj in xrange(j0, j1+1):
+                self.cells.setdefault((ci, cj), []).append(i)
+        if self.limits is None:
+            self.limits = i0, j0, i1, j1
+        else:
+            l0, m0, l1, m1 = self.limits
+            self.limits = min(l0, i0), min(m0, j0), max(l1, i1), max(m1, j1)
+        return i
+
+    def window(self, xmin, ymin, xmax, ymax):
+        """ positions of the boxes overlapping the window, boundaries included """
+        window = xmin, ymin, xmax, ymax
+        if self.limits is None:
+            return []
+        l0, m0, l1, m1 = self.limits
+        i0, j0, i1, j1 = self._range(*window)
+        i0, j0, i1, j1 = max(i0, l0), max(j0, m0), min(i1, l1), min(j1, m1)
+        if (i1-i0+1)*(j1-j0+1) > len(self.bboxes):
+            # the window covers more cells than there are boxes
+            return [i for i, bbox in enumerate(self.bboxes) if _overlap(bbox, window)]
+        found = set()
+        for ci in xrange(i0, i1+1):
+            for cj in xrange(j0, j1+1):
+                for i in self.cells.get((ci, cj), ()):
+                    if not i in found and _overlap(self.bboxes[i], window):
+                        found.add(i)
+        return sorted(found)
+
+    def _ring(self, ci, cj, k):
+        # cells at Chebyshev distance k from (ci, cj), restricted to the grid limits
+        l0, m0, l1, m1 = self.limits
+        if k==0:
+            yield ci, cj
+            return
+        for i in xrange(max(ci-k, l0), min(ci+k, l1)+1):
+            if m0 <= cj-k <= m1:
+                yield i, cj-k
+            if m0 <= cj+k <= m1:
+                yield i, cj+k
+        for j in xrange(max(cj-k+1, m0), min(cj+k-1, m1)+1):
+            if l0 <= ci-k <= l1:
+                yield ci-k, j
+            if l0 <= ci+k <= l1:
+                yield ci+k, j
+
+    def nearest(self, x, y, distance=None):
+        """ position of the box nearest to (x, y), or None if the index is empty.
+            distance(i, x, y) may give the exact distance to the shape i, it is
+            only evaluated on the boxes closer than the best shape found so far. """
+        if self.limits is None:
+            return None
+        def boxdistance(bbox):
+            dx = max(bbox[0]-x, 0.0, x-bbox[2])
+            dy = max(bbox[1]-y, 0.0, y-bbox[3])
+            return (dx*dx+dy*dy)**0.5
+        l0, m0, l1, m1 = self.limits
+        ci, cj = self._range(x, y, x, y)[:2]
+        # rings closer than the grid limits are empty
+        k = max(l0-ci, ci-l1, m0-cj, cj-m1, 0)
+        kmax = max(ci-l0, l1-ci, cj-m0, m1-cj)
+        best, ibest = float('inf'), None
+        seen = set()
+        while k <= kmax:
+            for cell in self._ring(ci, cj, k):
+                for i in self.cells.get(cell, ()):
+                    if i in seen:
+                        continue
+                    seen.add(i)
+                    d = boxdistance(self.bboxes[i])
+                    if d >= best:
+                        continue
+                    if distance:
+                        d = distance(i, x, y)
+                    if d < best:
+                        best, ibest = d, i
+            # shapes outside ring k are at least k cells away
+            if best <= k*self.cellsize:
+                break
+            k += 1
+        return ibest
@@ -0,0 +1,111 @@
+import unittest
+from syntax import *
+
+
+def square(x0, y0, x1, y1, clockwise=False):
+    points = [Point(x0, y0), Point(x1, y0), Point(x1, y1), Point(x0, y1)]
+    if clockwise:
+        points.reverse()
+    return Primitive(*points)
+
+
+class TestUnion(unittest.TestCase):
+    def test_mixed_windings(self):
+        # a clockwise operand must not cancel a counterclockwise one where they overlap
+        A = Primitives(primitive for primitive in [square(0, 0, 2, 2)])
+        b = square(1, 1, 3, 3, clockwise=True)
+        result = A.Union(b)
+        self.assertEqual(len(result), 1)
+        self.assertEqual(len(result[0]), 8)
+        self.assertAlmostEqual(abs(boolean.area(result[0].tolist())), 7.0)
+        self.assertEqual(sorted(result[0].tolist()), sorted(Union(A, b)[0].tolist()))
+
+    def test_holes_kept(self):
+        # an operand wound both ways keeps its holes, as with the pairwise Union
+        ring = Primitives(primitive for primitive in [square(0, 0, 10, 10), square(4, 4, 6, 6, clockwise=True)])
+        result = ring.Union(square(20, 0, 21, 1))
+        self.assertAlmostEqual(sum(boolean.area(primitive.tolist()) for primitive in result), 97.0)
+
+
+def outlines(primitives):
+    # the polygons from their lowest vertex, keeping their direction
+    result = []
+    for primitive in primitives:
+        points = primitive.tolist()
+        i = points.index(min(points))
+        result.append(points[i:]+points[:i])
+    return sorted(result)
+
+
+class TestBoolean(unittest.TestCase):
+    def test_difference(self):
+        # the subject polygons away from the clip come back united and wound as the
+        # polygons going through the clipper
+        subject = Primitives(primitive for primitive in [
+            square(0, 0, 4, 4), square(3, 3, 5, 5),
+            square(20, 0, 22, 2, clockwise=True),
+            square(30, 0, 32, 2), square(31, 1, 33, 3),
+            Primitive(Point(40, 0), Point(41, 0), Point(42, 0), Point(42, 2), Point(40, 2), Point(40, 2))])
+        vias = [square(1, 1, 2, 2), square(4, 4, 4.5, 4.5), square(50, 50, 51, 51)]
+        for integer in (False, True):
+            shield = Boolean(subject, integer)
+            for via in vias + vias:
+                expected = Difference(subject, via, integer)
+                self.assertEqual(outlines(shield.Difference(via)), outlines(expected))
+            self.assertEqual(outlines(shield.Clear().Difference()), outlines(Union(subject, [], integer)))
+
+
+def rectangle(x0, y0, x1, y1):
+    return [(x0, y0), (x1, y0), (x1, y1), (x0, y1)]
+
+
+class TestClipper(unittest.TestCase):
+    # the sweep of clipper against known areas and hole counts, with the float
+    # intersections and with the integer ones of Clipper.Integer
+    def area(self, polygons):
+        return sum(boolean.area(polygon) for polygon in polygons)
+
+    def test_overlapping_grid(self):
+        squares = [rectangle(3*i, 3*j, 3*i+4, 3*j+4) for i in xrange(10) for j in xrange(10)]
+        for integer in (False, True):
+            result = boolean.clip(squares, [], clipper.ClipType.Union, integer)
+            self.assertEqual(len(result), 1)
+            self.assertAlmostEqual(self.area(result), 31.0**2)
+
+    def test_staggered_rows(self):
+        # local minima at many heights, in the order they are added
+        rows = [rectangle(3*i, 10*j+(i%3), 3*i+4, 10*j+(i%3)+5) for j in xrange(4) for i in xrange(20)][::-1]
+        for integer in (False, True):
+            result = boolean.clip(rows, [], clipper.ClipType.Union, integer)
+            self.assertEqual(len(result), 4)
+            for polygon in result:
+                # 20 rectangles of 20, overlapping by 4 or by 3 (every third)
+                self.assertAlmostEqual(boolean.area(polygon), 400.0-13*4-6*3)
+
+    def test_holes(self):
+        holes = [rectangle(3+10*i, 3+10*j, 7+10*i, 7+10*j) for i in xrange(3) for j in xrange(3)]
+        for integer in (False, True):
+            tree = boolean.cliptree([rectangle(0, 0, 30, 30)], holes, clipper.ClipType.Difference, integer)
+            self.assertEqual(len(tree), 1)
+            outer, inner = tree[0]
+            self.assertEqual(len(inner), 9)
+            self.assertAlmostEqual(abs(boolean.area(outer)) - sum(abs(boolean.area(hole)) for hole in inner), 756.0)
+
+    def test_intersection_point(self):
+        # the crossing of the two triangles is (5, 1.5), rounded to (5, 2) on integers:
+        # the top of the intersection and the notch of the union
+        a = [(0, 0), (10, 0), (0, 3)]
+        b = [(0, 0), (10, 0), (10, 3)]
+        for integer, area, top, notch in ((False, 7.5, (5, 1.5), 7.5), (True, 10.0, (5, 2), 5.0)):
+            result = boolean.clip([a], [b], clipper.ClipType.Intersection, integer)
+            self.assertEqual(len(result), 1)
+            self.assertAlmostEqual(abs(boolean.area(result[0])), area)
+            self.assertTrue(top in [tuple(point) for point in result[0]])
+            union = boolean.clip([a], [b], clipper.ClipType.Union, integer)
+            self.assertEqual(len(union), 1)
+            self.assertTrue(top in [tuple(point) for point in union[0]])
+            self.assertAlmostEqual(abs(self.area(union)), 30.0-notch)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,192 @@
+import re
+import unittest
+from math import pi, sin, cos
+import numpy
+from syntax import *
+from syntax.CSTlib import _congruent
+
+
+def square(x0, y0, x1, y1):
+    return Primitive(Point(x0, y0), Point(x1, y0), Point(x1, y1), Point(x0, y1))
+
+def solids(macro):
+    """ vertices of the extrusions made by the macro, by name, through the copies,
+        mirrors, rotations and translations of the transforms and the renames """
+    solids, block = {}, None
+    values = lambda line: [float(value) for value in re.findall(r'"([-.0-9e]+)"', line)]
+    for line in macro.splitlines():
+        line = line.strip()
+        if line in ('With Extrude', 'With Transform'):
+            block = {'points': []}
+        elif line.startswith('.Name'):
+            block['name'] = re.findall(r'"(?:[^":]*:)?([^"]*)"', line)[0]
+        elif line.startswith(('.Point', '.LineTo')):
+            block['points'].append(values(line))
+        elif line.startswith(('.PlaneNormal', '.Angle', '.Vector', '.MultipleObjects')):
+            block[line.split()[0][1:]] = line
+        elif line == '.Create':
+            solids[block['name']] = numpy.array(block['points'])
+        elif line.startswith('.Transform'):
+            points = solids[block['name']]
+            if 'PlaneNormal' in block:
+                points = points*(1, -1)
+            if 'Angle' in block:
+                theta = values(block['Angle'])[2]*pi/180.
+                points = numpy.dot(points, [[cos(theta), sin(theta)], [-sin(theta), cos(theta)]])
+            if 'Vector' in block:
+                points = points + values(block['Vector'])[:2]
+            copy = '"True"' in block['MultipleObjects']
+            solids[block['name']+'_1' if copy else block['name']] = points
+        elif line.startswith('Solid.Rename'):
+            source, target = re.findall(r'"(?:[^":]*:)?([^"]*)"', line)
+            solids[target] = solids.pop(source)
+    return solids
+
+def vertices(points):
+    # the vertices of an outline whatever its first vertex and its direction
+    return numpy.array(sorted(points.tolist(), key=lambda pt: numpy.round(pt, 3).tolist()))
+
+
+class TestReplicate(unittest.TestCase):
+    def tearDown(self):
+        CST.Replicate = False
+
+    def test_congruent(self):
+        shape = Primitive(Point(0, 0), Point(3, 0), Point(3, 1), Point(1, 2), Point(0, 1.5))
+        points1 = numpy.array(shape.tolist())
+        for copy in (shape.Translate(vector=Point(10, 5)), shape.Rotate(angle=30),
+                     shape.Mirror(planenormal=(1, 0)).Rotate(angle=-75).Translate(vector=Point(-4, 2))):
+            points2 = numpy.array(copy.tolist())
+            for points in (points2, numpy.roll(points2, 2, axis=0), points2[::-1]):
+                mirror, angle, vector = _congruent(points1, points)
+                theta = angle*pi/180.
+                points = points1*(1, -1) if mirror else points1
+                points = numpy.dot(points, [[cos(theta), sin(theta)], [-sin(theta), cos(theta)]]) + vector
+                self.assertEqual(sorted(map(tuple, numpy.round(points, 6).tolist())),
+                                 sorted(map(tuple, numpy.round(points2, 6).tolist())))
+        self.assertEqual(_congruent(points1, points1*2), None)
+
+    def macro(self):
+        shape = Primitive(Point(0, 0), Point(3, 0), Point(3, 1), Point(1, 2), Point(0, 1.5)).Fillet(0.3, n=8)
+        shapes = [shape, shape.Translate(vector=Point(10, 5)), shape.Rotate(angle=30),
+                  shape.Mirror(planenormal=(0, 1)).Translate(vector=Point(0, -5)),
+                  shape.Mirror(planenormal=(1, 0)).Rotate(angle=-75).Translate(vector=Point(-4, 2)),
+                  square(0, 0, 1, 1), square(5, 5, 6, 6)]
+        cst = CST()
+        with Names():
+            for shape in shapes:
+                extrude = Extrude(name='M1', zrange=(0, 1))
+                extrude.extend(shape)
+                cst.append(extrude)
+            cst.append(Solid.Rename(extrude, 'pad'))
+            return str(cst)
+
+    def test_macro(self):
+        # the copies give the same solids as the extrusions
+        baseline = self.macro()
+        CST.Replicate = True
+        replicated = self.macro()
+        self.assertEqual(replicated.count('With Extrude'), 2)
+        self.assertEqual(replicated.count('"Mirror"'), 2)
+        expected, result = solids(baseline), solids(replicated)
+        self.assertEqual(sorted(result), ['M1', 'M11', 'M12', 'M13', 'M14', 'M15', 'pad'])
+        self.assertEqual(sorted(result), sorted(expected))
+        for name in expected:
+            # the angles of the copies are rounded to 1e-6 degree
+            self.assertTrue(numpy.abs(vertices(result[name])-vertices(expected[name])).max() < 1e-4)
+
+
+class TestPreUnion(unittest.TestCase):
+    def tearDown(self):
+        Solid.PreUnion = False
+
+    def macro(self, shapes):
+        # a solid of extrusions, the first of which has a via cut in it
+        with Names():
+            extrudes = []
+            for shape in shapes:
+                extrude = Extrude(name='M1', zrange=(1, 2))
+                extrude.extend(shape)
+                extrudes.append(extrude)
+            via = Extrude(name='via', zrange=(1, 2))
+            via.extend(square(0.2, 0.2, 0.4, 0.4))
+            solid = Solid(*(extrudes+[via]), name='M1')
+            solid.append(Solid.Subtract(extrudes[0], via))
+            return str(solid)
+
+    def properties(self, macro):
+        return set(re.findall(r'\.(?:Component|Material|Height|Origin) .*', macro))
+
+    def test_macro(self):
+        # the united extrusions cover the metal of the baseline with fewer solids, under
+        # the same name; the extrusion cut by the via is not united
+        shapes = [square(0, 0, 1, 1), square(0.5, 0.5, 1.5, 1.5), square(3, 0, 7, 1), square(6, 0, 7, 5),
+                  square(6, 4, 11, 5), square(20, 0, 21, 1)]
+        baseline = self.macro(shapes)
+        Solid.PreUnion = True
+        united = self.macro(shapes)
+        self.assertEqual(united.count('With Extrude'), 5)
+        self.assertEqual(united.count('Solid.Add'), 3)
+        self.assertEqual(self.properties(united), self.properties(baseline))
+        self.assertEqual(united.rstrip().splitlines()[-1], baseline.rstrip().splitlines()[-1])
+        expected, result = solids(baseline), solids(united)
+        self.assertEqual(result['M1'].tolist(), expected['M1'].tolist())
+        self.assertEqual(result['via'].tolist(), expected['via'].tolist())
+        metal = lambda solids: boolean.bulkunion([points.tolist() for name, points in solids.items() if name!='via'])
+        self.assertEqual(len(metal(result)), len(metal(expected)))
+        self.assertAlmostEqual(sum(boolean.area(polygon) for polygon in metal(result)),
+                               sum(boolean.area(polygon) for polygon in metal(expected)))
+        # the three bars are one extrusion of area 12, the other extrusions are squares
+        self.assertAlmostEqual(sum(boolean.area(points.tolist()) for name, points in result.items() if name!='via'),
+                               12+3)
+
+    def test_holes(self):
+        # a union with a hole is not made
+        shapes = [square(0, 0, 1, 1), square(3, 0, 4, 4), square(3, 3, 7, 4), square(6, 0, 7, 4), square(3, 0, 7, 1)]
+        baseline = self.macro(shapes)
+        Solid.PreUnion = True
+        self.assertEqual(self.macro(shapes), baseline)
+
+
+class TestExtrudeHoles(unittest.TestCase):
+    def test_names(self):
+        holes = Primitives(obj for obj in [square(2, 2, 3, 3), square(6, 6, 7, 7)])
+        ring = Difference(Primitives(obj for obj in [square(0, 0, 10, 10)]), holes, tree=True)[0]
+        with Names():
+            solid = ExtrudeHoles(ring, name='M1', material='PEC', zrange=(0, 1))
+            extrudes = [obj for obj in solid if isinstance(obj, Extrude)]
+            names = [solid.name] + [extrude.name for extrude in extrudes]
+            self.assertEqual(len(set(names)), 4)
+            self.assertEqual(solid.name, 'M1')
+            # the outer extrusion is renamed to the name of the solid
+            self.assertTrue(str(solid).rstrip().endswith('Solid.Rename "component1:%s", "M1"'%extrudes[0].name))
+            self.assertEqual(Extrude(name='M1').name, 'M11')
+
+
+class TestNames(unittest.TestCase):
+    def build(self):
+        holes = Primitives(obj for obj in [square(2, 2, 3, 3)])
+        ring = Difference(Primitives(obj for obj in [square(0, 0, 10, 10)]), holes, tree=True)[0]
+        macro = [Brick(xrange=(0, 1), yrange=(0, 1), zrange=(0, 1)) for i in xrange(2)]
+        for i in xrange(2):
+            extrude = Extrude(name='M1', zrange=(0, 1))
+            extrude.extend(square(0, 0, 1, 1))
+            macro.append(extrude)
+        macro.append(ExtrudeHoles(ring, name='M1', zrange=(1, 2)))
+        return "\n".join(str(obj) for obj in macro)
+
+    def test_runs(self):
+        # each run numbers its names from 1, whatever ran before it
+        with Names():
+            first = self.build()
+        self.build()
+        with Names():
+            second = self.build()
+        self.assertEqual(first, second)
+        for name in ('"Brick1"', '"Brick2"', '"M1"', '"M11"', '"M12"'):
+            self.assertTrue(name in first)
+
+
+
+if __name__ == '__main__':
+    unittest.main()
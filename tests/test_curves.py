@@ -0,0 +1,65 @@
+import unittest
+from math import pi, cos
+import numpy
+from syntax import *
+from syntax import curves
+
+
+class TestChordError(unittest.TestCase):
+    def tearDown(self):
+        chorderror(None)
+
+    def test_arcsegments(self):
+        # the sagitta of the chords is within the tolerance, not with one chord less
+        radius, angle, tolerance = 10.0, pi/2, 0.01
+        n = curves.arcsegments(radius, angle, tolerance)
+        sagitta = lambda n: radius*(1-cos(0.5*angle/n))
+        self.assertTrue(sagitta(n) <= tolerance < sagitta(n-1))
+        self.assertEqual(curves.arcsegments(0.0, angle, tolerance), 1)
+        self.assertEqual(curves.arcsegments(radius, 0.0, tolerance), 1)
+
+    def test_chorderror(self):
+        self.assertEqual(curves.arcsegments(10.0, pi), curves.arcsegments(10.0, pi, 1.0/gdsii.resolution()))
+        chorderror(0.01)
+        self.assertEqual(curves.arcsegments(10.0, pi), curves.arcsegments(10.0, pi, 0.01))
+
+    def test_defaults(self):
+        # 100 points unless n is None
+        chorderror(0.01)
+        self.assertEqual(len(Arc(Point(0, 0), 10.0, 0, 90)), 100)
+        self.assertEqual(len(Arc(Point(0, 0), 10.0, 0, 90, n=None)), curves.arcsegments(10.0, pi/2)+1)
+        segment1 = Segment(Point(-1, 0), Point(0, 0))
+        segment2 = Segment(Point(10, 5), Point(11, 5))
+        self.assertEqual(len(Spline(segment1, segment2)), 100)
+        adaptive = Spline(segment1, segment2, n=None)
+        self.assertTrue(2 < len(adaptive) < 100)
+        # the chords of the adaptive spline stay within the tolerance of the fine one
+        fine = numpy.array([(pt.x, pt.y) for pt in Spline(segment1, segment2, n=2001)])
+        coarse = numpy.array([(pt.x, pt.y) for pt in adaptive])
+        self.assertTrue(numpy.abs(fine[:,1] - numpy.interp(fine[:,0], coarse[:,0], coarse[:,1])).max() <= 0.01)
+        corner = Primitive(Point(0, 0), Point(10, 0), Point(10, 10))
+        self.assertEqual(len(Blend(corner)), 102)
+
+
+class TestFillets(unittest.TestCase):
+    def setUp(self):
+        self.size = curves._FILLETS
+        curves._FILLETS = 8
+        curves._fillets.clear()
+
+    def tearDown(self):
+        curves._FILLETS = self.size
+        curves._fillets.clear()
+
+    def test_bound(self):
+        for i in xrange(20):
+            curves.fillet(0.1*(i+1), 1.0, 5)
+            self.assertTrue(len(curves._fillets) <= 8)
+        # the cached arcs are shared and read only
+        arc = curves.fillet(0.5, 1.0, 5)
+        self.assertTrue(curves.fillet(0.5, 1.0, 5) is arc)
+        self.assertRaises(ValueError, arc.__setitem__, 0, (0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,184 @@
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+import warnings
+import gdspy
+import numpy
+from math import pi
+from syntax import *
+
+
+def square(x0, y0, size=1.0):
+    return Primitive(Point(x0, y0), Point(x0+size, y0), Point(x0+size, y0+size), Point(x0, y0+size))
+
+def records(filename):
+    # record types of a gds file
+    with open(filename, 'rb') as fileobj:
+        data = fileobj.read()
+    offset, rtypes = 0, []
+    while offset < len(data):
+        length, rtype = struct.unpack_from('>2H', data, offset)
+        rtypes.append(rtype)
+        offset += length
+    return rtypes
+
+def area(primitives):
+    return sum(abs(boolean.area([(pt.x, pt.y) for pt in primitive])) for primitive in primitives)
+
+def signature(primitives):
+    return sorted(tuple(sorted((round(pt.x, 3), round(pt.y, 3)) for pt in primitive)) for primitive in primitives)
+
+
+class TestExport(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        gdsii.clear()
+        shutil.rmtree(self.directory)
+
+    def run_script(self, filename):
+        # what Main.extract_gds does for each run of the same script
+        gdsii.clear()
+        gdsii.layermap({'TM2': [40, 0]})
+        cell = gdsii.Cell('A')
+        cell.append(Primitives(primitive for primitive in [square(0, 0), square(2, 0)]), layer=3)
+        namespace = {'TM2': Primitives(primitive for primitive in [square(4, 0)]),
+                     'M1': Primitives(primitive for primitive in [square(6, 0)]),
+                     '_M1': Primitives(primitive for primitive in [square(8, 0)])}
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            gdsii.extract(filename, namespace)
+        # M1 is not mapped, _M1 is skipped
+        self.assertEqual([str(warning.message).split()[0] for warning in caught], ['M1'])
+
+    def test_consecutive_exports(self):
+        filenames = [os.path.join(self.directory, name) for name in ('first.gds', 'second.gds')]
+        for filename in filenames:
+            self.run_script(filename)
+        for filename in filenames:
+            with gdsii.Reader(filename) as gds:
+                self.assertEqual(sorted(gds.cells), ['A', 'TOP'])
+                self.assertEqual(len(gds.primitives('A', layers=[(3, 0)])), 2)
+
+    def test_paths_and_labels(self):
+        filename = os.path.join(self.directory, 'paths.gds')
+        gdsii.clear()
+        cell = gdsii.Cell('A')
+        cell.add(gdspy.FlexPath([(0, 0), (10, 0), (10, 10)], 1.0, layer=5))
+        cell.add(gdspy.FlexPath([(0, 20), (10, 20)], 2.0, layer=6, gdsii_path=True))
+        cell.add(gdspy.Label('PAD', (5, 5), 'sw', layer=7))
+        gdsii.export(filename)
+        with gdsii.Reader(filename) as gds:
+            self.assertAlmostEqual(area(gds.primitives('A', layers=[5])), 20.0, 6)
+            self.assertAlmostEqual(area(gds.primitives('A', layers=[6])), 20.0, 6)
+        library = gdspy.GdsLibrary(infile=filename)
+        labels = library.cell_dict['A'].labels
+        self.assertEqual([(label.text, label.layer, tuple(numpy.round(label.position, 6))) for label in labels],
+                         [('PAD', 7, (5.0, 5.0))])
+
+    def test_layermap(self):
+        filename = os.path.join(self.directory, 'layers.gds')
+        self.run_script(filename)
+        with gdsii.Reader(filename) as gds:
+            self.assertEqual(len(gds.primitives('TOP', layers=[(40, 0)])), 1)
+            self.assertEqual(len(gds.primitives('TOP', layers=[(gdsii.Cell.layer, 0)])), 1)
+
+    def test_stack(self):
+        stack = Layers()
+        stack.append( ('TM2', 'Copper', (5.87, 9.12), (40, 0)) )
+        stack.append( Layer(name='Metal1', material='Copper', zmin=0.4, thickness=0.18, gds=[31, 0]) )
+        stack.append( ('Poly', 'Poly', (0.0, 0.1)) )
+        self.assertEqual(gdsii.layermap(stack), {'TM2': (40, 0), 'Metal1': (31, 0)})
+
+
+class TestInstances(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        gdsii.Cell.instances = 2
+
+    def tearDown(self):
+        gdsii.Cell.instances = None
+        gdsii.clear()
+        shutil.rmtree(self.directory)
+
+    def test_extract(self):
+        # a via array, its rotated and mirrored copies and a single polygon
+        via = Primitive(Point(0, 0), Point(1, 0), Point(1, 2), Point(0, 1.5))
+        vias = [via.Translate(vector=Point(3*i, 4*j)) for i in xrange(5) for j in xrange(4)]
+        vias += [via.Rotate(angle=90).Mirror(planenormal=(1, 0)).Translate(vector=Point(100+3*i, 0))
+                 for i in xrange(3)]
+        # an array of two and a reference
+        vias += [square(200, 0, 2.0), square(205, 0, 2.0), square(213, 0, 2.0)]
+        vias += [square(-10, -10)]
+        filename = os.path.join(self.directory, 'instances.gds')
+        gdsii.clear()
+        gdsii.layermap({'V': 3})
+        gdsii.extract(filename, {'V': Primitives(primitive for primitive in vias)})
+        rtypes = records(filename)
+        self.assertEqual(rtypes.count(gdsii._AREF), 3)
+        self.assertEqual(rtypes.count(gdsii._SREF), 1)
+        self.assertEqual(rtypes.count(gdsii._BOUNDARY), 3)
+        with gdsii.Reader(filename) as gds:
+            self.assertEqual(signature(gds.primitives('TOP')), signature(vias))
+
+
+class TestReader(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'reader.gds')
+        with gdsii.Writer(self.filename) as gds:
+            gds.cell('A')
+            gds.append(Primitives(primitive for primitive in [square(0, 0), square(2, 0)]), layer=(3, 0))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_layers(self):
+        with gdsii.Reader(self.filename) as gds:
+            self.assertEqual(len(gds.primitives('A', layers=[(3, 0)])), 2)
+
+    def test_no_matching_layer(self):
+        with gdsii.Reader(self.filename) as gds:
+            primitives = gds.primitives('A', layers=[(5, 0)])
+            self.assertTrue(isinstance(primitives, Primitives))
+            self.assertEqual(len(primitives), 0)
+            self.assertEqual(len(gds.primitives('A', layers=[(5, 0)], flatten=False)), 0)
+
+    def test_ends_and_boxes(self):
+        # the round and extended ends of the paths, and the boxes on (layer, boxtype)
+        filename = os.path.join(self.directory, 'ends.gds')
+        gdsii.clear()
+        cell = gdsii.Cell('A')
+        cell.add(gdspy.FlexPath([(0, 0), (10, 0)], 2.0, ends='round', layer=1, gdsii_path=True))
+        cell.add(gdspy.FlexPath([(0, 10), (10, 10)], 2.0, ends=(1.0, 2.0), layer=2, gdsii_path=True))
+        gdsii.export(filename)
+        rtypes = records(filename)
+        self.assertEqual((rtypes.count(gdsii._BGNEXTN), rtypes.count(gdsii._ENDEXTN)), (1, 1))
+        with gdsii.Reader(filename) as gds:
+            rounded = gds.primitives('A', layers=[1])
+            # the half circles are within a database step of the circle
+            self.assertTrue(20.0+pi-2*pi/gdsii.resolution() < area(rounded) < 20.0+pi)
+            self.assertAlmostEqual(max(pt.x for pt in rounded[0]), 11.0, 6)
+            self.assertAlmostEqual(area(gds.primitives('A', layers=[2])), 26.0, 6)
+        with gdsii.Writer(filename) as gds:
+            gds.cell('A')
+            gds._record(gdsii._BOX)
+            gds._record(gdsii._LAYER, struct.pack('>h', 8))
+            gds._record(gdsii._BOXTYPE, struct.pack('>h', 1))
+            gds._record(gdsii._XY, gds._xy([(0, 0), (3, 0), (3, 3), (0, 3)], closed=True))
+            gds._record(gdsii._ENDEL)
+            gds.path([(0, 0), (10, 0)], 1.0, 9, pathtype=3)
+        with gdsii.Reader(filename) as gds:
+            self.assertAlmostEqual(area(gds.primitives('A', layers=[(8, 1)])), 9.0, 6)
+            with warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter('always')
+                self.assertAlmostEqual(area(gds.primitives('A', layers=[9])), 10.0, 6)
+            self.assertEqual(len(caught), 1)
+            self.assertTrue('type 3' in str(caught[0].message))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+from math import pi, sqrt, tan, hypot
+from syntax import *
+
+
+def polygon(*points):
+    return Primitive(*[Point(x, y) for x, y in points])
+
+def area(primitives):
+    return sum(boolean.area(primitive.tolist()) for primitive in primitives)
+
+
+class TestOffset(unittest.TestCase):
+    square = polygon((0, 0), (10, 0), (10, 10), (0, 10))
+    # L-shape of area 64 with a concave corner at (4, 4)
+    L = polygon((0, 0), (10, 0), (10, 4), (4, 4), (4, 10), (0, 10))
+
+    def test_square_joins(self):
+        self.assertAlmostEqual(area(self.square.Offset(1, join=JoinType.Miter)), 144.0, 6)
+        # the square joins cut the corners at 1 from the vertices
+        self.assertAlmostEqual(area(self.square.Offset(1, join=JoinType.Square)), 144.0-4*(sqrt(2)-1)**2, 6)
+        self.assertAlmostEqual(area(self.square.Offset(-1)), 64.0, 6)
+
+    def test_round_join(self):
+        result = self.square.Offset(1, join=JoinType.Round, arc_tolerance=1e-3)
+        self.assertEqual(len(result), 1)
+        self.assertAlmostEqual(area(result), 140.0+pi, 1)
+        self.assertTrue(area(result) < 140.0+pi)
+        # the arcs are within arc_tolerance of the circles of radius 1 at the corners
+        for point in result[0]:
+            x, y = min(max(point.x, 0), 10), min(max(point.y, 0), 10)
+            self.assertTrue(1-1e-3-1e-6 <= hypot(point.x-x, point.y-y) <= 1+1e-6)
+
+    def test_L_shape(self):
+        grown = self.L.Offset(1, join=JoinType.Miter)
+        self.assertEqual(len(grown), 1)
+        self.assertEqual(len(grown[0]), 6)
+        self.assertAlmostEqual(area(grown), 12*6+6*6, 6)
+        shrunk = self.L.Offset(-1, join=JoinType.Miter)
+        self.assertAlmostEqual(area(shrunk), 8*2+2*6, 6)
+
+    def test_miter_limit(self):
+        # the miter of the 70 degrees apex is at 1.74 delta from its vertex, kept for a
+        # limit of 1.5 as ClipperOffset takes the limits under 2 as 2; the 55 degrees
+        # corners need a limit over 2.17
+        triangle = polygon((0, 0), (10, 0), (5, 5/tan(35*pi/180)))
+        mitered = area(triangle.Offset(1, join=JoinType.Miter, miter_limit=2.0))
+        for limit in (1.0, 1.5):
+            self.assertAlmostEqual(area(triangle.Offset(1, join=JoinType.Miter, miter_limit=limit)), mitered, 6)
+        self.assertTrue(area(triangle.Offset(1, join=JoinType.Miter, miter_limit=3.0)) > mitered+0.1)
+        self.assertTrue(area(triangle.Offset(1, join=JoinType.Square)) < mitered-0.1)
+
+
+if __name__ == '__main__':
+    unittest.main()
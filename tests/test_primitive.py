@@ -0,0 +1,141 @@
+import pickle
+import unittest
+from syntax import *
+
+
+def points(n):
+    return [Point(float(i), float(i*i%7)) for i in xrange(n)]
+
+def pair(n=6):
+    # the same points as a list of Point and as a buffer
+    return Primitive(*points(n)), PackedPrimitive(*points(n))
+
+
+class TestPackedPrimitive(unittest.TestCase):
+    def assertSame(self, packed, primitive):
+        self.assertTrue(isinstance(packed, PackedPrimitive))
+        self.assertEqual(len(packed), len(primitive))
+        self.assertEqual([(pt.x, pt.y) for pt in packed], [(pt.x, pt.y) for pt in primitive])
+
+    def test_indexing(self):
+        primitive, packed = pair()
+        for i in (0, 3, -1, -6):
+            self.assertEqual(packed[i], primitive[i])
+        self.assertSame(packed[1:4], primitive[1:4])
+        self.assertSame(packed[::2], points(6)[::2])
+        self.assertSame(packed[-2:], primitive[-2:])
+        self.assertEqual(list(reversed(packed)), list(reversed(primitive)))
+        self.assertEqual(packed.tolist(), [(pt.x, pt.y) for pt in primitive])
+
+    def test_assignment(self):
+        primitive, packed = pair()
+        for obj in (primitive, packed):
+            obj[2] = Point(10, 10)
+            obj[-1] = Point(11, 11)
+            obj[1:3] = [Point(20, 20), Point(21, 21), Point(22, 22)]
+            obj[::3] = [Point(30, 30), Point(31, 31), Point(32, 32)]
+        self.assertSame(packed, primitive)
+        self.assertRaises(ValueError, packed.__setitem__, slice(None, None, 2), [Point(0, 0)])
+
+    def test_deletion(self):
+        primitive, packed = pair(10)
+        for obj in (primitive, packed):
+            del obj[0]
+            del obj[-1]
+            del obj[1:3]
+            del obj[::2]
+        self.assertSame(packed, primitive)
+
+    def test_list_methods(self):
+        primitive, packed = pair()
+        point = primitive[4]
+        self.assertEqual(packed.index(point), primitive.index(point))
+        self.assertEqual(packed.count(point), 1)
+        self.assertEqual(packed.count((point.x, point.y)), 0)
+        self.assertRaises(ValueError, packed.index, Point(-1, -1))
+        for obj in (primitive, packed):
+            obj.append(Point(7, 7))
+            obj.extend([Point(8, 8), Point(9, 9)])
+            obj.insert(1, Point(5, 5))
+            obj.remove(point)
+        self.assertEqual(packed.pop(), primitive.pop())
+        self.assertEqual(packed.pop(0), primitive.pop(0))
+        self.assertSame(packed, primitive)
+        for obj in (primitive, packed):
+            obj.reverse()
+        self.assertSame(packed, primitive)
+        for obj in (primitive, packed):
+            obj.sort(key=lambda pt: (pt.y, pt.x))
+        self.assertSame(packed, primitive)
+
+    def test_growth(self):
+        packed = PackedPrimitive(*points(2))
+        for point in points(100)[2:]:
+            packed.append(point)
+        self.assertSame(packed, points(100))
+        packed += points(3)
+        self.assertEqual(len(packed), 103)
+
+    def test_arithmetic(self):
+        primitive, packed = pair()
+        self.assertSame(packed+Point(1, 2), [pt+Point(1, 2) for pt in primitive])
+        self.assertSame(packed*2, [pt*2 for pt in primitive])
+        self.assertSame(-packed, [-pt for pt in primitive])
+        self.assertEqual(pickle.loads(pickle.dumps(packed)), packed)
+        self.assertEqual(packed, PackedPrimitive(*points(6)))
+        self.assertNotEqual(packed, packed[1:])
+
+    def test_transforms(self):
+        primitive, packed = pair()
+        for method, kwargs in (('Translate', {'vector': Point(3, -1)}), ('Rotate', {'angle': 30}),
+                               ('Mirror', {'planenormal': (1, 0)})):
+            expected = getattr(primitive, method)(**kwargs)
+            result = getattr(packed, method)(**kwargs)
+            self.assertTrue(isinstance(result, PackedPrimitive))
+            for pt1, pt2 in zip(result, expected):
+                self.assertAlmostEqual(pt1.x, pt2.x)
+                self.assertAlmostEqual(pt1.y, pt2.y)
+
+    def test_transformed(self):
+        # the vertices of a lazy copy are computed from its source, which is not
+        # modified through the copy
+        primitive, packed = pair()
+        moved = Primitives(obj for obj in [packed]).Translate(vector=Point(1, 0), lazy=True)[0]
+        self.assertTrue(isinstance(moved, TransformedPrimitive))
+        self.assertSame(moved, [pt+Point(1, 0) for pt in primitive])
+        self.assertSame(moved[1:3], [pt+Point(1, 0) for pt in primitive[1:3]])
+        moved[0] = Point(100, 100)
+        moved.append(Point(101, 101))
+        del moved[1]
+        moved.sort(key=lambda pt: pt.x)
+        self.assertEqual(packed, PackedPrimitive(*points(6)))
+        self.assertEqual(len(moved), 6)
+        self.assertEqual(moved[-1], Point(101, 101))
+
+class TestHoles(unittest.TestCase):
+    def setUp(self):
+        square = Primitive(Point(0, 0), Point(10, 0), Point(10, 10), Point(0, 10))
+        hole = Primitive(Point(4, 4), Point(5, 4), Point(5, 6), Point(4, 6))
+        self.ring = Difference(Primitives(obj for obj in [square]), hole, tree=True)
+
+    def assertHole(self, primitive, xmin, ymin, xmax, ymax):
+        self.assertEqual(len(primitive.holes), 1)
+        xs = [pt.x for pt in primitive.holes[0]]
+        ys = [pt.y for pt in primitive.holes[0]]
+        for value, expected in zip((min(xs), min(ys), max(xs), max(ys)), (xmin, ymin, xmax, ymax)):
+            self.assertAlmostEqual(value, expected)
+
+    def test_transforms(self):
+        # the holes of a tree boolean follow the transforms of their outer contour
+        outer = self.ring[0]
+        self.assertHole(outer, 4, 4, 5, 6)
+        self.assertHole(outer.Rotate(angle=90), -6, 4, -4, 5)
+        self.assertHole(outer.Mirror(planenormal=(1, 0)), -5, 4, -4, 6)
+        self.assertHole(outer.pack().Translate(vector=Point(1, 0)), 5, 4, 6, 6)
+        self.assertHole(outer.pack().unpack(), 4, 4, 5, 6)
+        self.assertHole(self.ring.Translate(vector=Point(0, 1))[0], 4, 5, 5, 7)
+        self.assertHole(self.ring.Translate(vector=Point(0, 1), lazy=True)[0], 4, 5, 5, 7)
+
+
+if __name__ == '__main__':
+    unittest.main()